@@ -0,0 +1,287 @@
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module with the classes and methods to create zip files
+without depending on the zip binary."""
+
+import os
+import shutil
+import struct
+import zlib
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+
+# Extensions of the files already compressed, stored without recompression
+COMPRESSED_EXTENSIONS = frozenset(['.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.7z',
+                                   '.zip', '.jar', '.whl', '.egg', '.npz',
+                                   '.png', '.jpg', '.jpeg', '.gif', '.webp',
+                                   '.mp3', '.mp4', '.mkv', '.avi', '.mov', '.webm'])
+DEFAULT_COMPRESSION_LEVEL = 9
+# Timestamp of all the members, so the same files always produce the same zip
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+# Members bigger than this size are compressed in chunks (using several threads if
+# available), the encoding only depends on the size so the zips are always the same
+_PARALLEL_THRESHOLD = 8 * 1024 * 1024
+_CHUNK_SIZE = 2 * 1024 * 1024
+# Bytes of each file compressed to estimate its compression ratio
+_SAMPLE_SIZE = 64 * 1024
+# Raw deflate stream (without zlib header) as stored in the zip files
+_DEFLATE_WBITS = -15
+# Empty final block that ends a deflate stream of sync flushed chunks
+_DEFLATE_END_BLOCK = b'\x03\x00'
+# Zip32 size limit, the Lambda packages are far below it
+_ZIP32_LIMIT = 0xFFFFFFFF
+# Local file header: signature, versions, flags, compression, time, date,
+# CRC, sizes, file name length and extra field length
+_LOCAL_HEADER_STRUCT = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_HEADER_NAME_LENGTH = 10
+_LOCAL_HEADER_EXTRA_LENGTH = 11
+_FLAG_ENCRYPTED = 0x1
+_FLAG_DATA_DESCRIPTOR = 0x8
+
+
+def is_compressed_file(path: str) -> bool:
+    """Checks if the file extension belongs to an already compressed format."""
+    return os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def open_nested_zip(zip_file: ZipFile, name: str) -> ZipFile:
+    """Opens a zip stored inside another zip without writing it to disk."""
+    return ZipFile(BytesIO(zip_file.read(name)))
+
+
+def read_raw_member(zip_file: ZipFile, zinfo: ZipInfo) -> bytes:
+    """Returns the member data as stored in the zip (compressed)."""
+    zip_file.fp.seek(zinfo.header_offset)
+    header = _LOCAL_HEADER_STRUCT.unpack(zip_file.fp.read(_LOCAL_HEADER_STRUCT.size))
+    zip_file.fp.seek(header[_LOCAL_HEADER_NAME_LENGTH] + header[_LOCAL_HEADER_EXTRA_LENGTH], os.SEEK_CUR)
+    return zip_file.fp.read(zinfo.compress_size)
+
+
+def estimate_file_size(path: str, compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> Tuple[int, int]:
+    """Returns the size of the file and an estimation of its compressed
+    size in the zip, obtained compressing only its first bytes."""
+    if os.path.islink(path):
+        size = len(os.readlink(path))
+        return size, size
+    size = os.path.getsize(path)
+    if is_compressed_file(path) or compression_level == 0 or size == 0:
+        return size, size
+    with open(path, 'rb') as sampled_file:
+        sample = sampled_file.read(_SAMPLE_SIZE)
+    compressed = len(zlib.compress(sample, compression_level))
+    return size, min(size, int(size * compressed / len(sample)))
+
+
+def estimate_path_size(path: str, compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> Tuple[int, int]:
+    """Returns the size and the estimated compressed size of
+    the file or all the files of the folder passed."""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return estimate_file_size(path, compression_level)
+    total_size = 0
+    total_compressed = 0
+    for dirname, _, filenames in os.walk(path):
+        for name in filenames:
+            size, compressed = estimate_file_size(os.path.join(dirname, name), compression_level)
+            total_size += size
+            total_compressed += compressed
+    return total_size, total_compressed
+
+
+def _compress_chunk(chunk: bytes, level: int) -> bytes:
+    # Each chunk is sync flushed so the chunks can be concatenated
+    # in a single deflate stream (zlib releases the GIL while compressing)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _DEFLATE_WBITS)
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _get_zinfo(path: str, arcname: str) -> ZipInfo:
+    # The modification times are not stored to create reproducible zips
+    zinfo = ZipInfo.from_file(path, arcname, strict_timestamps=False)
+    zinfo.date_time = ZIP_DATE_TIME
+    return zinfo
+
+
+class ZipBuilder():
+    """Creates reproducible zip files keeping the permissions of the files
+    and the symlinks (stored as links, like 'zip -y'). The already compressed
+    files are stored and the rest are deflated with the compression
+    level passed. The big files are compressed using several threads."""
+
+    def __init__(self, zip_path: Union[str, BinaryIO], compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                 threads: Optional[int] = None, mode: str = 'w'):
+        self.compression_level = compression_level
+        self.threads = threads or os.cpu_count() or 1
+        # Mode 'a' adds the members to an existing zip
+        self.zip_file = ZipFile(zip_path, mode)
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """Writes the central directory and closes the zip file."""
+        if self._pool:
+            self._pool.close()
+            self._pool = None
+        self.zip_file.close()
+
+    def _get_pool(self) -> ThreadPool:
+        if not self._pool:
+            self._pool = ThreadPool(processes=self.threads)
+        return self._pool
+
+    def add_folder(self, folder_path: str, prefix: str = '') -> None:
+        """Adds the contents of the folder (not the folder itself)
+        sorted by path, with the prefix passed in their names."""
+        for dirname, dirnames, filenames in os.walk(folder_path):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                path = os.path.join(dirname, name)
+                self.add_path(path, prefix + os.path.relpath(path, folder_path))
+
+    def add_path(self, path: str, arcname: str) -> None:
+        """Adds a file, folder (without its contents) or symlink.
+        If there is already a member with the same name it is kept."""
+        is_folder = os.path.isdir(path) and not os.path.islink(path)
+        if self.has_member(arcname + '/' if is_folder else arcname):
+            return
+        if os.path.islink(path):
+            self._add_symlink(path, arcname)
+        elif is_folder:
+            self.zip_file.writestr(_get_zinfo(path, arcname), b'')
+        elif is_compressed_file(path) or self.compression_level == 0:
+            self._add_file(path, arcname, ZIP_STORED)
+        elif os.path.getsize(path) < _PARALLEL_THRESHOLD:
+            self._add_file(path, arcname, ZIP_DEFLATED)
+        else:
+            self._add_big_file(path, arcname)
+
+    def _add_file(self, path: str, arcname: str, compress_type: int) -> None:
+        # Same as 'ZipFile.write' but with the fixed timestamp
+        zinfo = _get_zinfo(path, arcname)
+        zinfo.compress_type = compress_type
+        zinfo._compresslevel = self.compression_level
+        with open(path, 'rb') as src, self.zip_file.open(zinfo, 'w') as dest:
+            shutil.copyfileobj(src, dest, 1024 * 1024)
+
+    def _add_symlink(self, path: str, arcname: str) -> None:
+        link_stat = os.lstat(path)
+        zinfo = ZipInfo(arcname, ZIP_DATE_TIME)
+        zinfo.external_attr = (link_stat.st_mode & 0xFFFF) << 16
+        zinfo.compress_type = ZIP_STORED
+        self.zip_file.writestr(zinfo, os.readlink(path))
+
+    def _compress_chunks(self, chunks: List[bytes]) -> List[bytes]:
+        # The threads only change how the chunks are scheduled, not the compressed data
+        if self.threads == 1:
+            return [_compress_chunk(chunk, self.compression_level) for chunk in chunks]
+        return self._get_pool().map(lambda chunk: _compress_chunk(chunk, self.compression_level), chunks)
+
+    def _read_chunks(self, file_obj) -> Iterable[List[bytes]]:
+        # Read only a window of chunks each time to bound the memory used
+        while True:
+            chunks = []
+            for _ in range(self.threads * 2):
+                chunk = file_obj.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            if not chunks:
+                return
+            yield chunks
+
+    def _add_big_file(self, path: str, arcname: str) -> None:
+        """Deflates the file in chunks with a thread pool and writes the
+        compressed stream after a local header updated at the end."""
+        zinfo = _get_zinfo(path, arcname)
+        zinfo.compress_type = ZIP_DEFLATED
+        zinfo.file_size = 0
+        zinfo.compress_size = 0
+        zinfo.CRC = 0
+        zip_fp = self.zip_file.fp
+        zinfo.header_offset = zip_fp.tell()
+        zip_fp.write(zinfo.FileHeader(zip64=False))
+        with open(path, 'rb') as file_obj:
+            for chunks in self._read_chunks(file_obj):
+                for chunk, compressed in zip(chunks, self._compress_chunks(chunks)):
+                    zinfo.CRC = zlib.crc32(chunk, zinfo.CRC)
+                    zinfo.file_size += len(chunk)
+                    zinfo.compress_size += len(compressed)
+                    zip_fp.write(compressed)
+        zip_fp.write(_DEFLATE_END_BLOCK)
+        zinfo.compress_size += len(_DEFLATE_END_BLOCK)
+        if zinfo.file_size > _ZIP32_LIMIT or zinfo.compress_size > _ZIP32_LIMIT:
+            raise ValueError(f"File '{path}' too big to be added to the package.")
+        end_offset = zip_fp.tell()
+        # Rewrite the local header with the final sizes and CRC (same length)
+        zip_fp.seek(zinfo.header_offset)
+        zip_fp.write(zinfo.FileHeader(zip64=False))
+        zip_fp.seek(end_offset)
+        self._register_member(zinfo)
+
+    def _register_member(self, zinfo: ZipInfo) -> None:
+        # Register a member written directly in the file
+        # as the ZipFile does when writing the members itself
+        self.zip_file.filelist.append(zinfo)
+        self.zip_file.NameToInfo[zinfo.filename] = zinfo
+        self.zip_file.start_dir = self.zip_file.fp.tell()
+        self.zip_file._didModify = True
+
+    def has_member(self, arcname: str) -> bool:
+        """Checks if the zip already has a member with the name passed."""
+        return arcname in self.zip_file.NameToInfo
+
+    def get_uncompressed_size(self) -> int:
+        """Returns the size of all the members once extracted."""
+        return sum(zinfo.file_size for zinfo in self.zip_file.infolist())
+
+    def copy_member(self, source: ZipFile, zinfo: ZipInfo, arcname: Optional[str] = None) -> None:
+        """Copies a member of other zip with its compressed data as is
+        (without decompressing and compressing it again)."""
+        if zinfo.flag_bits & _FLAG_ENCRYPTED:
+            raise ValueError(f"Encrypted member '{zinfo.filename}' cannot be copied.")
+        if zinfo.file_size > _ZIP32_LIMIT or zinfo.compress_size > _ZIP32_LIMIT:
+            raise ValueError(f"Member '{zinfo.filename}' too big to be added to the package.")
+        data = read_raw_member(source, zinfo)
+        new_zinfo = ZipInfo(arcname or zinfo.filename, ZIP_DATE_TIME)
+        new_zinfo.compress_type = zinfo.compress_type
+        new_zinfo.create_system = zinfo.create_system
+        new_zinfo.external_attr = zinfo.external_attr
+        new_zinfo.CRC = zinfo.CRC
+        new_zinfo.file_size = zinfo.file_size
+        new_zinfo.compress_size = zinfo.compress_size
+        # The sizes are written in the local header, the data descriptor is not needed
+        new_zinfo.flag_bits = zinfo.flag_bits & ~_FLAG_DATA_DESCRIPTOR
+        new_zinfo.header_offset = self.zip_file.fp.tell()
+        self.zip_file.fp.write(new_zinfo.FileHeader(zip64=False))
+        self.zip_file.fp.write(data)
+        self._register_member(new_zinfo)
+
+    def copy_zip(self, source: ZipFile, prefix: str = '') -> None:
+        """Copies all the members of other zip (skipping the existing ones)."""
+        for zinfo in source.infolist():
+            if not self.has_member(prefix + zinfo.filename):
+                self.copy_member(source, zinfo, prefix + zinfo.filename)
+
+
+def zip_folder(zip_path: str, folder_path: str,
+               compression_level: int = DEFAULT_COMPRESSION_LEVEL) -> None:
+    """Creates a zip file with the contents of the folder passed."""
+    with ZipBuilder(zip_path, compression_level) as builder:
+        builder.add_folder(folder_path)
@@ -0,0 +1,206 @@
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module with the classes to inspect and clean the local cache of SCAR.
+
+The cache stores the supervisor releases (one folder per version),
+the function packages and the udocker images. The last use of each
+entry is the modification time of its folder, updated when it's reused.
+The entries are removed holding the same lock files as their writers."""
+
+import json
+import os
+import re
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Union
+import scar.logger as logger
+from scar.utils import FileUtils
+
+CACHE_DIR = '/var/tmp/cache/scar'
+# Folders with one cache entry per subfolder and the type of their entries
+_ENTRY_FOLDERS = {'packages': 'package', 'udocker/images': 'udocker image'}
+# Folders with metadata or shared files that are not entries
+_SHARED_FOLDERS = ['github', 'layers', 'packages', 'udocker']
+_UDOCKER_LAYERS_FOLDER = 'udocker/layers'
+_LOCK_EXTENSION = '.lock'
+# The entries used recently may be in use by other processes
+_MIN_EVICTION_AGE = 5 * 60
+_UDOCKER_METADATA_NAME = 'image.json'
+# Index of the supervisor versions synchronized with 'scar cache sync'
+_MIRROR_RELEASES_FILE = 'releases.json'
+_SIZE_REGEX = re.compile(r'^(\d+(?:\.\d+)?)\s*([KMGT]?)B?$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(size: Union[str, int]) -> int:
+    """Returns the bytes of a size in bytes or with units (i.e. '500MB' or '2G')."""
+    match = _SIZE_REGEX.match(str(size).strip())
+    if not match:
+        raise ValueError(f"Invalid size '{size}'.")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def _has_files(path: str) -> bool:
+    """Checks if the folder has files other than the lock files."""
+    return any(not filename.endswith(_LOCK_EXTENSION)
+               for _, _, filenames in os.walk(path) for filename in filenames)
+
+
+def _remove_entry_files(path: str) -> None:
+    """Removes the folder except its lock files (other processes may have them open)."""
+    for dirname, dirnames, filenames in os.walk(path, topdown=False):
+        for name in filenames:
+            if not name.endswith(_LOCK_EXTENSION):
+                os.remove(os.path.join(dirname, name))
+        for name in dirnames:
+            if os.path.islink(os.path.join(dirname, name)):
+                os.remove(os.path.join(dirname, name))
+    for dirname, _, _ in os.walk(path, topdown=False):
+        try:
+            os.rmdir(dirname)
+        except OSError:
+            # Folder with lock files
+            pass
+
+
+def get_folder_size(path: str) -> int:
+    """Returns the size of the files of the folder (the symlinks are not followed)."""
+    size = 0
+    for dirname, _, filenames in os.walk(path):
+        for filename in filenames:
+            size += os.lstat(os.path.join(dirname, filename)).st_size
+    return size
+
+
+class CacheEntry():
+    """Folder of the cache that is evicted as a whole."""
+
+    def __init__(self, path: str, entry_type: str, size: int, lock_paths: List[str], evictable: bool = True):
+        self.path = path
+        self.entry_type = entry_type
+        self.size = size
+        self.last_use = os.stat(path).st_mtime
+        # Lock files held by the processes that write or read the entry
+        self.lock_paths = lock_paths
+        self.evictable = evictable
+
+    def to_dict(self) -> Dict:
+        return {'Type': self.entry_type,
+                'Name': os.path.basename(self.path),
+                'Size': self.size,
+                'LastUse': self.last_use}
+
+
+class CacheManager():
+    """Lists the cache entries and evicts the least recently used ones
+    until the cache fits in a maximum size. The supervisor versions
+    synchronized in the cache folder (used as mirror) are not evicted."""
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _get_mirror_versions(self) -> List[str]:
+        releases_path = FileUtils.join_paths(self.cache_dir, _MIRROR_RELEASES_FILE)
+        if FileUtils.is_file(releases_path):
+            return json.loads(FileUtils.read_file(releases_path)).get('versions', [])
+        return []
+
+    def _get_udocker_layer_images(self) -> Dict[str, List[str]]:
+        """Returns the images that use each shared udocker layer."""
+        layer_images = {}
+        images_path = FileUtils.join_paths(self.cache_dir, 'udocker/images')
+        for image in (os.listdir(images_path) if os.path.isdir(images_path) else []):
+            metadata_path = FileUtils.join_paths(images_path, image, _UDOCKER_METADATA_NAME)
+            if FileUtils.is_file(metadata_path):
+                for layer in json.loads(FileUtils.read_file(metadata_path)).get('layers', []):
+                    layer_images.setdefault(layer, []).append(image)
+        return layer_images
+
+    def _get_udocker_layers_size(self, layers: List[str]) -> int:
+        layers_path = FileUtils.join_paths(self.cache_dir, _UDOCKER_LAYERS_FOLDER)
+        return sum(os.lstat(FileUtils.join_paths(layers_path, layer)).st_size for layer in layers
+                   if os.path.lexists(FileUtils.join_paths(layers_path, layer)))
+
+    def get_entries(self) -> List[CacheEntry]:
+        """Returns the cache entries sorted from the least to the most recently used."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        mirror_versions = self._get_mirror_versions()
+        for name in os.listdir(self.cache_dir):
+            path = FileUtils.join_paths(self.cache_dir, name)
+            if os.path.isdir(path) and name not in _SHARED_FOLDERS and _has_files(path):
+                # Each supervisor file is written holding its own lock file
+                lock_paths = sorted(FileUtils.join_paths(path, file_name) for file_name in os.listdir(path)
+                                    if file_name.endswith(_LOCK_EXTENSION))
+                entries.append(CacheEntry(path, 'supervisor', get_folder_size(path), lock_paths,
+                                          evictable=name not in mirror_versions))
+        layer_images = self._get_udocker_layer_images()
+        for folder, entry_type in _ENTRY_FOLDERS.items():
+            folder_path = FileUtils.join_paths(self.cache_dir, folder)
+            for name in (os.listdir(folder_path) if os.path.isdir(folder_path) else []):
+                path = FileUtils.join_paths(folder_path, name)
+                if not os.path.isdir(path):
+                    continue
+                size = get_folder_size(path)
+                if entry_type == 'udocker image':
+                    # The layers only used by this image are freed with it
+                    size += self._get_udocker_layers_size([layer for layer, images in layer_images.items()
+                                                           if images == [name]])
+                entries.append(CacheEntry(path, entry_type, size, [f'{path}{_LOCK_EXTENSION}']))
+        return sorted(entries, key=lambda entry: entry.last_use)
+
+    def get_size(self) -> int:
+        """Returns the total size of the cache."""
+        return get_folder_size(self.cache_dir) if os.path.isdir(self.cache_dir) else 0
+
+    def _remove_unused_udocker_layers(self) -> None:
+        layers_path = FileUtils.join_paths(self.cache_dir, _UDOCKER_LAYERS_FOLDER)
+        if not os.path.isdir(layers_path):
+            return
+        # The images add their layers and metadata holding this lock
+        with FileUtils.lock_file(f'{layers_path}{_LOCK_EXTENSION}'):
+            used_layers = self._get_udocker_layer_images()
+            for layer in os.listdir(layers_path):
+                if layer not in used_layers:
+                    FileUtils.delete_file(FileUtils.join_paths(layers_path, layer))
+
+    @staticmethod
+    def _remove_entry(entry: CacheEntry) -> bool:
+        """Removes the entry if no other process is using it."""
+        with ExitStack() as stack:
+            for lock_path in entry.lock_paths:
+                if not stack.enter_context(FileUtils.lock_file(lock_path, blocking=False)):
+                    logger.debug(f"Cache entry '{entry.path}' in use.")
+                    return False
+            logger.debug(f"Removing cache entry '{entry.path}'.")
+            _remove_entry_files(entry.path)
+        return True
+
+    def prune(self, max_size: int) -> List[CacheEntry]:
+        """Removes the least recently used entries until the cache
+        fits in 'max_size' bytes. Returns the entries removed."""
+        total_size = self.get_size()
+        removed = []
+        for entry in self.get_entries():
+            if total_size <= max_size:
+                break
+            if not entry.evictable or entry.last_use > time.time() - _MIN_EVICTION_AGE:
+                continue
+            if self._remove_entry(entry):
+                total_size -= entry.size
+                removed.append(entry)
+        if any(entry.entry_type == 'udocker image' for entry in removed):
+            self._remove_unused_udocker_layers()
+        return removed
@@ -17,6 +17,7 @@ import abc
 
 class CallType(Enum):
     INIT = "init"
+    UPDATE = "update"
     INVOKE = "invoke"
     RUN = "run"
     LS = "ls"
@@ -24,6 +25,9 @@ class CallType(Enum):
     LOG = "log"
     PUT = "put"
     GET = "get"
+    STATS = "stats"
+    TUNE = "tune"
+    CACHE = "cache"
 
 class Commands(metaclass=abc.ABCMeta):
     ''' All the different cloud provider controllers must inherit
@@ -33,6 +37,10 @@ class Commands(metaclass=abc.ABCMeta):
     def init(self):
         pass
 
+    @abc.abstractmethod
+    def update(self):
+        pass
+
     @abc.abstractmethod
     def invoke(self):
         pass
@@ -60,3 +68,15 @@ class Commands(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def get(self):
         pass
+
+    @abc.abstractmethod
+    def stats(self):
+        pass
+
+    @abc.abstractmethod
+    def tune(self):
+        pass
+
+    @abc.abstractmethod
+    def cache(self):
+        pass
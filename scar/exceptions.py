@@ -72,7 +72,7 @@ class MissingCommandError(ScarError):
 
     """
     fmt = ("Please use one of the scar available commands "
-           "(init,invoke,run,update,rm,ls,log,put,get)")
+           "(init,invoke,run,update,rm,ls,log,put,get,stats,tune,cache)")
 
 
 class ScarConfigFileError(ScarError):
@@ -165,6 +165,41 @@ class GitHubTagNotFoundError(ScarError):
     fmt = "The tag '{tag}' was not found in the GitHub repository."
 
 
+class SupervisorMirrorFileNotFoundError(ScarError):
+    """
+    The supervisor file was not found in the mirror
+
+    :ivar file_name: Path of the file in the mirror
+    :ivar mirror: Local folder or URL of the mirror
+    """
+
+    fmt = ("Unable to find the supervisor file '{file_name}' in the mirror '{mirror}'.\n"
+           "Please run 'scar cache sync' to add it to the mirror.")
+
+
+class SupervisorFileVerificationError(ScarError):
+    """
+    The downloaded supervisor file is not valid
+
+    :ivar file_name: Name of the file downloaded
+    :ivar error_msg: Verification failed
+    """
+
+    fmt = "Error verifying the supervisor file '{file_name}': {error_msg}."
+
+
+class FileDownloadError(ScarError):
+    """
+    The file could not be downloaded
+
+    :ivar url: URL of the file
+    :ivar error_msg: Error of the request
+    :ivar status_code: HTTP status code of the response (if any)
+    """
+
+    fmt = "Unable to download the file '{url}': {error_msg}"
+
+
 class StorageProviderNotSupportedError(ScarError):
     """
     The storage provider parsed is not supported
@@ -195,6 +230,27 @@ class FunctionCreationError(ScarError):
     fmt = "Unable to create the function '{function_name}' : {error_msg}"
 
 
+class FunctionUpdateError(ScarError):
+    """
+    An error occurred when updating the lambda function.
+
+    :ivar function_name: Name of the function
+    :ivar error_msg: General error message
+    """
+    fmt = "Unable to update the function '{function_name}' : {error_msg}"
+
+
+class FunctionRecreationNeededError(ScarError):
+    """
+    The function definition changes values that can't be updated.
+
+    :ivar function_name: Name of the function
+    :ivar values: Values that can't be updated
+    """
+    fmt = ("The values '{values}' of the function '{function_name}' can't be updated. "
+           "Remove the function and create it again to apply the changes.")
+
+
 class FunctionNotFoundError(ScarError):
     """
     The requested function does not exist.
@@ -12,7 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Module with the methods used to make the HTTP requests.
+The downloads share a session that reuses the connections
+and retries the requests that fail temporarily."""
+
+import threading
+from typing import Any, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Connection and read timeouts of the downloads (in seconds)
+_TIMEOUT = (10, 60)
+_CHUNK_SIZE = 1048576
+_RETRIES = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                 raise_on_status=False)
+_POOL_SIZE = 16
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the session shared by all the downloads."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = requests.Session()
+            adapter = HTTPAdapter(max_retries=_RETRIES, pool_maxsize=_POOL_SIZE)
+            _SESSION.mount('http://', adapter)
+            _SESSION.mount('https://', adapter)
+        return _SESSION
+
 
 def call_http_endpoint(url, **kwargs):
     """Does a 'GET' or 'PUT' request if the parameter 'data' exists or not respectively
@@ -28,8 +58,40 @@ def call_http_endpoint(url, **kwargs):
         response = requests.get(url, **kwargs)
     return response
 
-def get_file(url):
-    response = requests.get(url)
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Does a 'GET' request using the shared session.
+    The arguments are the same as in 'requests.get'."""
+    kwargs.setdefault('timeout', _TIMEOUT)
+    return get_session().get(url, **kwargs)
+
+
+def get_file(url: str) -> Optional[bytes]:
+    """Returns the content of the url or None if the request fails.
+    Use 'download_file' with the big files."""
+    response = get(url)
     if response:
         return response.content
-    
\ No newline at end of file
+    return None
+
+
+def download_file(url: str, *sinks: Any) -> int:
+    """Streams the content of the url to the sinks passed, that can be
+    file objects (write) or hash objects (update). Returns the size
+    downloaded and raises 'requests.HTTPError' if the request fails."""
+    with get(url, stream=True) as response:
+        response.raise_for_status()
+        size = 0
+        for chunk in response.iter_content(chunk_size=_CHUNK_SIZE):
+            for sink in sinks:
+                if hasattr(sink, 'update'):
+                    sink.update(chunk)
+                else:
+                    sink.write(chunk)
+            size += len(chunk)
+        # Detect the truncated downloads (only if the content is not encoded)
+        content_length = response.headers.get('Content-Length')
+        if content_length and 'Content-Encoding' not in response.headers and int(content_length) != size:
+            raise requests.exceptions.RequestException(
+                f"Incomplete download of '{url}': {size} of {content_length} bytes.")
+    return size
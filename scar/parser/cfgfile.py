@@ -22,7 +22,15 @@ from scar.utils import FileUtils, SysUtils, StrUtils
 
 _DEFAULT_CFG = {
     "scar": {
-        "config_version": "1.1.0"
+        "config_version": "1.1.0",
+        # Local folder or HTTP URL used instead of GitHub to get the FaaS Supervisor
+        # releases. The local folders are filled with 'scar cache sync'.
+        "supervisor_mirror": "",
+        # Local cache of supervisor releases, function packages and udocker images
+        # The least recently used entries are removed when it exceeds 'max_size' (0 disables it)
+        "cache": {
+            "max_size": "5GB"
+        }
     },
     "oscar": {
         "my_oscar": {
@@ -65,7 +73,8 @@ _DEFAULT_CFG = {
                     "UDOCKER_EXEC": "/opt/udocker/udocker.py"}},
             "deployment": {
                 "max_payload_size": 52428800,
-                "max_s3_payload_size": 262144000
+                "max_s3_payload_size": 262144000,
+                "package_cache": True
             },
             "container": {
                 "environment" : {
@@ -128,7 +137,12 @@ _DEFAULT_CFG = {
         "cloudwatch": {
             "boto_profile": "default",
             "region": "us-east-1",
-            "log_retention_policy_in_days": 30
+            "log_retention_policy_in_days": 30,
+            # Local cache of the log events used to get the logs by request id
+            "log_cache": {
+                "enabled": True,
+                "max_size": 104857600
+            }
         },
         "batch": {
             "multi_node_parallel": {
@@ -204,6 +218,15 @@ class ConfigFileParser():
         """Returns the configuration data of the configuration file."""
         return self.cfg_data
 
+    @staticmethod
+    def get_default_value(*keys: str):
+        """Returns the default value of the property with the keys passed
+        (i.e. 'aws', 'cloudwatch', 'log_retention_policy_in_days')."""
+        value = _DEFAULT_CFG
+        for key in keys:
+            value = value[key]
+        return value
+
     def get_udocker_zip_url(self):
         """Returns the url where the udocker zip is stored."""
         return self.cfg_data['scar']['udocker_info']['zip_url']
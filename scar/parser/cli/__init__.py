@@ -53,7 +53,8 @@ def _set_args(args: Dict, key: str, val: str) -> None:
 
 def _parse_scar_args(cmd_args: Dict) -> Dict:
     scar_args = ['conf_file', 'json', 'verbose', 'path', 'execution_mode',
-                 'output_file', 'supervisor_version', 'all']
+                 'output_file', 'supervisor_version', 'all', 'since', 'apply', 'workers',
+                 'cache_action', 'mirror_dir', 'max_size']
     return {'scar' : DataTypesUtils.parse_arg_list(scar_args, cmd_args)}
 
 
@@ -112,7 +113,7 @@ def _parse_batch_args(cmd_args: Dict) -> Dict:
 
 
 def _parse_cloudwatchlogs_args(cmd_args: Dict) -> Dict:
-    cw_log_args = ['log_stream_name', 'request_id']
+    cw_log_args = ['log_stream_name', 'request_id', 'object_key', 'request_ids_file', 'output_dir', 'follow']
     return DataTypesUtils.parse_arg_list(cw_log_args, cmd_args)
 
 
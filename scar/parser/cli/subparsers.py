@@ -19,11 +19,12 @@ PROFILE = "profile_parser"
 EXEC = "exec_parser"
 STORAGE = "storage_parser"
 
-INIT_PARENTS = [PROFILE, FUNCTION_DEFINITION, OUTPUT]
+INIT_UPDATE_PARENTS = [PROFILE, FUNCTION_DEFINITION, OUTPUT]
 INVOKE_PARENTS = [PROFILE, EXEC]
 RUN_PARENTS = [PROFILE, EXEC, OUTPUT]
 RM_LS_PARENTS = [PROFILE, OUTPUT]
 LOG_PARENTS = [PROFILE]
+STATS_TUNE_PARENTS = [PROFILE, OUTPUT]
 PUT_GET_PARENTS = [PROFILE, STORAGE]
 
 
@@ -41,7 +42,7 @@ class Subparsers():
 
     def _add_init_parser(self):
         init = self.subparser.add_parser('init',
-                                         parents=self._get_parents(INIT_PARENTS),
+                                         parents=self._get_parents(INIT_UPDATE_PARENTS),
                                          help="Create lambda function")
         # Set default function
         init.set_defaults(func="init")
@@ -68,6 +69,32 @@ class Subparsers():
         # API Gateway conf
         init.add_argument("-api", "--api-gateway-name",
                           help="API Gateway name created to launch the lambda function")
+        init.add_argument("-w", "--workers", type=int,
+                          help=("Maximum number of resources created concurrently "
+                                "(i.e. log groups, buckets or other functions). Default 8."))
+
+    def _add_update_parser(self):
+        update = self.subparser.add_parser('update',
+                                           parents=self._get_parents(INIT_UPDATE_PARENTS),
+                                           help="Update the code and configuration of a lambda function")
+        # Set default function
+        update.set_defaults(func="update")
+        group = update.add_mutually_exclusive_group(required=True)
+        group.add_argument("-n", "--name", help="Lambda function name")
+        group.add_argument("-f", "--conf-file",
+                           help="Yaml file with the function configuration")
+        update.add_argument("-i", "--image",
+                            help="Container image id (i.e. centos:7)")
+        update.add_argument("-if", "--image-file",
+                            help=("Container image file created with "
+                                  "'docker save' (i.e. centos.tar.gz)"))
+        update.add_argument("-s", "--init-script", help=("Path to the input file "
+                                                         "passed to the function"))
+        update.add_argument("-ep", "--extra-payload",
+                            help=("Folder containing files that are going to be "
+                                  "added to the lambda function"))
+        update.add_argument("-db", "--deployment-bucket",
+                            help="Bucket where the deployment package is going to be uploaded.")
 
     def _add_invoke_parser(self):
         invoke = self.subparser.add_parser('invoke',
@@ -135,6 +162,17 @@ class Subparsers():
                          help="Return the output for the log stream specified.")
         log.add_argument("-ri", "--request-id",
                          help="Return the output for the request id specified.")
+        log.add_argument("-k", "--object-key",
+                         help="Return the output of the requests triggered by the S3 object key specified.")
+        log.add_argument("-rf", "--request-ids-file",
+                         help=("File with one request id per line. The output of each request "
+                               "is stored in the file '<request_id>.log' of the output dir."))
+        log.add_argument("-od", "--output-dir",
+                         help="Folder where the request logs are stored. Default: current folder.")
+        log.add_argument("-fw", "--follow",
+                         help=("Keep showing the logs of the batch jobs of the request id "
+                               "until all of them finish."),
+                         action="store_true")
 
     def _add_ls_parser(self):
         ls = self.subparser.add_parser('ls',
@@ -159,3 +197,67 @@ class Subparsers():
         # Set default function
         get.set_defaults(func='get')
 
+    def _add_stats_parser(self):
+        stats = self.subparser.add_parser('stats',
+                                          parents=self._get_parents(STATS_TUNE_PARENTS),
+                                          help="Show the invocation statistics of the lambda function")
+        # Set default function
+        stats.set_defaults(func='stats')
+        group = stats.add_mutually_exclusive_group(required=True)
+        group.add_argument("-n", "--name",
+                           help="Lambda function name")
+        group.add_argument("-f", "--conf-file",
+                           help="Yaml file with the function configuration")
+        stats.add_argument("-si", "--since",
+                           help=("Time window of the invocations analyzed "
+                                 "(i.e. '30m', '12h', '7d'). Default '1d'."))
+
+    def _add_tune_parser(self):
+        tune = self.subparser.add_parser('tune',
+                                         parents=self._get_parents(STATS_TUNE_PARENTS),
+                                         help=("Recommend the memory and timeout of the lambda "
+                                               "function based on its recent invocations"))
+        # Set default function
+        tune.set_defaults(func='tune')
+        group = tune.add_mutually_exclusive_group(required=True)
+        group.add_argument("-n", "--name",
+                           help="Lambda function name")
+        group.add_argument("-f", "--conf-file",
+                           help="Yaml file with the function configuration")
+        tune.add_argument("-si", "--since",
+                          help=("Time window of the invocations analyzed "
+                                "(i.e. '30m', '12h', '7d'). Default '1d'."))
+        tune.add_argument("-ap", "--apply",
+                          help="Update the function with the recommended configuration",
+                          action="store_true")
+
+    def _add_cache_parser(self):
+        cache = self.subparser.add_parser('cache',
+                                          help="Manage the local files used to deploy functions")
+        # Set default function
+        cache.set_defaults(func='cache')
+        actions = cache.add_subparsers(title='Cache commands', dest='cache_action')
+        actions.required = True
+        sync = actions.add_parser('sync',
+                                  help=("Download the FaaS Supervisor releases to a local folder "
+                                        "that can be used as supervisor mirror"))
+        sync.add_argument("-sv", "--supervisor-version", action="append",
+                          help=("FaaS Supervisor version to download. Can be a tag or 'latest'. "
+                                "Can be set several times. Default 'latest'."))
+        sync.add_argument("-d", "--mirror-dir",
+                          help=("Folder where the releases are stored. Default: the supervisor "
+                                "mirror if it's a local folder or the SCAR cache folder."))
+        actions.add_parser('ls',
+                           parents=self._get_parents([OUTPUT]),
+                           help="List the cache entries and their last use")
+        prune = actions.add_parser('prune',
+                                   parents=self._get_parents([OUTPUT]),
+                                   help="Remove the least recently used cache entries")
+        prune.add_argument("-ms", "--max-size",
+                           help=("Size of the cache after the prune (i.e. '500MB', '2GB' or 0 to remove "
+                                 "all the entries). Default: the 'max_size' of the configuration file."))
+        warm = actions.add_parser('warm',
+                                  parents=self._get_parents([PROFILE]),
+                                  help="Download the supervisor files used by the functions")
+        warm.add_argument("-f", "--conf-file",
+                          help="Yaml file with the functions configuration")
@@ -18,7 +18,10 @@ from scar.providers.aws import GenericClient
 import scar.logger as logger
 from scar.providers.aws.launchtemplates import LaunchTemplates
 from scar.providers.aws.functioncode import create_function_config
-from scar.utils import FileUtils, StrUtils
+from scar.utils import DataTypesUtils, FileUtils, StrUtils
+
+# Maximum number of jobs accepted by each 'describe_jobs' call
+_DESCRIBE_JOBS_MAX = 100
 
 
 def _get_job_definitions(jobs_info: Dict) -> List:
@@ -26,6 +29,22 @@ def _get_job_definitions(jobs_info: Dict) -> List:
             for job_def in jobs_info.get('jobDefinitions', {})]
 
 
+def _get_job_container(job_def: Dict) -> Dict:
+    if 'nodeProperties' in job_def:
+        return job_def['nodeProperties'].get('nodeRangeProperties', [{}])[0].get('container', {})
+    return job_def.get('containerProperties', {})
+
+
+def _is_job_definition_changed(deployed_job_def: Dict, job_def: Dict) -> bool:
+    """Compares the values of the job definitions that depend on the function definition."""
+    deployed_container = _get_job_container(deployed_job_def)
+    container = _get_job_container(job_def)
+    return (deployed_job_def.get('type') != job_def.get('type') or
+            deployed_container.get('image') != container.get('image') or
+            {var.get('name'): var.get('value') for var in deployed_container.get('environment', [])} !=
+            {var.get('name'): var.get('value') for var in container.get('environment', [])})
+
+
 class Batch(GenericClient):
 
     def __init__(self, resources_info):
@@ -231,6 +250,21 @@ class Batch(GenericClient):
                 logger.info(f"Registering '{self.function_name}' job definition.")
                 return self.client.register_job_definition(**creation_args)
 
+    def update_job_definition(self) -> bool:
+        """Registers a new revision of the job definition if the script, the
+        configuration or the variables of the function changed (the jobs use
+        the latest revision). Returns True if a new revision was registered."""
+        self._set_required_environment_variables()
+        job_def_args = self._get_job_definition_args()
+        job_info = self.client.describe_job_definitions(jobDefinitionName=self.function_name, status='ACTIVE')
+        deployed_job_def = max(job_info.get('jobDefinitions', []),
+                               key=lambda job_def: job_def.get('revision', 0), default={})
+        if not _is_job_definition_changed(deployed_job_def, job_def_args):
+            return False
+        logger.info(f"Registering a new revision of the '{self.function_name}' job definition.")
+        self.client.register_job_definition(**job_def_args)
+        return True
+
     def delete_compute_environment(self):
         self._delete_job_definitions()
         self._delete_job_queue()
@@ -245,6 +279,26 @@ class Batch(GenericClient):
         describe_args = {'jobs': [self.resources_info.get('cloudwatch').get('request_id')]}
         return self.client.describe_jobs(**describe_args)
 
+    def describe_jobs(self, job_ids: List) -> List:
+        """Returns the description of the jobs passed."""
+        jobs = []
+        if job_ids:
+            for chunk in DataTypesUtils.divide_list_in_chunks(job_ids, _DESCRIBE_JOBS_MAX):
+                jobs.extend(self.client.describe_jobs(jobs=chunk).get('jobs', []))
+        return jobs
+
+    def get_job_nodes(self, jobs: List) -> List:
+        """Returns the jobs passed followed by the nodes of the
+        multi-node parallel jobs and the children of the array jobs."""
+        child_ids = []
+        for job in jobs:
+            job_id = job.get('jobId', '')
+            num_nodes = job.get('nodeProperties', {}).get('numNodes', 0)
+            child_ids.extend(f'{job_id}#{index}' for index in range(num_nodes))
+            array_size = job.get('arrayProperties', {}).get('size', 0)
+            child_ids.extend(f'{job_id}:{index}' for index in range(array_size))
+        return jobs + self.describe_jobs(child_ids)
+
 #     def exist_job(self, job_id: str) -> bool:
 #         response = self.describe_jobs(job_id)
 #         return len(response["jobs"]) != 0
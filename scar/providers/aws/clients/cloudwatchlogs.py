@@ -14,7 +14,7 @@
 """Module with the class necessary to manage the
 Cloudwatch Logs creation, deletion and configuration."""
 
-from typing import Dict, List
+from typing import Dict, Generator, List
 from botocore.exceptions import ClientError
 from scar.providers.aws.clients import BotoClient
 from scar.exceptions import exception, ExistentLogGroupWarning, NotExistentLogGroupWarning
@@ -39,6 +39,16 @@ class CloudWatchLogsClient(BotoClient):
             log_events.extend(self.get_log_events(**kwargs))
         return log_events
 
+    def iter_log_events(self, **kwargs: Dict) -> Generator[Dict, None, None]:
+        """Yields the log events from the specified log group
+        retrieving the pages lazily."""
+        while True:
+            logs_info = self.client.filter_log_events(**kwargs)
+            yield from logs_info.get('events', [])
+            if 'nextToken' not in logs_info:
+                break
+            kwargs['nextToken'] = logs_info['nextToken']
+
     @exception(logger)
     def create_log_group(self, **kwargs: Dict) -> Dict:
         """Creates a log group with the specified name."""
@@ -58,6 +58,13 @@ class ElasticContainerRegistryClient(BotoClient):
         except Exception:
             return None
 
+    @exception(logger)
+    def describe_images(self, **kwargs: Dict) -> Dict:
+        try:
+            return self.client.describe_images(**kwargs)
+        except self.client.exceptions.ImageNotFoundException:
+            return None
+
     @exception(logger)
     def create_repository(self, repository_name: str):
         return self.client.create_repository(repositoryName=repository_name)
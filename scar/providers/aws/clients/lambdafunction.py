@@ -15,6 +15,7 @@
 Lambda function and layers creation, deletion and configuration."""
 
 from typing import Dict, List, Optional
+from botocore.exceptions import ClientError
 from scar.providers.aws.clients import BotoClient
 import scar.exceptions as excp
 import scar.logger as logger
@@ -27,6 +28,8 @@ class LambdaClient(BotoClient):
 
     # Parameter used by the parent to create the appropriate boto3 client
     _BOTO_CLIENT_NAME = 'lambda'
+    # Layer version ARN to description, shared by all the clients
+    _LAYER_DESCRIPTIONS = {}
 
     @excp.exception(logger)
     def create_function(self, **kwargs: Dict) -> Dict:
@@ -60,11 +63,23 @@ class LambdaClient(BotoClient):
             # {'Arn': 'arn:aws:lambda:us-east-1:974349055189:layer:faas-supervisor:1'}
             arn_fields = layer_arn.split(":")
             if arn_fields[-2] == 'faas-supervisor':
-                layer_info = self.client.get_layer_version(LayerName='faas-supervisor',
-                                                           VersionNumber=int(arn_fields[-1]))
-                version = layer_info.get('Description', '-')
+                version = self._get_layer_description(layer_arn, 'faas-supervisor', int(arn_fields[-1]))
         return version
 
+    def _get_layer_description(self, layer_arn: str, layer_name: str, version_number: int) -> str:
+        """Returns the description of the layer version. The layer versions can't be
+        modified, so the descriptions are stored and requested once per execution."""
+        if layer_arn not in self._LAYER_DESCRIPTIONS:
+            layer_info = self.get_layer_version(layer_name, version_number)
+            self._LAYER_DESCRIPTIONS[layer_arn] = layer_info.get('Description', '-')
+        return self._LAYER_DESCRIPTIONS[layer_arn]
+
+    @excp.exception(logger)
+    def update_function_code(self, **kwargs: Dict) -> Dict:
+        """Updates the code of the specified Lambda function."""
+        logger.debug("Updating lambda function code.")
+        return self.client.update_function_code(**kwargs)
+
     @excp.exception(logger)
     def update_function_configuration(self, **kwargs: Dict) -> Dict:
         """Updates the configuration parameters for the specified
@@ -118,6 +133,16 @@ class LambdaClient(BotoClient):
             versions.extend(self.list_layer_versions(layer_name, next_token=layer_versions_info['NextMarker']))
         return versions
 
+    def get_layer_version(self, layer_name: str, version_number: int) -> Dict:
+        """Returns the information of the layer version or
+        an empty dictionary if it doesn't exist."""
+        try:
+            return self.client.get_layer_version(LayerName=layer_name, VersionNumber=version_number)
+        except ClientError as cerr:
+            if cerr.response['Error']['Code'] == 'ResourceNotFoundException':
+                return {}
+            raise cerr
+
     @excp.exception(logger)
     def delete_function(self, function_name: str) -> Dict:
         """Deletes the specified Lambda
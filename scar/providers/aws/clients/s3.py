@@ -64,6 +64,18 @@ class S3Client(BotoClient):
         """Adds an object to a bucket."""
         return self.client.put_object(**kwargs)
 
+    @exception(logger)
+    def get_object_metadata(self, bucket: str, key: str) -> Dict:
+        """Returns the user metadata of an object or
+        an empty dictionary if the object doesn't exist."""
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key).get('Metadata', {})
+        except ClientError as cerr:
+            # Object not found (HEAD responses don't have body)
+            if cerr.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return {}
+            raise cerr
+
     @exception(logger)
     def download_file(self, **kwargs: Dict) -> Dict:
         """Download an object from S3 to a file-like object."""
@@ -14,12 +14,24 @@
 """Module with classes and methods to manage the
 CloudWatch Log functionalities at high level."""
 
-from typing import List, Dict
+import time
+from multiprocessing.pool import ThreadPool
+from typing import Callable, Dict, Generator, Iterable, List, Set
 from botocore.exceptions import ClientError
 from scar.providers.aws import GenericClient
 from scar.providers.aws.batchfunction import Batch
+from scar.providers.aws.logcache import LogCache, parse_request_line
+from scar.providers.aws.reportstats import REPORT_FILTER_PATTERN
+from scar.parser.cfgfile import ConfigFileParser
+from scar.utils import FileUtils
 import scar.logger as logger
 
+_LOG_CACHE_FILE_NAME = 'logs.db'
+_BATCH_LOG_GROUP = '/aws/batch/job'
+_BATCH_FINAL_STATUSES = ('SUCCEEDED', 'FAILED')
+_MAX_LOG_STREAM_THREADS = 10
+_FOLLOW_POLL_INTERVAL = 5
+
 
 def _parse_events_in_message(log_events: List) -> str:
     data = [(event.get('message', ''), event.get('timestamp', '')) for event in log_events]
@@ -27,6 +39,56 @@ def _parse_events_in_message(log_events: List) -> str:
     return "".join([sdata[0] for sdata in sorted_data])
 
 
+def _get_job_log_stream(job: Dict) -> str:
+    return job.get('container', {}).get('logStreamName', '')
+
+
+def _get_job_header(job: Dict) -> str:
+    header = f"Batch job '{job.get('jobId', '')}' status: {job.get('status', '')}"
+    if job.get('statusReason'):
+        header += f" ({job.get('statusReason')})"
+    return header
+
+
+class RequestLogsExtractor():
+    """Extracts in a single pass the log spans (from the START to the
+    REPORT line) of a set of request ids. The events can belong to
+    different log streams, only the lines of the spans still open
+    are kept in memory."""
+
+    def __init__(self, request_ids: Iterable[str], on_span: Callable[[str, str], None]):
+        self.request_ids = set(request_ids)
+        self.on_span = on_span
+        self.found = set()
+        # Log stream -> (request id, lines) of the span being extracted
+        self._open_spans = {}
+
+    def add_event(self, message: str, log_stream: str = '') -> None:
+        """Processes a log event. Calls 'on_span' with the request id
+        and the span logs when the span of a requested id is complete."""
+        request_line = parse_request_line(message)
+        if request_line and request_line[0] == 'START':
+            # A new request starts in the stream, so the previous one was interrupted
+            self._close_span(log_stream)
+            if request_line[1] in self.request_ids:
+                self._open_spans[log_stream] = (request_line[1], [message])
+        elif log_stream in self._open_spans:
+            self._open_spans[log_stream][1].append(message)
+            if request_line and request_line[0] == 'REPORT':
+                self._close_span(log_stream)
+
+    def _close_span(self, log_stream: str) -> None:
+        if log_stream in self._open_spans:
+            request_id, lines = self._open_spans.pop(log_stream)
+            self.found.add(request_id)
+            self.on_span(request_id, ''.join(lines))
+
+    def close(self) -> None:
+        """Flushes the spans not completed when the events ended."""
+        for log_stream in list(self._open_spans):
+            self._close_span(log_stream)
+
+
 class CloudWatchLogs(GenericClient):
     """Manages the AWS CloudWatch Logs functionality"""
 
@@ -52,24 +114,49 @@ class CloudWatchLogs(GenericClient):
         return line.startswith('START') and self.cloudwatch.get('request_id') in line
 
     def _parse_logs_with_requestid(self, function_logs: str) -> str:
-        parsed_msg = ""
+        parsed_lines = []
         if function_logs:
             in_req_id_logs = False
             for line in function_logs.split('\n'):
                 if self._is_start_line(line):
-                    parsed_msg += f'{line}\n'
+                    parsed_lines.append(f'{line}\n')
                     in_req_id_logs = True
                 elif self._is_end_line(line):
-                    parsed_msg += line
+                    parsed_lines.append(line)
                     break
                 elif in_req_id_logs:
-                    parsed_msg += f'{line}\n'
-        return parsed_msg
+                    parsed_lines.append(f'{line}\n')
+        return ''.join(parsed_lines)
+
+    def _is_log_cache_enabled(self) -> bool:
+        return (self.cloudwatch.get('log_cache', {}).get('enabled', False) and
+                (self.cloudwatch.get('request_id', False) or self.cloudwatch.get('object_key', False)))
+
+    def _get_log_cache(self) -> LogCache:
+        cache_info = self.cloudwatch.get('log_cache', {})
+        db_path = cache_info.get('path') or FileUtils.join_paths(ConfigFileParser.config_file_folder,
+                                                                 _LOG_CACHE_FILE_NAME)
+        max_size = cache_info.get('max_size', ConfigFileParser.get_default_value('aws', 'cloudwatch',
+                                                                                'log_cache', 'max_size'))
+        return LogCache(db_path, max_size)
+
+    def _get_cached_lambda_logs(self) -> str:
+        """Returns the Lambda logs of the request id (or object key)
+        using the local log cache."""
+        request_ids = [self.cloudwatch.get('request_id')] if self.cloudwatch.get('request_id', False) else []
+        with self._get_log_cache() as log_cache:
+            return log_cache.get_logs(self.client,
+                                      self.get_log_group_name(),
+                                      log_stream=self.cloudwatch.get('log_stream_name', ''),
+                                      request_ids=request_ids,
+                                      object_key=self.cloudwatch.get('object_key', ''))
 
     def _get_lambda_logs(self):
         """Returns Lambda logs for an specific lambda function."""
         function_logs = ""
         try:
+            if self._is_log_cache_enabled():
+                return self._get_cached_lambda_logs()
             kwargs = self._get_log_group_name_arg()
             if self.cloudwatch.get("log_stream_name", False):
                 kwargs["logStreamNames"] = [self.cloudwatch.get("log_stream_name")]
@@ -80,20 +167,72 @@ class CloudWatchLogs(GenericClient):
             logger.warning("Error getting the function logs: %s" % cerr)
         return function_logs
 
+    def _map_log_streams(self, func: Callable, log_streams: List) -> List:
+        """Applies 'func' to each log stream concurrently keeping the order."""
+        if not log_streams:
+            return []
+        pool = ThreadPool(processes=min(len(log_streams), _MAX_LOG_STREAM_THREADS))
+        try:
+            return pool.map(func, log_streams)
+        finally:
+            pool.close()
+
+    def _get_batch_stream_events(self, log_stream: str, start_time: int = None) -> List:
+        if not log_stream:
+            return []
+        kwargs = {'logGroupName': _BATCH_LOG_GROUP, 'logStreamNames': [log_stream]}
+        if start_time is not None:
+            kwargs['startTime'] = start_time
+        return self.client.get_log_events(**kwargs)
+
     def _get_batch_job_log(self, jobs_info: List) -> str:
-        """Returns Batch logs for an specific job."""
-        batch_logs = ""
-        if jobs_info:
-            job = jobs_info[0]
-            batch_logs += f"Batch job status: {job.get('status', '')}\n"
-            kwargs = {'logGroupName': "/aws/batch/job"}
-            if job.get("status", "") == "SUCCEEDED":
-                kwargs['logStreamNames'] = [job.get("container", {}).get("logStreamName", "")]
-                batch_events = self.client.get_log_events(**kwargs)
-                msgs = [event.get('message', '')
-                        for event in batch_events]
-                batch_logs += '\n'.join(msgs)
-        return batch_logs
+        """Returns the Batch logs of the jobs passed, fetching
+        the log streams of the jobs concurrently."""
+        streams_events = self._map_log_streams(self._get_batch_stream_events,
+                                               [_get_job_log_stream(job) for job in jobs_info])
+        jobs_logs = []
+        for job, events in zip(jobs_info, streams_events):
+            messages = [_get_job_header(job)] + [event.get('message', '') for event in events]
+            jobs_logs.append('\n'.join(messages))
+        return '\n'.join(jobs_logs)
+
+    def _get_new_batch_messages(self, log_stream: str, last_events: Dict) -> List:
+        """Returns the messages of the log stream not retrieved yet.
+        'last_events' stores the timestamp and the event ids of
+        the last events retrieved from each log stream."""
+        last_timestamp, last_ids = last_events.get(log_stream, (None, set()))
+        events = [event for event in self._get_batch_stream_events(log_stream, last_timestamp)
+                  if event.get('eventId') not in last_ids]
+        if events:
+            timestamp = max(event.get('timestamp', 0) for event in events)
+            ids = {event.get('eventId') for event in events if event.get('timestamp', 0) == timestamp}
+            if timestamp == last_timestamp:
+                ids.update(last_ids)
+            last_events[log_stream] = (timestamp, ids)
+        return [event.get('message', '') for event in sorted(events, key=lambda evt: evt.get('timestamp', 0))]
+
+    def follow_batch_logs(self, poll_interval: int = _FOLLOW_POLL_INTERVAL) -> Generator[str, None, None]:
+        """Yields the status changes and the new log messages of the Batch jobs
+        (and their nodes) with the request id until all of them finish."""
+        batch = Batch(self.resources_info)
+        job_ids = [self.cloudwatch.get('request_id')]
+        statuses = {}
+        last_events = {}
+        while True:
+            jobs = batch.get_job_nodes(batch.describe_jobs(job_ids))
+            for job in jobs:
+                if statuses.get(job.get('jobId')) != job.get('status'):
+                    statuses[job.get('jobId')] = job.get('status')
+                    yield _get_job_header(job)
+            log_streams = [_get_job_log_stream(job) for job in jobs if _get_job_log_stream(job)]
+            streams_messages = self._map_log_streams(
+                lambda log_stream: self._get_new_batch_messages(log_stream, last_events), log_streams)
+            for messages in streams_messages:
+                if messages:
+                    yield '\n'.join(messages)
+            if all(job.get('status') in _BATCH_FINAL_STATUSES for job in jobs):
+                break
+            time.sleep(poll_interval)
 
     def create_log_group(self) -> Dict:
         """Creates a CloudWatch Log Group."""
@@ -110,11 +249,54 @@ class CloudWatchLogs(GenericClient):
         """Deletes a CloudWatch Log Group."""
         return self.client.delete_log_group(log_group_name)
 
+    def get_report_messages(self, start_time: int, end_time: int=None) -> Generator[str, None, None]:
+        """Yields the REPORT log lines of the function generated in the time window passed."""
+        kwargs = self._get_log_group_name_arg()
+        kwargs['filterPattern'] = REPORT_FILTER_PATTERN
+        kwargs['startTime'] = start_time
+        if end_time:
+            kwargs['endTime'] = end_time
+        for event in self.client.iter_log_events(**kwargs):
+            yield event.get('message', '')
+
+    def extract_request_logs(self, request_ids: Iterable[str], output_dir: str) -> Set[str]:
+        """Retrieves the function logs once and writes the logs of each
+        request id passed to the file '<output_dir>/<request_id>.log'.
+        Returns the request ids found."""
+        FileUtils.create_folder(output_dir)
+        written = set()
+
+        def _write_span(request_id: str, logs: str) -> None:
+            # The retries of a request share the request id, so its spans are appended,
+            # but the file of a previous extraction is overwritten on the first write
+            mode = 'a' if request_id in written else 'w'
+            written.add(request_id)
+            with open(FileUtils.join_paths(output_dir, f'{request_id}.log'), mode) as log_file:
+                log_file.write(logs)
+
+        extractor = RequestLogsExtractor(request_ids, _write_span)
+        kwargs = self._get_log_group_name_arg()
+        if self.cloudwatch.get("log_stream_name", False):
+            kwargs["logStreamNames"] = [self.cloudwatch.get("log_stream_name")]
+        for event in self.client.iter_log_events(**kwargs):
+            extractor.add_event(event.get('message', ''), event.get('logStreamName', ''))
+        extractor.close()
+        return extractor.found
+
     def get_aws_logs(self) -> str:
         """Returns Cloudwatch logs for an specific lambda function and batch job (if any)."""
         aws_logs = self._get_lambda_logs()
         batch_logs = ""
         if self.resources_info.get('cloudwatch').get('request_id', False):
-            batch_jobs = Batch(self.resources_info).get_jobs_with_request_id()
-            batch_logs = self._get_batch_job_log(batch_jobs["jobs"])
+            batch = Batch(self.resources_info)
+            batch_jobs = batch.get_job_nodes(batch.get_jobs_with_request_id().get('jobs', []))
+            batch_logs = self._get_batch_job_log(batch_jobs)
         return aws_logs + batch_logs if batch_logs else aws_logs
+
+    def follow_aws_logs(self) -> Generator[str, None, None]:
+        """Yields the Lambda logs of the request id and then the Batch logs
+        of its jobs as they are generated, until the jobs finish."""
+        aws_logs = self._get_lambda_logs()
+        if aws_logs:
+            yield aws_logs
+        yield from self.follow_batch_logs()
@@ -12,10 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import os.path
 import docker
 import scar.logger as logger
-from typing import Dict, Set
+from typing import Dict, List, Set
 from scar.providers.aws.ecr import ECR
 from scar.utils import FileUtils, SupervisorUtils
 from scar.providers.aws.functioncode import create_function_config
@@ -39,6 +40,14 @@ class ContainerImage:
             logger.info('Deleting ECR repo: %s' % repo_name)
             ecr_cli.delete_repository(repo_name)
 
+    @staticmethod
+    def get_ecr_image_digest(resources_info: Dict, image_uri: str) -> str:
+        """Returns the digest of the ECR image (None if it can't be obtained)."""
+        if ".dkr.ecr." not in image_uri or "/" not in image_uri:
+            return None
+        repo_name, _, image_tag = image_uri.split("/", 1)[1].partition(":")
+        return ECR(resources_info).get_image_digest(repo_name, image_tag or 'latest')
+
     @staticmethod
     def get_supervisor_zip(resources_info: Dict, supervisor_version: str) -> str:
         """Get from cache or download supervisor zip."""
@@ -94,12 +103,25 @@ class ContainerImage:
             logger.info('Creating ECR repository: %s' % repo_name)
             ecr_image = ecr_cli.create_repository(repo_name)
 
-        # Build and push the image to the ECR repo
         platform = None
         arch = resources_info.get('lambda').get('architectures', ['x86_64'])[0]
         if arch == 'arm64':
             platform = 'linux/arm64'
-        return ContainerImage._build_push_ecr_image(tmp_folder.name, ecr_image, platform, ecr_cli.get_authorization_token())
+        dclient = ContainerImage._get_docker_client()
+        # Skip the build if the repo already has an image with the same context
+        tags = ['latest']
+        context_tag = ContainerImage._get_context_tag(dclient, tmp_folder.name,
+                                                      resources_info.get('lambda').get('container').get('image'),
+                                                      platform)
+        if context_tag:
+            if ecr_cli.exists_image_tag(repo_name, context_tag):
+                logger.info('Using existent ECR image: %s:%s' % (ecr_image, context_tag))
+                return "%s:%s" % (ecr_image, context_tag)
+            tags.insert(0, context_tag)
+
+        # Build and push the image to the ECR repo
+        return ContainerImage._build_push_ecr_image(dclient, tmp_folder.name, ecr_image, tags, platform,
+                                                    ecr_cli.get_authorization_token())
 
     @staticmethod
     def _create_dockerfile_ecr_image(lambda_info: Dict) -> str:
@@ -131,19 +153,46 @@ class ContainerImage:
         image_name = container_info.get('image')
         if ":" not in image_name:
             image_name = "%s:latest" % image_name
-        if not container_info.get('create_image') and ".dkr.ecr." in image_name:
+        if ContainerImage.is_image_prepared(container_info):
             logger.info('Image already prepared in ECR.')
             return image_name
         return None
 
     @staticmethod
-    def _build_push_ecr_image(tmp_folder: str, ecr_image: str, platform: str, auth_token: Set) -> str:
+    def is_image_prepared(container_info: Dict) -> bool:
+        """Checks if the user set an image already prepared in ECR (no supervisor needed)."""
+        return not container_info.get('create_image') and ".dkr.ecr." in container_info.get('image')
+
+    @staticmethod
+    def _get_docker_client() -> docker.DockerClient:
         try:
-            dclient = docker.from_env()
+            return docker.from_env()
         except docker.errors.DockerException:
             raise Exception("Error getting docker client. Check if current user has the correct permissions (docker group).")
+
+    @staticmethod
+    def _get_context_tag(dclient: docker.DockerClient, tmp_folder: str, base_image: str, platform: str) -> str:
+        """Returns a tag with the hash of the build context (Dockerfile, supervisor,
+        function config and init script), the base image digest and the platform.
+        If the base image digest can't be obtained the image is always built."""
+        try:
+            base_image_digest = dclient.images.get_registry_data(base_image).id
+        except docker.errors.APIError as err:
+            logger.debug('Error getting the digest of the image %s: %s' % (base_image, err))
+            return None
+        hash_obj = hashlib.sha256()
+        hash_obj.update(('%s %s' % (base_image_digest, platform)).encode())
+        FileUtils.update_hash_with_path(hash_obj, tmp_folder)
+        return 'scar-%s' % hash_obj.hexdigest()
+
+    @staticmethod
+    def _build_push_ecr_image(dclient: docker.DockerClient, tmp_folder: str, ecr_image: str,
+                              tags: List[str], platform: str, auth_token: Set) -> str:
         logger.info('Building new ECR image: %s' % ecr_image)
-        dclient.images.build(path=tmp_folder, tag=ecr_image, pull=True, platform=platform)
+        image, _ = dclient.images.build(path=tmp_folder, tag="%s:%s" % (ecr_image, tags[0]), pull=True,
+                                        platform=platform)
+        for tag in tags[1:]:
+            image.tag(ecr_image, tag)
 
         # Login to the ECR registry
         # Known issue it does not work in Widnows WSL environment
@@ -153,8 +202,9 @@ class ContainerImage:
 
         # Push the image, and change it in the container image to use it insteads of the user one
         logger.info('Pushing new image to ECR ...')
-        for line in dclient.images.push(ecr_image, stream=True, decode=True):
-            logger.debug(line)
-            if 'error' in line:
-                raise Exception("Error pushing image: %s" % line['errorDetail']['message'])
-        return "%s:latest" % ecr_image
\ No newline at end of file
+        for tag in tags:
+            for line in dclient.images.push(ecr_image, tag=tag, stream=True, decode=True):
+                logger.debug(line)
+                if 'error' in line:
+                    raise Exception("Error pushing image: %s" % line['errorDetail']['message'])
+        return "%s:%s" % (ecr_image, tags[0])
\ No newline at end of file
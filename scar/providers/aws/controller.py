@@ -14,8 +14,9 @@
 """Module with classes and methods used to manage the AWS tools."""
 
 import os
-from typing import Dict
+from typing import Dict, List
 from copy import deepcopy
+from functools import partial
 from scar.cmdtemplate import Commands
 from scar.providers.aws.apigateway import APIGateway
 from scar.providers.aws.batchfunction import Batch
@@ -23,15 +24,24 @@ from scar.providers.aws.cloudwatchlogs import CloudWatchLogs
 from scar.providers.aws.iam import IAM
 from scar.providers.aws.lambdafunction import Lambda
 # from scar.providers.aws.properties import AwsProperties, ScarProperties
+from scar.providers.aws.reportstats import (InvocationStats, get_start_time, has_enough_invocations,
+                                            recommend_configuration, is_configuration_changed)
 from scar.providers.aws.resourcegroups import ResourceGroups
 from scar.providers.aws.s3 import S3, get_bucket_and_folders
 from scar.providers.aws.validators import AWSValidator
 import scar.exceptions as excp
 import scar.logger as logger
 import scar.providers.aws.response as response_parser
+from scar.cache import CacheManager, parse_size
+from scar.scheduler import TaskScheduler
 from scar.utils import StrUtils, FileUtils, SupervisorUtils
+from scar.parser.cfgfile import ConfigFileParser
 
 _ACCOUNT_ID_REGEX = r'\d{12}'
+_DEFAULT_STATS_TIME_WINDOW = '1d'
+_DEFAULT_TIMEOUT_THRESHOLD = 10
+# Maximum number of resources created concurrently by 'init'
+_DEFAULT_INIT_WORKERS = 8
 
 
 def _get_owner(resources_info: Dict):
@@ -74,6 +84,26 @@ def _check_preheat_function(resources_info: Dict):
 ############################################
 
 
+def _get_s3_paths(storages) -> list:
+    return [storage.get('path') for storage in storages or []
+            if storage.get('storage_provider') == 's3']
+
+
+def _check_recreation_needed(resources_info: Dict, deployed_fdl: Dict, deployed_config: Dict) -> None:
+    # The execution mode and the API Gateway are only configured on creation,
+    # so the update is aborted before applying any change
+    changed = []
+    if deployed_fdl.get('execution_mode', resources_info.get('lambda').get('execution_mode')) != \
+       resources_info.get('lambda').get('execution_mode'):
+        changed.append('execution_mode')
+    api_gateway_id = deployed_config.get('Environment', {}).get('Variables', {}).get('API_GATEWAY_ID')
+    if bool(resources_info.get('api_gateway', {}).get('name')) != bool(api_gateway_id):
+        changed.append('api_gateway')
+    if changed:
+        raise excp.FunctionRecreationNeededError(function_name=resources_info.get('lambda').get('name'),
+                                                 values=', '.join(changed))
+
+
 def _add_extra_aws_properties(scar: Dict, aws_resources: Dict) -> None:
     for resources_info in aws_resources:
         _add_tags(resources_info)
@@ -135,7 +165,12 @@ class AWS(Commands):
         self.aws_resources = self.raw_args.get('functions', {}).get('aws', [])
         self.storage_providers = self.raw_args.get('storage_providers', {})
         self.scar_info = self.raw_args.get('scar', {})
-        _add_extra_aws_properties(self.scar_info, self.aws_resources)
+        if func_call == 'cache':
+            # The cache commands only manage local files (no AWS credentials needed)
+            add_output(self.scar_info)
+        else:
+            _add_extra_aws_properties(self.scar_info, self.aws_resources)
+        SupervisorUtils.set_mirror(self.scar_info.get('supervisor_mirror'))
         # Call the user's command
         getattr(self, func_call)()
 
@@ -145,21 +180,66 @@ class AWS(Commands):
 
     @excp.exception(logger)
     def init(self) -> None:
+        functions = []
+        # Check all the functions before creating any resource
         for resources_info in self.aws_resources:
             resources_info = deepcopy(resources_info)
             # Check the specified supervisor version
             resources_info['lambda']['supervisor']['version'] = SupervisorUtils.check_supervisor_version(
                 resources_info.get('lambda').get('supervisor').get('version'))
             _check_function_defined(resources_info)
-            # We have to create the gateway before creating the function
-            self._create_api_gateway(resources_info)
-            self._create_lambda_function(resources_info)
-            self._create_log_group(resources_info)
-            self._create_s3_buckets(resources_info)
-            # The api_gateway permissions must be added after the function is created
-            self._add_api_gateway_permissions(resources_info)
-            self._create_batch_environment(resources_info)
-            _check_preheat_function(resources_info)
+            functions.append(resources_info)
+        # Download the supervisor files before creating any resource
+        self._warm_cache(functions)
+        scheduler = TaskScheduler(int(self.scar_info.get('workers', _DEFAULT_INIT_WORKERS)))
+        for index, resources_info in enumerate(functions):
+            self._add_init_tasks(scheduler, str(index), resources_info)
+        scheduler.run()
+        self._prune_cache()
+
+    def _add_init_tasks(self, scheduler: TaskScheduler, prefix: str, resources_info: Dict) -> None:
+        """Adds the creation of the function resources to the scheduler.
+        The resources without dependencies between them are created concurrently."""
+        def _task(step):
+            return f'{prefix}:{step}'
+        scheduler.add_task(_task('api_gateway'), partial(self._create_api_gateway, resources_info))
+        # We have to create the gateway before creating the function
+        scheduler.add_task(_task('lambda'), partial(self._create_lambda_function, resources_info),
+                           [_task('api_gateway')])
+        scheduler.add_task(_task('log_group'), partial(self._create_log_group, resources_info))
+        # The input buckets notifications need the function ARN
+        scheduler.add_task(_task('input_buckets'), partial(self._create_input_buckets, resources_info),
+                           [_task('lambda')])
+        scheduler.add_task(_task('output_buckets'), partial(self._create_output_buckets, resources_info))
+        # The api_gateway permissions must be added after the function is created
+        scheduler.add_task(_task('api_gateway_permissions'),
+                           partial(self._add_api_gateway_permissions, resources_info), [_task('lambda')])
+        scheduler.add_task(_task('batch'), partial(self._create_batch_environment, resources_info),
+                           [_task('lambda')])
+        scheduler.add_task(_task('preheat'), partial(_check_preheat_function, resources_info),
+                           [_task(step) for step in ('log_group', 'input_buckets', 'output_buckets',
+                                                     'api_gateway_permissions', 'batch')])
+
+    @excp.exception(logger)
+    def update(self) -> None:
+        for resources_info in self.aws_resources:
+            resources_info = deepcopy(resources_info)
+            # Check the specified supervisor version
+            resources_info['lambda']['supervisor']['version'] = SupervisorUtils.check_supervisor_version(
+                resources_info.get('lambda').get('supervisor').get('version'))
+            _check_function_not_defined(resources_info)
+            function_name = resources_info.get('lambda').get('name')
+            deployed_config = Lambda(resources_info).get_function_configuration()
+            deployed_fdl = Lambda(resources_info).get_fdl_config(function_name)
+            _check_recreation_needed(resources_info, deployed_fdl, deployed_config)
+            updated_values = Lambda(resources_info).update_function(deployed_config)
+            self._update_s3_buckets(resources_info, deployed_fdl)
+            if self._update_batch_job_definition(resources_info):
+                updated_values.append('JobDefinition')
+            response_parser.parse_lambda_function_update_response(function_name,
+                                                                  updated_values,
+                                                                  self.scar_info.get('cli_output'))
+        self._prune_cache()
 
     @excp.exception(logger)
     def invoke(self):
@@ -242,7 +322,116 @@ class AWS(Commands):
             index = _choose_function(self.aws_resources)
         # We only return the logs of one function each time
         if index >= 0:
-            logger.info(CloudWatchLogs(self.aws_resources[index]).get_aws_logs())
+            resources_info = self.aws_resources[index]
+            if resources_info.get('cloudwatch', {}).get('request_ids_file', False):
+                self._extract_request_logs(resources_info)
+            elif resources_info.get('cloudwatch', {}).get('follow', False):
+                for logs in CloudWatchLogs(resources_info).follow_aws_logs():
+                    logger.info(logs)
+            else:
+                logger.info(CloudWatchLogs(resources_info).get_aws_logs())
+
+    def _extract_request_logs(self, resources_info: Dict) -> None:
+        cloudwatch = resources_info.get('cloudwatch')
+        request_ids = {line.strip() for line in
+                       FileUtils.read_file(cloudwatch.get('request_ids_file')).splitlines()
+                       if line.strip()}
+        output_dir = cloudwatch.get('output_dir', os.getcwd())
+        found = CloudWatchLogs(resources_info).extract_request_logs(request_ids, output_dir)
+        logger.info(f"Logs of {len(found)} of {len(request_ids)} requests stored in '{output_dir}'.")
+        missing = request_ids - found
+        if missing:
+            logger.warning(f"Logs not found for the requests: {', '.join(sorted(missing))}")
+
+    @excp.exception(logger)
+    def stats(self):
+        start_time = get_start_time(self.scar_info.get('since', _DEFAULT_STATS_TIME_WINDOW))
+        functions_stats = [self._get_invocation_stats(resources_info, start_time)
+                           for resources_info in self.aws_resources]
+        response_parser.parse_stats_response(functions_stats, self.scar_info.get('cli_output'))
+
+    @excp.exception(logger)
+    def tune(self):
+        start_time = get_start_time(self.scar_info.get('since', _DEFAULT_STATS_TIME_WINDOW))
+        recommendations = []
+        for resources_info in self.aws_resources:
+            lambda_client = Lambda(resources_info)
+            timeout_threshold = resources_info.get('lambda').get('container', {}).get('timeout_threshold',
+                                                                                   _DEFAULT_TIMEOUT_THRESHOLD)
+            function_info = lambda_client.get_function_configuration()
+            # Only the invocations with the current memory are representative
+            summary = self._get_invocation_stats(resources_info, start_time, function_info.get('MemorySize'))
+            recommendation = recommend_configuration(summary, function_info, timeout_threshold)
+            if self.scar_info.get('apply', False) and has_enough_invocations(summary) and \
+               is_configuration_changed(recommendation):
+                lambda_client.update_function_configuration(MemorySize=recommendation['RecommendedMemory'],
+                                                            Timeout=recommendation['RecommendedTimeout'])
+                recommendation['Applied'] = True
+            recommendations.append(recommendation)
+        response_parser.parse_tune_response(recommendations, self.scar_info.get('cli_output'))
+
+    @excp.exception(logger)
+    def cache(self):
+        getattr(self, f"_cache_{self.scar_info.get('cache_action')}")()
+
+    def _cache_sync(self):
+        mirror_dir = self.scar_info.get('mirror_dir') or SupervisorUtils.get_mirror_dir()
+        versions = SupervisorUtils.sync_mirror(mirror_dir, self.scar_info.get('supervisor_version'))
+        response_parser.parse_cache_sync_response(versions, mirror_dir, self.scar_info.get('cli_output'))
+
+    def _cache_ls(self):
+        cache_manager = CacheManager()
+        response_parser.parse_cache_ls_response([entry.to_dict() for entry in cache_manager.get_entries()],
+                                                cache_manager.get_size(),
+                                                self._get_cache_max_size(),
+                                                self.scar_info.get('cli_output'))
+
+    def _cache_prune(self):
+        max_size = self.scar_info.get('max_size')
+        max_size = parse_size(max_size) if max_size is not None else self._get_cache_max_size()
+        cache_manager = CacheManager()
+        removed = cache_manager.prune(max_size)
+        response_parser.parse_cache_prune_response([entry.to_dict() for entry in removed],
+                                                   cache_manager.get_size(),
+                                                   self.scar_info.get('cli_output'))
+
+    def _cache_warm(self):
+        functions = []
+        for resources_info in self.aws_resources:
+            resources_info = deepcopy(resources_info)
+            resources_info['lambda']['supervisor']['version'] = SupervisorUtils.check_supervisor_version(
+                resources_info.get('lambda').get('supervisor').get('version'))
+            functions.append(resources_info)
+        self._warm_cache(functions)
+        self._prune_cache()
+
+    def _warm_cache(self, functions: List[Dict]) -> None:
+        """Downloads concurrently the supervisor files needed by the functions
+        (once per supervisor version, architecture and variant)."""
+        scheduler = TaskScheduler(int(self.scar_info.get('workers', _DEFAULT_INIT_WORKERS)))
+        for resources_info in functions:
+            lambda_client = Lambda(resources_info)
+            files_id = lambda_client.get_supervisor_files_id()
+            if files_id and files_id not in scheduler.tasks:
+                scheduler.add_task(files_id, lambda_client.warm_cache)
+        scheduler.run()
+
+    def _get_cache_max_size(self) -> int:
+        return parse_size(self.scar_info.get('cache', {}).get(
+            'max_size', ConfigFileParser.get_default_value('scar', 'cache', 'max_size')))
+
+    def _prune_cache(self) -> None:
+        """Keeps the local cache under its maximum size (0 disables the limit)."""
+        max_size = self._get_cache_max_size()
+        if max_size > 0:
+            removed = CacheManager().prune(max_size)
+            if removed:
+                logger.info(f"Removed {len(removed)} cache entries not used recently.")
+
+    def _get_invocation_stats(self, resources_info: Dict, start_time: int, memory_size: int = None) -> Dict:
+        stats = InvocationStats(resources_info.get('lambda').get('name'), memory_size)
+        stats.add_messages(CloudWatchLogs(resources_info).get_report_messages(start_time))
+        return stats.get_summary()
 
     @excp.exception(logger)
     def put(self):
@@ -277,8 +466,12 @@ class AWS(Commands):
                                                           cloudwatch_logs.get_log_group_name(),
                                                           self.scar_info.get('cli_output'))
 
-    @excp.exception(logger)
     def _create_s3_buckets(self, resources_info: Dict) -> None:
+        self._create_input_buckets(resources_info)
+        self._create_output_buckets(resources_info)
+
+    @excp.exception(logger)
+    def _create_input_buckets(self, resources_info: Dict) -> None:
         if resources_info.get('lambda').get('input', False):
             s3_service = S3(resources_info)
             for bucket in resources_info.get('lambda').get('input'):
@@ -296,6 +489,8 @@ class AWS(Commands):
                     if not folders:
                         logger.info(f'Input bucket "{bucket_name}" successfully created')
 
+    @excp.exception(logger)
+    def _create_output_buckets(self, resources_info: Dict) -> None:
         if resources_info.get('lambda').get('output', False):
             s3_service = S3(resources_info)
             for bucket in resources_info.get('lambda').get('output'):
@@ -304,6 +499,25 @@ class AWS(Commands):
                     if not folders:
                         logger.info(f'Output bucket "{bucket_name}" successfully created')
 
+    @excp.exception(logger)
+    def _update_s3_buckets(self, resources_info: Dict, deployed_fdl: Dict) -> None:
+        """Removes the notifications of the deleted input buckets
+        and creates the new input and output buckets."""
+        deployed_input = _get_s3_paths(deployed_fdl.get('input'))
+        deployed_output = _get_s3_paths(deployed_fdl.get('output'))
+        new_input = _get_s3_paths(resources_info.get('lambda').get('input'))
+        for path in deployed_input:
+            if path not in new_input:
+                # The notifications of the other folders of the bucket are kept
+                S3(resources_info).delete_bucket_notification(*get_bucket_and_folders(path))
+        # Only the new buckets have to be created and linked with the function
+        storages = deepcopy(resources_info)
+        storages['lambda']['input'] = [storage for storage in resources_info.get('lambda').get('input') or []
+                                       if storage.get('path') not in deployed_input]
+        storages['lambda']['output'] = [storage for storage in resources_info.get('lambda').get('output') or []
+                                        if storage.get('path') not in deployed_output]
+        self._create_s3_buckets(storages)
+
     @excp.exception(logger)
     def _add_api_gateway_permissions(self, resources_info: Dict):
         if resources_info.get("api_gateway").get('name', False):
@@ -315,6 +529,13 @@ class AWS(Commands):
         if mode in ("batch", "lambda-batch"):
             Batch(resources_info).create_batch_environment()
 
+    @excp.exception(logger)
+    def _update_batch_job_definition(self, resources_info: Dict) -> bool:
+        mode = resources_info.get('lambda').get('execution_mode')
+        if mode in ("batch", "lambda-batch"):
+            return Batch(resources_info).update_job_definition()
+        return False
+
 #############################################################################
 ###                   Methods to delete AWS resources                     ###
 #############################################################################
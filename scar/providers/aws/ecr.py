@@ -42,6 +42,20 @@ class ECR(GenericClient):
         else:
             return None
 
+    def exists_image_tag(self, repository_name: str, image_tag: str) -> bool:
+        """Check if the repository has an image with the tag."""
+        response = self.client.describe_images(repositoryName=repository_name,
+                                               imageIds=[{'imageTag': image_tag}])
+        return bool(response and response.get('imageDetails'))
+
+    def get_image_digest(self, repository_name: str, image_tag: str) -> str:
+        """Returns the digest of the image with the tag (None if it doesn't exist)."""
+        response = self.client.describe_images(repositoryName=repository_name,
+                                               imageIds=[{'imageTag': image_tag}])
+        if response and response.get('imageDetails'):
+            return response['imageDetails'][0].get('imageDigest')
+        return None
+
     def create_repository(self, repository_name: str) -> str:
         """Creates a repository."""
         response = self.client.create_repository(repository_name)
@@ -13,15 +13,33 @@
 # limitations under the License.
 """Module with methods and classes to create the function deployment package."""
 
-from typing import Dict
+from typing import Dict, List, Tuple
 from zipfile import ZipFile
+import hashlib
+import json
 import ntpath
+import os
+import struct
+from tabulate import tabulate
 from scar.providers.aws.udocker import Udocker
-from scar.providers.aws.validators import AWSValidator
+from scar.providers.aws.validators import AWSValidator, MB
 from scar.exceptions import exception
 import scar.logger as logger
+from scar.archive import DEFAULT_COMPRESSION_LEVEL, ZipBuilder, estimate_path_size, open_nested_zip
 from scar.utils import FileUtils
 
+# Packages shared by the functions with the same supervisor, init script,
+# extra payload and container image are cached in this folder
+_PACKAGE_CACHE_DIR = '/var/tmp/cache/scar/packages'
+_PACKAGE_CACHE_ZIP_NAME = 'package.zip'
+_PACKAGE_CACHE_METADATA_NAME = 'metadata.json'
+# Increase when the package structure changes to invalidate the cached packages
+_PACKAGE_CACHE_FORMAT = '1'
+# Minimum size of the content moved to layers (if 'payload_layers' is enabled)
+_DEFAULT_PAYLOAD_LAYER_MIN_SIZE = 10 * MB
+# Folder where the layers are mounted in the function
+_LAYERS_MOUNT_PATH = '/opt'
+
 def clean_function_config(function_cfg: Dict):
     # Rm full path from the init_script
     if 'init_script' in function_cfg and function_cfg.get('init_script', True):
@@ -47,82 +65,317 @@ def create_function_config(resources_info):
     return function_cfg
 
 
+def _copy_to_cache(file_path: str, cache_file_path: str) -> None:
+    """Copies the file to the cache checking that the copy is complete."""
+    def _copy(tmp_path: str) -> None:
+        FileUtils.copy_file(file_path, tmp_path)
+        if FileUtils.get_file_size(tmp_path) != FileUtils.get_file_size(file_path):
+            raise OSError(f"Incomplete copy of '{file_path}' to the cache.")
+    FileUtils.save_file_atomically(cache_file_path, _copy)
+
+
 class FunctionPackager():
-    """Class to manage the deployment package creation."""
+    """Class to manage the deployment package creation.
+
+    The package is split in a base zip with the files that don't depend
+    on the function (udocker image, init script and extra payload), which
+    is cached by the hash of its inputs, and the function handler and
+    configuration, which are added to a copy of the base zip.
+    The user files are zipped from their original paths (not copied).
+    Optionally, the big extra payloads and udocker images are moved to
+    layers named by their content hash instead of being in the package."""
 
     def __init__(self, resources_info: Dict, supervisor_zip_path: str):
         self.resources_info = resources_info
         self.supervisor_zip_path = supervisor_zip_path
         # Temporal folder to store the supervisor and udocker files
         self.tmp_payload_folder = FileUtils.create_tmp_dir()
+        # Temporal folder to store the function handler and configuration
+        self.tmp_function_folder = FileUtils.create_tmp_dir()
+        # Paths of the user files and their names in the package,
+        # the first ones have preference if the names collide
+        self.manifest: List[Tuple[str, str]] = []
+        # Uncompressed size of the package
+        self.code_size = 0
+        # Temporal folder to store the content layers
+        self.tmp_layers_folder = FileUtils.create_tmp_dir()
+        # Names and zip paths of the layers with the content split from the package
+        self.content_layers: List[Tuple[str, str]] = []
 
     @exception(logger)
     def create_zip(self, lambda_payload_path: str) -> None:
         """Creates the lambda function deployment package."""
-        self._extract_handler_code()
-        self._manage_udocker_images()
-        self._add_init_script()
-        self._add_extra_payload()
+        self._check_estimated_size()
+        self._create_base_zip(lambda_payload_path)
         self._copy_function_configuration()
-        self._zip_scar_folder(lambda_payload_path)
+        self._add_function_files(lambda_payload_path)
         self._check_code_size()
 
-    def _extract_handler_code(self) -> None:
-        function_handler_dest = FileUtils.join_paths(self.tmp_payload_folder.name, f"{self.resources_info.get('lambda').get('name')}.py")
-        file_path = ""
+    def _is_package_cache_enabled(self) -> bool:
+        return self.resources_info.get('lambda').get('deployment', {}).get('package_cache', True)
+
+    def _get_package_hash(self) -> str:
+        """Returns the hash of all the inputs of the base package."""
+        function = self.resources_info.get('lambda')
+        package_hash = hashlib.sha256(_PACKAGE_CACHE_FORMAT.encode())
+        FileUtils.update_hash_with_path(package_hash, self.supervisor_zip_path)
+        inputs = {'init_script': FileUtils.get_file_name(function.get('init_script', '') or ''),
+                  'extra_payload': bool(function.get('extra_payload', False)),
+                  'image': function.get('container', {}).get('image', ''),
+                  'image_file': bool(function.get('container', {}).get('image_file', False)),
+                  'bucket': bool(function.get('deployment', {}).get('bucket', False)),
+                  'payload_layers': self._is_payload_layers_enabled(),
+                  'payload_layer_min_size': self._get_payload_layer_min_size()}
+        package_hash.update(json.dumps(inputs, sort_keys=True).encode())
+        for path in (function.get('init_script', False),
+                     function.get('extra_payload', False),
+                     function.get('container', {}).get('image_file', False)):
+            if path and os.path.exists(path):
+                FileUtils.update_hash_with_path(package_hash, path)
+        return package_hash.hexdigest()
+
+    def _create_base_zip(self, lambda_payload_path: str) -> None:
+        """Creates the base package in the payload path, reusing
+        the cached one if its inputs didn't change."""
+        if not self._is_package_cache_enabled():
+            self._build_base_zip(lambda_payload_path)
+            return
+        cache_path = FileUtils.join_paths(_PACKAGE_CACHE_DIR, self._get_package_hash())
+        metadata_path = FileUtils.join_paths(cache_path, _PACKAGE_CACHE_METADATA_NAME)
+        FileUtils.create_folder(_PACKAGE_CACHE_DIR)
+        # The functions with the same package wait for the first one and reuse it
+        with FileUtils.lock_file(f'{cache_path}.lock'):
+            if FileUtils.is_file(metadata_path):
+                logger.info("Using cached function package.")
+                FileUtils.touch(cache_path)
+                FileUtils.copy_file(FileUtils.join_paths(cache_path, _PACKAGE_CACHE_ZIP_NAME), lambda_payload_path)
+                metadata = json.loads(FileUtils.read_file(metadata_path))
+                self._restore_package_metadata(metadata)
+                self.content_layers = [(layer_name, FileUtils.join_paths(cache_path, f'{layer_name}.zip'))
+                                       for layer_name in metadata.get('layers', [])]
+            else:
+                variables = dict(self.resources_info.get('lambda').get('environment', {}).get('Variables', {}))
+                self._build_base_zip(lambda_payload_path)
+                self._store_base_zip(cache_path, lambda_payload_path, variables)
+
+    def _store_base_zip(self, cache_path: str, lambda_payload_path: str, previous_variables: Dict) -> None:
+        """Stores the package and its layers in the cache. The metadata
+        is written last, so only the complete packages are reused."""
+        FileUtils.create_folder(cache_path)
+        _copy_to_cache(lambda_payload_path, FileUtils.join_paths(cache_path, _PACKAGE_CACHE_ZIP_NAME))
+        for layer_name, layer_zip_path in self.content_layers:
+            _copy_to_cache(layer_zip_path, FileUtils.join_paths(cache_path, f'{layer_name}.zip'))
+        metadata = json.dumps(self._get_package_metadata(previous_variables))
+        FileUtils.save_file_atomically(FileUtils.join_paths(cache_path, _PACKAGE_CACHE_METADATA_NAME),
+                                       lambda tmp_path: FileUtils.create_file_with_content(tmp_path, metadata))
+
+    def _get_package_metadata(self, previous_variables: Dict) -> Dict:
+        """Returns the changes made in the function definition while building the base package."""
+        variables = self.resources_info.get('lambda').get('environment', {}).get('Variables', {})
+        return {'layers': [layer_name for layer_name, _ in self.content_layers],
+                'image': self.resources_info.get('lambda').get('container', {}).get('image', ''),
+                'variables': {key: val for key, val in variables.items()
+                              if previous_variables.get(key) != val}}
+
+    def _restore_package_metadata(self, metadata: Dict) -> None:
+        """Applies the changes made in the function definition when the cached package was built."""
+        if metadata.get('image'):
+            self.resources_info['lambda']['container']['image'] = metadata.get('image')
+        if metadata.get('variables'):
+            self.resources_info['lambda']['environment']['Variables'].update(metadata.get('variables'))
+        self.resources_info['lambda'].pop('extra_payload', None)
+
+    def _build_base_zip(self, lambda_payload_path: str) -> None:
+        self._manage_udocker_images()
+        self._add_extra_payload()
+        self._add_init_script()
+        if self._is_payload_layers_enabled():
+            self._split_content_layers()
+        self._zip_base_files(lambda_payload_path)
+
+    def _is_payload_layers_enabled(self) -> bool:
+        return self.resources_info.get('lambda').get('deployment', {}).get('payload_layers', False)
+
+    def _get_payload_layer_min_size(self) -> int:
+        return self.resources_info.get('lambda').get('deployment', {}).get('payload_layer_min_size',
+                                                                           _DEFAULT_PAYLOAD_LAYER_MIN_SIZE)
+
+    def _split_content_layers(self) -> None:
+        """Moves the big extra payloads and udocker images from the package to layers."""
+        init_script = self.resources_info.get('lambda').get('init_script')
+        for path, arcname in list(self.manifest):
+            if path != init_script and estimate_path_size(path, 0)[0] >= self._get_payload_layer_min_size():
+                self._create_content_layer('payload', [(path, arcname)])
+                self.manifest.remove((path, arcname))
+        udocker_dir = FileUtils.join_paths(self.tmp_payload_folder.name, 'udocker')
+        image_paths = [(FileUtils.join_paths(udocker_dir, folder), f'udocker/{folder}')
+                       for folder in ('repos', 'layers')
+                       if os.path.isdir(FileUtils.join_paths(udocker_dir, folder))]
+        if image_paths and sum(estimate_path_size(path, 0)[0] for path, _ in image_paths) >= \
+           self._get_payload_layer_min_size():
+            self._create_content_layer('image', image_paths)
+            for path, _ in image_paths:
+                FileUtils.delete_folder(path)
+            # The udocker local registry is now in the layers folder
+            variables = self.resources_info['lambda']['environment']['Variables']
+            variables['UDOCKER_REPOS'] = f'{_LAYERS_MOUNT_PATH}/udocker/repos/'
+            variables['UDOCKER_LAYERS'] = f'{_LAYERS_MOUNT_PATH}/udocker/layers/'
+
+    def _create_content_layer(self, content_type: str, paths: List[Tuple[str, str]]) -> None:
+        """Zips the paths passed in a layer named by the hash of its
+        content (the zips are reproducible, so the same content
+        always produces the same layer)."""
+        layer_zip_path = FileUtils.join_paths(self.tmp_layers_folder.name, f'{len(self.content_layers)}.zip')
+        with ZipBuilder(layer_zip_path, self._get_compression_level()) as builder:
+            for path, arcname in paths:
+                if FileUtils.is_file(path):
+                    builder.add_path(path, arcname)
+                else:
+                    builder.add_folder(path, f'{arcname}/' if arcname else '')
+        layer_name = f'scar-{content_type}-{FileUtils.get_path_hash(layer_zip_path)}'
+        logger.info(f"Moving {content_type} content to layer '{layer_name}'.")
+        self.content_layers.append((layer_name, layer_zip_path))
+
+    def _get_compression_level(self) -> int:
+        return self.resources_info.get('lambda').get('deployment', {}).get('compression_level',
+                                                                           DEFAULT_COMPRESSION_LEVEL)
+
+    def _add_function_files(self, lambda_payload_path: str) -> None:
+        """Adds the function handler and configuration to the package."""
+        with ZipBuilder(lambda_payload_path, self._get_compression_level(), mode='a') as builder:
+            self._copy_handler_code(builder)
+            builder.add_folder(self.tmp_function_folder.name)
+            # The members of the zip store the size of all the package files
+            self.code_size = builder.get_uncompressed_size()
+
+    def _copy_handler_code(self, builder: ZipBuilder) -> None:
+        """Copies the handler from the supervisor zip to the package
+        (without extracting it) with the name of the function."""
         with ZipFile(self.supervisor_zip_path) as thezip:
-            for file in thezip.namelist():
-                if file.endswith("function_handler.py"):
-                    file_path = FileUtils.join_paths(FileUtils.get_tmp_dir(), file)
-                    # Extracts the complete folder structure and the file (cannot avoid)
-                    thezip.extract(file, FileUtils.get_tmp_dir())
+            for zinfo in thezip.infolist():
+                if zinfo.filename.endswith("function_handler.py"):
+                    builder.copy_member(thezip, zinfo, f"{self.resources_info.get('lambda').get('name')}.py")
                     break
-        if file_path:
-            # Copy only the handler to the payload folder
-            FileUtils.copy_file(file_path, function_handler_dest)
 
     def _copy_function_configuration(self):
-        cfg_file_path = FileUtils.join_paths(self.tmp_payload_folder.name, "function_config.yaml")
+        cfg_file_path = FileUtils.join_paths(self.tmp_function_folder.name, "function_config.yaml")
         function_cfg = create_function_config(self.resources_info)
         FileUtils.write_yaml(cfg_file_path, function_cfg)
 
+    def _is_udocker_needed(self) -> bool:
+        return bool(self.resources_info.get('lambda').get('container').get('image_file', False) or
+                    self.resources_info.get('lambda').get('deployment').get('bucket', False))
+
     def _manage_udocker_images(self):
-        if self.resources_info.get('lambda').get('container').get('image_file', False) or \
-           self.resources_info.get('lambda').get('deployment').get('bucket', False):
+        if self._is_udocker_needed():
             Udocker(self.resources_info, self.tmp_payload_folder.name, self.supervisor_zip_path).prepare_udocker_image()
 
     def _add_init_script(self) -> None:
-        """Copy the init script defined by the user to the payload folder."""
+        """Adds the init script defined by the user to the package manifest."""
         if self.resources_info.get('lambda').get('init_script', False):
             init_script_path = self.resources_info.get('lambda').get('init_script')
-            FileUtils.copy_file(init_script_path,
-                                FileUtils.join_paths(self.tmp_payload_folder.name,
-                                                     FileUtils.get_file_name(init_script_path)))
+            self.manifest.append((init_script_path, FileUtils.get_file_name(init_script_path)))
 
     def _add_extra_payload(self) -> None:
+        """Adds the extra payload (file or folder contents) to the package manifest."""
         if self.resources_info.get('lambda').get('extra_payload', False):
             payload_path = self.resources_info.get('lambda').get('extra_payload')
             logger.info(f"Adding extra payload '{payload_path}'")
-            if FileUtils.is_file(payload_path):
-                FileUtils.copy_file(self.resources_info.get('lambda').get('extra_payload'),
-                                    self.tmp_payload_folder.name)
-            else:
-                FileUtils.copy_dir(self.resources_info.get('lambda').get('extra_payload'),
-                                   self.tmp_payload_folder.name)
+            self.manifest.append((payload_path, FileUtils.get_file_name(payload_path)
+                                  if FileUtils.is_file(payload_path) else ''))
             del(self.resources_info['lambda']['extra_payload'])
 
-    def _zip_scar_folder(self, lambda_payload_path: str) -> None:
-        """Zips the tmp folder with all the function's files and
-        save it in the expected path of the payload."""
-        FileUtils.zip_folder(lambda_payload_path,
-                             self.tmp_payload_folder.name,
-                             "Creating function package.")
+    def _zip_base_files(self, lambda_payload_path: str) -> None:
+        """Zips the user files from their paths and the tmp
+        folder with the udocker files in the payload path."""
+        logger.info("Creating function package.")
+        with ZipBuilder(lambda_payload_path, self._get_compression_level()) as builder:
+            for path, arcname in self.manifest:
+                if FileUtils.is_file(path):
+                    builder.add_path(path, arcname)
+                else:
+                    builder.add_folder(path, arcname)
+            builder.add_folder(self.tmp_payload_folder.name)
 
-    def _check_code_size(self):
-        # Check if the code size fits within the AWS limits
+    def estimate_size(self) -> List[Tuple[str, int, int]]:
+        """Returns the name, uncompressed size and estimated compressed
+        size of each package contributor sorted by size (without copying
+        or extracting any file)."""
+        function = self.resources_info.get('lambda')
+        contributors = []
+        with ZipFile(self.supervisor_zip_path) as thezip:
+            for zinfo in thezip.infolist():
+                if zinfo.filename.endswith("function_handler.py"):
+                    contributors.append(('supervisor', zinfo.file_size, zinfo.compress_size))
+                elif zinfo.filename.endswith("udocker.zip") and self._is_udocker_needed():
+                    with open_nested_zip(thezip, zinfo.filename) as udocker_zip:
+                        contributors.append(('udocker',
+                                             sum(member.file_size for member in udocker_zip.infolist()),
+                                             sum(member.compress_size for member in udocker_zip.infolist())))
+        image_file = function.get('container', {}).get('image_file', False)
+        if image_file and FileUtils.is_file(image_file):
+            # The layers of the image are stored by udocker without the file compression
+            contributors.append(('image file', _get_uncompressed_file_size(image_file),
+                                 FileUtils.get_file_size(image_file)))
+        for name, path in (('extra payload', function.get('extra_payload', False)),
+                           ('init script', function.get('init_script', False))):
+            if path and os.path.exists(path):
+                contributors.append((name, *estimate_path_size(path, self._get_compression_level())))
+        return sorted(contributors, key=lambda contributor: contributor[1], reverse=True)
+
+    def _check_estimated_size(self) -> None:
+        """Fails before building the package if its estimated
+        size exceeds the limits, showing the size of each contributor."""
+        contributors = self.estimate_size()
+        estimated_size = sum(size for name, size, _ in contributors
+                             if not self._is_moved_to_layer(name, size))
+        table = _get_size_breakdown_table(contributors)
+        logger.debug(f"Estimated package size:\n{table}")
+        if estimated_size > self._get_max_code_size():
+            logger.info(f"Estimated package size:\n{table}")
+            self._validate_code_size(estimated_size)
+
+    def _is_moved_to_layer(self, contributor: str, size: int) -> bool:
+        return self._is_payload_layers_enabled() and contributor in ('extra payload', 'image file') \
+            and size >= self._get_payload_layer_min_size()
+
+    def _get_max_code_size(self) -> int:
+        deployment = self.resources_info.get('lambda').get('deployment')
+        if deployment.get('bucket', False):
+            return deployment.get('max_s3_payload_size')
+        return deployment.get('max_payload_size')
+
+    def _validate_code_size(self, code_size: int) -> None:
         if self.resources_info.get('lambda').get('deployment').get('bucket', False):
-            AWSValidator.validate_s3_code_size(self.tmp_payload_folder.name,
-                                               self.resources_info.get('lambda').get('deployment').get('max_s3_payload_size'))
+            AWSValidator.validate_s3_code_size(code_size, self._get_max_code_size())
         else:
-            AWSValidator.validate_function_code_size(self.tmp_payload_folder.name,
-                                                     self.resources_info.get('lambda').get('deployment').get('max_payload_size'))
+            AWSValidator.validate_function_code_size(code_size, self._get_max_code_size())
+
+    def _check_code_size(self):
+        # Check if the code size fits within the AWS limits
+        self._validate_code_size(self.code_size)
+
+
+def _get_uncompressed_file_size(path: str) -> int:
+    """Returns the uncompressed size stored at the end of the gzip files."""
+    size = FileUtils.get_file_size(path)
+    if path.endswith(('.gz', '.tgz')) and size >= 4:
+        with open(path, 'rb') as gzip_file:
+            gzip_file.seek(-4, os.SEEK_END)
+            # The stored size is modulo 2^32
+            uncompressed_size = struct.unpack('<I', gzip_file.read(4))[0]
+        return max(size, uncompressed_size)
+    return size
+
+
+def _format_size(size: int) -> str:
+    return '{0:.2f}MB'.format(size / MB)
+
+
+def _get_size_breakdown_table(contributors: List[Tuple[str, int, int]]) -> str:
+    headers = ['CONTRIBUTOR', 'SIZE', 'ESTIMATED COMPRESSED SIZE']
+    table = [[name, _format_size(size), _format_size(compressed)]
+             for name, size, compressed in contributors]
+    table.append(['total', _format_size(sum(contributor[1] for contributor in contributors)),
+                  _format_size(sum(contributor[2] for contributor in contributors))])
+    return tabulate(table, headers)
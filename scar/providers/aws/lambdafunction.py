@@ -14,17 +14,17 @@
 
 import base64
 import json
-import io
-from typing import Dict
+import tempfile
+from typing import Dict, List, Tuple
 from multiprocessing.pool import ThreadPool
 from zipfile import ZipFile, BadZipfile
 import yaml
 import time
 from botocore.exceptions import ClientError
-from scar.http.request import call_http_endpoint, get_file
+from scar.http.request import call_http_endpoint, download_file
 from scar.providers.aws import GenericClient
 from scar.providers.aws.functioncode import FunctionPackager, create_function_config
-from scar.providers.aws.lambdalayers import LambdaLayers
+from scar.providers.aws.lambdalayers import ContentLayers, LambdaLayers
 from scar.providers.aws.s3 import S3
 from scar.providers.aws.validators import AWSValidator
 import scar.exceptions as excp
@@ -35,6 +35,8 @@ from scar.providers.aws.containerimage import ContainerImage
 
 
 MAX_CONCURRENT_INVOCATIONS = 500
+# Size of the downloaded packages kept in memory (the bigger ones are stored in disk)
+MAX_MEMORY_PACKAGE_SIZE = 10485760
 ASYNCHRONOUS_CALL = {"invocation_type": "Event",
                      "log_type": "None",
                      "asynchronous": "True"}
@@ -57,27 +59,35 @@ class Lambda(GenericClient):
             # it must be 1.5.0-beta3 version or higher
             raise Exception("Supervisor version must be 1.5.0 or higher for image runtime.")
 
-    def _get_creations_args(self, zip_payload_path: str, supervisor_zip_path: str) -> Dict:
-        args = {'FunctionName': self.function.get('name'),
-                'Role': self.resources_info.get('iam').get('role'),
+    def _get_configuration_args(self) -> Dict:
+        """Returns the function configuration that can be
+        set on creation and updated afterwards."""
+        args = {'Role': self.resources_info.get('iam').get('role'),
                 'Environment': self.function.get('environment'),
                 'Description': self.function.get('description'),
                 'Timeout':  self.function.get('timeout'),
-                'MemorySize': self.function.get('memory'),
-                'Tags': self.function.get('tags'),
-                'Architectures': self.function.get('architectures', ['x86_64'])}
+                'MemorySize': self.function.get('memory')}
         if self.function.get('vpc'):
             args['VpcConfig'] = self.function.get('vpc')
         if self.function.get('file_system'):
             args['FileSystemConfigs'] = self.function.get('file_system')
+        if self.function.get('runtime') != "image":
+            args['Runtime'] = self.function.get('runtime')
+            args['Handler'] = self.function.get('handler')
+            args['Layers'] = self.function.get('layers')
+        return args
+
+    def _get_creations_args(self, zip_payload_path: str, supervisor_zip_path: str) -> Dict:
+        args = {'FunctionName': self.function.get('name'),
+                'Tags': self.function.get('tags'),
+                'Architectures': self.function.get('architectures', ['x86_64'])}
         if self.function.get('runtime') == "image":
             args['Code'] = {'ImageUri': self.function.get('container').get('image')}
             args['PackageType'] = 'Image'
         else:
+            # The package must be created first, it can add layers and variables
             args['Code'] = self._get_function_code(zip_payload_path, supervisor_zip_path)
-            args['Runtime'] = self.function.get('runtime')
-            args['Handler'] = self.function.get('handler')
-            args['Layers'] = self.function.get('layers')
+        args.update(self._get_configuration_args())
         return args
 
     def is_asynchronous(self):
@@ -87,8 +97,10 @@ class Lambda(GenericClient):
         """Returns the access key belonging to the boto_profile used."""
         return self.client.get_access_key()
 
-    @excp.exception(logger)
-    def create_function(self):
+    def _prepare_function(self) -> Tuple[str, str]:
+        """Creates the container image (image runtime) or gets the supervisor
+        and its layer (zip runtime) and sets the function variables.
+        Returns the path of the function package and the supervisor zip."""
         # Create tmp folders
         zip_payload_path = None
         supervisor_zip_path = None
@@ -97,18 +109,47 @@ class Lambda(GenericClient):
             self.function['container']['image'] = ContainerImage.create_ecr_image(self.resources_info,
                                                                                   self.supervisor_version)
         else:
-            # Check if supervisor's source is already cached
-            cached, supervisor_zip_path = SupervisorUtils.is_supervisor_cached(self.supervisor_version)
-            if not cached:
-                # Download supervisor
-                supervisor_zip_path = SupervisorUtils.download_supervisor(self.supervisor_version)
+            supervisor_zip_path = self._get_supervisor_zip_path()
             # Manage supervisor layer
             self._manage_supervisor_layer(supervisor_zip_path)
             # Create function
-            tmp_folder = FileUtils.create_tmp_dir()
-            zip_payload_path = FileUtils.join_paths(tmp_folder.name, 'function.zip')
+            # Keep the reference to avoid removing the folder when the method returns
+            self._tmp_folder = FileUtils.create_tmp_dir()
+            zip_payload_path = FileUtils.join_paths(self._tmp_folder.name, 'function.zip')
         self._set_image_id()
         self._set_fdl()
+        return zip_payload_path, supervisor_zip_path
+
+    def _get_supervisor_zip_path(self) -> str:
+        # Check if supervisor's source is already cached
+        cached, supervisor_zip_path = SupervisorUtils.is_supervisor_cached(self.supervisor_version)
+        if not cached:
+            # Download supervisor
+            supervisor_zip_path = SupervisorUtils.download_supervisor(self.supervisor_version)
+        return supervisor_zip_path
+
+    def get_supervisor_files_id(self) -> str:
+        """Returns an identifier of the supervisor files needed to create the function
+        (the same for the functions that share them). Empty if none is needed."""
+        if self.function.get('runtime') == "image":
+            if ContainerImage.is_image_prepared(self.function.get('container')):
+                return ''
+            return f'{self.supervisor_version}/{ContainerImage.get_asset_name(self.function)}'
+        return f'{self.supervisor_version}/layer'
+
+    def warm_cache(self) -> None:
+        """Downloads the supervisor files used to create the function
+        (and builds its layer zip) without creating any resource."""
+        if not self.get_supervisor_files_id():
+            return
+        if self.function.get('runtime') == "image":
+            ContainerImage.get_supervisor_zip(self.resources_info, self.supervisor_version)
+        else:
+            LambdaLayers(self.resources_info, self.client, self._get_supervisor_zip_path()).get_layer_zip_path()
+
+    @excp.exception(logger)
+    def create_function(self):
+        zip_payload_path, supervisor_zip_path = self._prepare_function()
         creation_args = self._get_creations_args(zip_payload_path, supervisor_zip_path)
         response = self.client.create_function(**creation_args)
         if response and "FunctionArn" in response:
@@ -131,15 +172,33 @@ class Lambda(GenericClient):
     @excp.exception(logger)
     def _get_function_code(self, zip_payload_path: str, supervisor_zip_path: str) -> Dict:
         '''Zip all the files and folders needed.'''
+        self._create_package(zip_payload_path, supervisor_zip_path)
+        return self._upload_function_code(zip_payload_path)
+
+    def _create_package(self, zip_payload_path: str, supervisor_zip_path: str) -> None:
+        """Creates the function package and adds the
+        layers with the content split from it."""
+        packager = FunctionPackager(self.resources_info, supervisor_zip_path)
+        packager.create_zip(zip_payload_path)
+        if packager.content_layers:
+            content_layers = ContentLayers(self.resources_info, self.client)
+            for layer_name, layer_zip_path in packager.content_layers:
+                layer_arn = content_layers.get_layer_arn(layer_name, layer_zip_path)
+                if layer_arn not in self.function['layers']:
+                    self.function['layers'].append(layer_arn)
+
+    def _upload_function_code(self, zip_payload_path: str) -> Dict:
+        """Uploads the package to the deployment bucket (if defined) and
+        returns the code arguments of the function creation or update."""
         code = {}
-        FunctionPackager(self.resources_info, supervisor_zip_path).create_zip(zip_payload_path)
         if self.function.get('deployment').get('bucket', False):
             file_key = f"lambda/{self.function.get('name')}.zip"
             s3_client = S3(self.resources_info)
             s3_client.create_bucket(self.function.get('deployment').get('bucket'))
-            s3_client.upload_file(bucket=self.function.get('deployment').get('bucket'),
-                                  file_path=zip_payload_path,
-                                  file_key=file_key)
+            # The packages are reproducible, so an unchanged package is not uploaded again
+            s3_client.upload_file_if_changed(bucket=self.function.get('deployment').get('bucket'),
+                                             file_path=zip_payload_path,
+                                             file_key=file_key)
             code = {"S3Bucket": self.function.get('deployment').get('bucket'),
                     "S3Key": file_key}
         else:
@@ -261,6 +320,90 @@ class Lambda(GenericClient):
         function = arn if arn else self.function.get('name')
         return self.client.get_function_configuration(function)
 
+    def update_function_configuration(self, **kwargs: Dict) -> Dict:
+        kwargs['FunctionName'] = self.function.get('name')
+        return self.client.update_function_configuration(**kwargs)
+
+    def wait_function_updated(self, max_time=60, delay=2):
+        func = {"LastUpdateStatus": "InProgress"}
+        wait = 0
+        while func.get("LastUpdateStatus") == "InProgress" and wait < max_time:
+            time.sleep(delay)
+            wait += delay
+            func = self.get_function_configuration()
+        return func.get("LastUpdateStatus") != "Failed"
+
+    def _get_code_update_args(self, deployed_config: Dict, zip_payload_path: str,
+                              supervisor_zip_path: str) -> Dict:
+        """Returns the arguments to update the function code
+        or an empty dictionary if the code didn't change."""
+        if self.function.get('runtime') == "image":
+            image_uri = self.function.get('container').get('image')
+            deployed_code = self.client.get_function(self.function.get('name')).get('Code', {})
+            # The tags can be moved to other images, so the digests are also compared
+            if image_uri == deployed_code.get('ImageUri'):
+                image_digest = ContainerImage.get_ecr_image_digest(self.resources_info, image_uri)
+                if image_digest and image_digest == deployed_code.get('ResolvedImageUri', '').rpartition('@')[2]:
+                    return {}
+            return {'ImageUri': image_uri}
+        self._create_package(zip_payload_path, supervisor_zip_path)
+        # Lambda returns the base64 encoded SHA-256 of the package
+        code_sha = base64.b64encode(bytes.fromhex(FileUtils.get_path_hash(zip_payload_path))).decode()
+        if code_sha == deployed_config.get('CodeSha256'):
+            return {}
+        return self._upload_function_code(zip_payload_path)
+
+    def _get_configuration_update_args(self, deployed_config: Dict) -> Dict:
+        """Returns the configuration values that differ from the deployed ones."""
+        deployed = {'Role': deployed_config.get('Role'),
+                    'Environment': {'Variables': deployed_config.get('Environment', {}).get('Variables', {})},
+                    'Description': deployed_config.get('Description'),
+                    'Timeout': deployed_config.get('Timeout'),
+                    'MemorySize': deployed_config.get('MemorySize'),
+                    'VpcConfig': {key: deployed_config.get('VpcConfig', {}).get(key, [])
+                                  for key in ('SubnetIds', 'SecurityGroupIds')},
+                    'FileSystemConfigs': deployed_config.get('FileSystemConfigs', []),
+                    'Runtime': deployed_config.get('Runtime'),
+                    'Handler': deployed_config.get('Handler'),
+                    'Layers': [layer.get('Arn') for layer in deployed_config.get('Layers', [])]}
+        args = {}
+        for key, value in self._get_configuration_args().items():
+            if key == 'VpcConfig':
+                changed = any(sorted(value.get(vpc_key, [])) != sorted(deployed['VpcConfig'][vpc_key])
+                              for vpc_key in ('SubnetIds', 'SecurityGroupIds'))
+            else:
+                changed = value != deployed.get(key)
+            if changed:
+                args[key] = value
+        return args
+
+    @excp.exception(logger)
+    def update_function(self, deployed_config: Dict = None) -> List:
+        """Updates the code and the configuration values of the deployed
+        function that differ from the function definition.
+        Returns the names of the updated values."""
+        if deployed_config is None:
+            deployed_config = self.get_function_configuration()
+        self.function['arn'] = deployed_config.get('FunctionArn', '')
+        # Keep the API Gateway linked on creation
+        api_gateway_id = deployed_config.get('Environment', {}).get('Variables', {}).get('API_GATEWAY_ID')
+        if api_gateway_id:
+            self.function['environment']['Variables']['API_GATEWAY_ID'] = api_gateway_id
+        zip_payload_path, supervisor_zip_path = self._prepare_function()
+        updated = []
+        code_args = self._get_code_update_args(deployed_config, zip_payload_path, supervisor_zip_path)
+        if code_args:
+            self.client.update_function_code(FunctionName=self.function.get('name'), **code_args)
+            updated.append('Code')
+            if not self.wait_function_updated():
+                raise excp.FunctionUpdateError(function_name=self.function.get('name'),
+                                               error_msg="the code update failed")
+        configuration_args = self._get_configuration_update_args(deployed_config)
+        if configuration_args:
+            self.update_function_configuration(**configuration_args)
+            updated.extend(configuration_args.keys())
+        return updated
+
     def get_fdl_config(self, arn: str = None) -> Dict:
         function = arn if arn else self.function.get('name')
         function_info = self.client.get_function(function)
@@ -274,14 +417,17 @@ class Lambda(GenericClient):
             dep_pack_url = function_info.get('Code').get('Location')
         else:
             return {}
-        dep_pack = get_file(dep_pack_url)
-        # Extract function_config.yaml
-        try:
-            with ZipFile(io.BytesIO(dep_pack)) as thezip:
-                with thezip.open('function_config.yaml') as cfg_yaml:
-                    return yaml.safe_load(cfg_yaml)
-        except (KeyError, BadZipfile):
-            return {}
+        # Only the small packages are kept in memory
+        with tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_PACKAGE_SIZE) as dep_pack:
+            download_file(dep_pack_url, dep_pack)
+            dep_pack.seek(0)
+            # Extract function_config.yaml
+            try:
+                with ZipFile(dep_pack) as thezip:
+                    with thezip.open('function_config.yaml') as cfg_yaml:
+                        return yaml.safe_load(cfg_yaml)
+            except (KeyError, BadZipfile):
+                return {}
 
     @excp.exception(logger)
     def find_function(self, function_name_or_arn=None):
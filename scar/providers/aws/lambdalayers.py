@@ -12,12 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Module with methods and classes to manage the Lambda layers."""
-import shutil
+import json
+import os
 from typing import Dict, List
+import threading
 import zipfile
 import scar.logger as logger
-from scar.utils import FileUtils
+from scar.archive import ZipBuilder, open_nested_zip
 from scar.providers.aws.clients.lambdafunction import LambdaClient
+from scar.providers.aws.s3 import S3
+from scar.utils import FileUtils, SupervisorUtils
+
+# Avoid publishing the same layer twice when creating several functions concurrently
+_PUBLISH_LOCK = threading.Lock()
+# Maximum size of the layers uploaded directly (bigger layers are uploaded to S3)
+_MAX_DIRECT_UPLOAD_SIZE = 50 * 1024 * 1024
+# Prefix of the supervisor layer zips cached along with the supervisor zip
+_SUPERVISOR_LAYER_ZIP_NAME = 'faas-supervisor-layer'
+# Supervisor version to layer version ARN map of each account, region and layer name
+_LAYER_ARNS_CACHE_PATH = '/var/tmp/cache/scar/layers/supervisor-layer-arns.json'
 
 
 class Layer():
@@ -73,59 +86,139 @@ class LambdaLayers():
         self.supervisor_version = resources_info.get('lambda').get('supervisor').get('version')
         self.layer = Layer(lambda_client)
 
-    def _get_supervisor_layer_props(self, layer_zip_path: str) -> Dict:
+    def _get_supervisor_layer_props(self, layer_zip: bytes) -> Dict:
         return {'LayerName': self.layer_name,
                 'Description': self.supervisor_version,
-                'Content': {'ZipFile': FileUtils.read_file(layer_zip_path, mode="rb")},
+                'Content': {'ZipFile': layer_zip},
                 'CompatibleRuntimes': ['python3.8', 'python3.7'],
                 'LicenseInfo': self.resources_info.get('lambda').get('supervisor').get('license_info')}
 
-    def _create_layer(self) -> str:
-        # Create tmp folders
-        tmp_path = FileUtils.create_tmp_dir()
-        layer_code_path = FileUtils.create_tmp_dir()
-        # Extract 'extra' and 'faassupervisor' from supervisor_zip_path
-        with zipfile.ZipFile(self.supervisor_zip_path) as thezip:
-            for file in thezip.namelist():
+    def _build_layer_zip(self, layer_zip_path: str) -> None:
+        """Builds the layer zip copying the compressed members of
+        the 'extra' zips and the 'faassupervisor' package of the supervisor
+        zip (without extracting and compressing them again)."""
+        logger.debug(f"Building the '{self.layer_name}' layer zip.")
+        with ZipBuilder(layer_zip_path) as builder, zipfile.ZipFile(self.supervisor_zip_path) as thezip:
+            for zinfo in thezip.infolist():
                 # Remove the parent folder path
-                parent_folder, file_name = file.split('/', 1)
-                if file_name.startswith('extra') or file_name.startswith('faassupervisor'):
-                    thezip.extract(file, tmp_path.name)
-        # Extract content of 'extra' files in layer_code_path
-        extra_folder_path = FileUtils.join_paths(tmp_path.name, parent_folder, 'extra')
-        files = FileUtils.get_all_files_in_directory(extra_folder_path)
-        for file_path in files:
-            FileUtils.unzip_folder(file_path, layer_code_path.name)
-        # Copy 'faassupervisor' to layer_code_path
-        supervisor_folder_path = FileUtils.join_paths(tmp_path.name, parent_folder, 'faassupervisor')
-        shutil.move(supervisor_folder_path, FileUtils.join_paths(layer_code_path.name, 'python', 'faassupervisor'))
-        # Create layer zip with content of layer_code_path
-        layer_zip_path = FileUtils.join_paths(tmp_path.name, f'{self.layer_name}.zip')
-        FileUtils.zip_folder(layer_zip_path, layer_code_path.name)
+                file_name = zinfo.filename.split('/', 1)[1]
+                if file_name.startswith('extra/') and file_name.endswith('.zip'):
+                    with open_nested_zip(thezip, zinfo.filename) as extra_zip:
+                        builder.copy_zip(extra_zip)
+                elif file_name.startswith('faassupervisor'):
+                    builder.copy_member(thezip, zinfo, f'python/{file_name}')
+
+    def get_layer_zip_path(self) -> str:
+        """Returns the layer zip cached for the supervisor version, building
+        it the first time (its content doesn't depend on the architecture).
+        This way, publishing the layer in other regions or accounts only uploads it."""
+        layer_zip_path = FileUtils.join_paths(os.path.dirname(self.supervisor_zip_path),
+                                              f'{_SUPERVISOR_LAYER_ZIP_NAME}.zip')
+        return SupervisorUtils.save_cache_file(layer_zip_path, self._build_layer_zip)
+
+    def _create_layer(self) -> str:
         # Register the layer
-        props = self._get_supervisor_layer_props(layer_zip_path)
+        layer_zip = FileUtils.read_file(self.get_layer_zip_path(), mode='rb')
+        props = self._get_supervisor_layer_props(layer_zip)
         response = self.layer.create(**props)
         return response['LayerVersionArn']
 
-    def _is_supervisor_created(self) -> bool:
-        return self.layer.exists(self.layer_name)
+    def _get_layer_arns_key(self) -> str:
+        account_id = self.resources_info.get('iam', {}).get('account_id', '')
+        region = self.resources_info.get('lambda').get('region', '')
+        return f'{account_id}:{region}:{self.layer_name}'
+
+    @staticmethod
+    def _load_layer_arns() -> Dict:
+        if FileUtils.is_file(_LAYER_ARNS_CACHE_PATH):
+            try:
+                return json.loads(FileUtils.read_file(_LAYER_ARNS_CACHE_PATH))
+            except ValueError:
+                # Corrupted map, it is rebuilt
+                pass
+        return {}
 
-    def _is_supervisor_version_created(self) -> str:
-        versions = self.layer.list_versions(self.layer_name)
-        for version in versions:
-            if 'Description' in version:
-                if version['Description'] == self.supervisor_version:
-                    return version['LayerVersionArn']
+    def _update_layer_arns(self, layer_arns: Dict, replace: bool = False) -> None:
+        """Updates (or replaces) the layer ARNs of the account and region in the local map."""
+        folder = os.path.dirname(_LAYER_ARNS_CACHE_PATH)
+        FileUtils.create_folder(folder)
+        with FileUtils.lock_file(f'{_LAYER_ARNS_CACHE_PATH}.lock'):
+            all_layer_arns = self._load_layer_arns()
+            key = self._get_layer_arns_key()
+            all_layer_arns[key] = {} if replace else all_layer_arns.get(key, {})
+            all_layer_arns[key].update(layer_arns)
+            # Write and rename to avoid reading incomplete maps
+            FileUtils.save_file_atomically(_LAYER_ARNS_CACHE_PATH,
+                                           lambda tmp_path: FileUtils.create_file_with_content(
+                                               tmp_path, json.dumps(all_layer_arns, indent=2)))
+
+    def _get_cached_layer_arn(self) -> str:
+        """Returns the layer ARN of the local map if the layer version still exists."""
+        layer_arn = self._load_layer_arns().get(self._get_layer_arns_key(), {}).get(self.supervisor_version, '')
+        if layer_arn:
+            layer_info = self.layer.lambda_client.get_layer_version(self.layer_name,
+                                                                    int(layer_arn.split(':')[-1]))
+            if layer_info.get('Description') == self.supervisor_version:
+                return layer_arn
         return ''
 
+    def _find_layer_arn(self) -> str:
+        """Rebuilds the local map with the layer versions and
+        returns the one of the supervisor version (if any)."""
+        layer_arns = {}
+        # The layer versions are sorted from newest to oldest
+        for version in reversed(self.layer.list_versions(self.layer_name)):
+            if 'Description' in version:
+                layer_arns[version['Description']] = version['LayerVersionArn']
+        self._update_layer_arns(layer_arns, replace=True)
+        return layer_arns.get(self.supervisor_version, '')
+
     def get_supervisor_layer_arn(self) -> str:
         """Returns the ARN of the specified supervisor layer version.
         If the layer or version doesn't exists, creates the layer."""
-        if self._is_supervisor_created():
-            is_created = self._is_supervisor_version_created()
-            if is_created != '':
+        with _PUBLISH_LOCK:
+            layer_arn = self._get_cached_layer_arn() or self._find_layer_arn()
+            if layer_arn:
                 logger.info(f'Using existent \'{self.layer_name}\' layer.')
-                return is_created
-        logger.info((f'Creating lambda layer with \'{self.layer_name}\''
-                     f' version \'{self.supervisor_version}\'.'))
-        return self._create_layer()
+                return layer_arn
+            logger.info((f'Creating lambda layer with \'{self.layer_name}\''
+                         f' version \'{self.supervisor_version}\'.'))
+            layer_arn = self._create_layer()
+            self._update_layer_arns({self.supervisor_version: layer_arn})
+            return layer_arn
+
+
+class ContentLayers():
+    """Class used to manage the layers with the static content
+    of the functions (extra payload and container images).
+    The layers are named by the hash of their content, so they
+    are published once and shared by all the functions."""
+
+    def __init__(self, resources_info: Dict, lambda_client: LambdaClient):
+        self.resources_info = resources_info
+        self.layer = Layer(lambda_client)
+
+    def _get_layer_content(self, layer_name: str, layer_zip_path: str) -> Dict:
+        bucket = self.resources_info.get('lambda').get('deployment', {}).get('bucket', False)
+        if bucket:
+            file_key = f"lambda/layers/{layer_name}.zip"
+            s3_client = S3(self.resources_info)
+            s3_client.create_bucket(bucket)
+            s3_client.upload_file_if_changed(bucket=bucket, file_path=layer_zip_path, file_key=file_key)
+            return {'S3Bucket': bucket, 'S3Key': file_key}
+        if FileUtils.get_file_size(layer_zip_path) > _MAX_DIRECT_UPLOAD_SIZE:
+            logger.warning(f"Layer '{layer_name}' bigger than 50MB. Define a deployment bucket to upload it.")
+        return {'ZipFile': FileUtils.read_file(layer_zip_path, mode='rb')}
+
+    def get_layer_arn(self, layer_name: str, layer_zip_path: str) -> str:
+        """Returns the ARN of the content layer, publishing it if doesn't exist."""
+        with _PUBLISH_LOCK:
+            layer_info = self.layer.get_latest_layer_info(layer_name)
+            if layer_info.get('LayerVersionArn'):
+                logger.info(f'Using existent \'{layer_name}\' layer.')
+                return layer_info.get('LayerVersionArn')
+            logger.info(f'Creating lambda layer \'{layer_name}\'.')
+            response = self.layer.create(LayerName=layer_name,
+                                         Description='Static content of SCAR functions',
+                                         Content=self._get_layer_content(layer_name, layer_zip_path))
+            return response['LayerVersionArn']
@@ -0,0 +1,251 @@
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module with the classes and methods to manage the local
+cache of the CloudWatch log events.
+
+The events are stored in a SQLite database indexed by log group,
+log stream, timestamp and request id, so the logs of a request
+(or of the request triggered by an S3 object key) can be retrieved
+locally without scanning the CloudWatch log group again."""
+
+import os
+import re
+import sqlite3
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
+from scar.utils import FileUtils
+import scar.logger as logger
+
+_REQUEST_LINE_REGEX = re.compile(r'^(START|END|REPORT) RequestId: ([\w-]+)')
+# Overlap applied to the incremental fetches to catch the events
+# ingested by CloudWatch after newer ones were already retrieved
+_SYNC_OVERLAP_MS = 5 * 60 * 1000
+_INSERT_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    log_group TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    log_stream TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    request_id TEXT,
+    message TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    UNIQUE (log_group, event_id)
+);
+CREATE INDEX IF NOT EXISTS events_request_id ON events (log_group, request_id, timestamp);
+CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp);
+CREATE TABLE IF NOT EXISTS syncs (
+    log_group TEXT NOT NULL,
+    log_stream TEXT NOT NULL,
+    last_timestamp INTEGER NOT NULL,
+    PRIMARY KEY (log_group, log_stream)
+);
+CREATE TABLE IF NOT EXISTS streams (
+    log_group TEXT NOT NULL,
+    log_stream TEXT NOT NULL,
+    request_id TEXT,
+    PRIMARY KEY (log_group, log_stream)
+);
+"""
+
+
+def parse_request_line(message: str) -> Optional[Tuple[str, str]]:
+    """Returns a tuple with the line type ('START', 'END' or 'REPORT')
+    and the request id if the message is a Lambda request line."""
+    match = _REQUEST_LINE_REGEX.match(message)
+    if match:
+        return match.group(1), match.group(2)
+    return None
+
+
+class LogCache():
+    """Local SQLite cache of CloudWatch log events."""
+
+    def __init__(self, db_path: str, max_size: int):
+        FileUtils.create_folder(os.path.dirname(db_path))
+        self.max_size = max_size
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """Closes the connection with the cache database."""
+        self.connection.close()
+
+    def _get_last_timestamp(self, log_group: str, log_stream: str) -> Optional[int]:
+        row = self.connection.execute(
+            'SELECT last_timestamp FROM syncs WHERE log_group = ? AND log_stream = ?',
+            (log_group, log_stream)).fetchone()
+        return row[0] if row else None
+
+    def _get_stream_request_ids(self, log_group: str) -> Dict:
+        rows = self.connection.execute(
+            'SELECT log_stream, request_id FROM streams WHERE log_group = ?', (log_group,))
+        return dict(rows.fetchall())
+
+    def _insert_events(self, rows: List) -> None:
+        self.connection.executemany(
+            ('INSERT OR IGNORE INTO events (log_group, event_id, log_stream, timestamp, '
+             'request_id, message, size) VALUES (?, ?, ?, ?, ?, ?, ?)'), rows)
+
+    @staticmethod
+    def _tag_events(events: Iterable[Dict], log_stream: str,
+                    stream_request_ids: Dict) -> Generator[Tuple[Dict, str, Optional[str]], None, None]:
+        """Yields the events along with their log stream and the id of the request
+        they belong to (updating the request being processed in each stream)."""
+        for event in events:
+            stream = event.get('logStreamName', log_stream)
+            request_line = parse_request_line(event.get('message', ''))
+            if request_line:
+                line_type, request_id = request_line
+                stream_request_ids[stream] = None if line_type == 'REPORT' else request_id
+            else:
+                request_id = stream_request_ids.get(stream)
+            yield event, stream, request_id
+
+    @staticmethod
+    def _get_filter_args(log_group: str, log_stream: str) -> Dict:
+        kwargs = {'logGroupName': log_group}
+        if log_stream:
+            kwargs['logStreamNames'] = [log_stream]
+        return kwargs
+
+    def sync(self, client, log_group: str, log_stream: str = '') -> int:
+        """Retrieves the log events newer than the last synchronization
+        of the log group (and stream, if defined) and stores them
+        tagged with the request id they belong to.
+        Returns the number of events processed."""
+        kwargs = self._get_filter_args(log_group, log_stream)
+        last_timestamp = self._get_last_timestamp(log_group, log_stream)
+        if last_timestamp is not None:
+            kwargs['startTime'] = max(last_timestamp - _SYNC_OVERLAP_MS, 0)
+        stream_request_ids = self._get_stream_request_ids(log_group)
+        max_timestamp = last_timestamp or 0
+        rows = []
+        processed = 0
+        for event, stream, request_id in self._tag_events(client.iter_log_events(**kwargs),
+                                                          log_stream, stream_request_ids):
+            message = event.get('message', '')
+            timestamp = event.get('timestamp', 0)
+            rows.append((log_group, event.get('eventId', f'{stream}/{timestamp}/{processed}'),
+                         stream, timestamp, request_id, message, len(message)))
+            max_timestamp = max(max_timestamp, timestamp)
+            processed += 1
+            if len(rows) >= _INSERT_BATCH_SIZE:
+                self._insert_events(rows)
+                rows = []
+        self._insert_events(rows)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO streams (log_group, log_stream, request_id) VALUES (?, ?, ?)',
+            [(log_group, stream, request_id) for stream, request_id in stream_request_ids.items()])
+        self.connection.execute(
+            'INSERT OR REPLACE INTO syncs (log_group, log_stream, last_timestamp) VALUES (?, ?, ?)',
+            (log_group, log_stream, max_timestamp))
+        self.connection.commit()
+        logger.debug(f"Log cache: {processed} events retrieved from '{log_group}'.")
+        self._evict()
+        return processed
+
+    def _evict(self) -> None:
+        """Deletes the oldest events until the cache fits in 'max_size' bytes."""
+        total_size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM events').fetchone()[0]
+        excess = total_size - self.max_size
+        if excess <= 0:
+            return
+        to_delete = []
+        for rowid, size in self.connection.execute('SELECT rowid, size FROM events ORDER BY timestamp'):
+            to_delete.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany('DELETE FROM events WHERE rowid = ?', to_delete)
+        # The synchronizations can't be newer than the oldest event retained of their log group.
+        # If no event is retained, the log group is retrieved again from the beginning.
+        self.connection.execute(
+            ('UPDATE syncs SET last_timestamp = MIN(last_timestamp, '
+             '(SELECT MIN(timestamp) FROM events WHERE events.log_group = syncs.log_group)) '
+             'WHERE EXISTS (SELECT 1 FROM events WHERE events.log_group = syncs.log_group)'))
+        for table in ('syncs', 'streams'):
+            self.connection.execute(
+                f'DELETE FROM {table} WHERE NOT EXISTS '
+                f'(SELECT 1 FROM events WHERE events.log_group = {table}.log_group)')
+        self.connection.commit()
+        logger.debug(f'Log cache: {len(to_delete)} events evicted.')
+
+    def _has_request_start(self, log_group: str, request_id: str) -> bool:
+        row = self.connection.execute(
+            ("SELECT 1 FROM events WHERE log_group = ? AND request_id = ? "
+             "AND message LIKE 'START%' LIMIT 1"),
+            (log_group, request_id)).fetchone()
+        return row is not None
+
+    def has_request(self, log_group: str, request_id: str) -> bool:
+        """Checks if the cache stores the complete logs of the request
+        (i.e. the REPORT line of the request was already retrieved)."""
+        row = self.connection.execute(
+            ("SELECT 1 FROM events WHERE log_group = ? AND request_id = ? "
+             "AND message LIKE 'REPORT%' LIMIT 1"),
+            (log_group, request_id)).fetchone()
+        return row is not None
+
+    def get_request_logs(self, log_group: str, request_id: str) -> str:
+        """Returns the log messages of the request sorted by timestamp."""
+        rows = self.connection.execute(
+            ('SELECT message FROM events WHERE log_group = ? AND request_id = ? '
+             'ORDER BY timestamp, rowid'),
+            (log_group, request_id))
+        return ''.join(row[0] for row in rows)
+
+    def find_request_ids(self, log_group: str, text: str) -> List[str]:
+        """Returns the ids of the requests with a log message containing
+        the text passed (e.g. the S3 object key that triggered them)."""
+        rows = self.connection.execute(
+            ('SELECT request_id, MIN(timestamp) AS first FROM events '
+             'WHERE log_group = ? AND request_id IS NOT NULL AND instr(message, ?) > 0 '
+             'GROUP BY request_id ORDER BY first'),
+            (log_group, text))
+        return [row[0] for row in rows]
+
+    def _lookup_request_logs(self, client, log_group: str, log_stream: str, request_id: str) -> str:
+        """Returns the log messages of the request scanning the log group
+        without storing the events (used when they were evicted)."""
+        logger.debug(f"Log cache: request '{request_id}' not cached, scanning '{log_group}'.")
+        events = client.iter_log_events(**self._get_filter_args(log_group, log_stream))
+        return ''.join(event.get('message', '') for event, _, event_request_id
+                       in self._tag_events(events, log_stream, {})
+                       if event_request_id == request_id)
+
+    def get_logs(self, client, log_group: str, log_stream: str = '',
+                 request_ids: Iterable[str] = (), object_key: str = '') -> str:
+        """Returns the logs of the requests passed (or the requests
+        that processed 'object_key'). Only retrieves new events from
+        CloudWatch if the cache cannot answer the lookup (the lookups
+        by object key always retrieve the new events)."""
+        request_ids = list(request_ids)
+        if object_key or not all(self.has_request(log_group, request_id) for request_id in request_ids):
+            self.sync(client, log_group, log_stream)
+        if object_key:
+            request_ids.extend(self.find_request_ids(log_group, object_key))
+        logs = []
+        for request_id in request_ids:
+            if self._has_request_start(log_group, request_id):
+                logs.append(self.get_request_logs(log_group, request_id))
+            else:
+                logs.append(self._lookup_request_logs(client, log_group, log_stream, request_id))
+        return ''.join(logs)
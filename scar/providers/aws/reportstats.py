@@ -0,0 +1,190 @@
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module with classes and methods to compute the invocation
+statistics of a Lambda function from its REPORT log lines."""
+
+import math
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+from scar.exceptions import ValidatorError
+from scar.providers.aws.validators import MIN_LAMBDA_MEMORY, MAX_LAMBDA_MEMORY, MAX_LAMBDA_TIMEOUT
+
+_REPORT_FIELDS = {'duration': r'\tDuration: ([\d.]+) ms',
+                  'billed_duration': r'\tBilled Duration: ([\d.]+) ms',
+                  'memory_size': r'\tMemory Size: (\d+) MB',
+                  'max_memory_used': r'\tMax Memory Used: (\d+) MB',
+                  'init_duration': r'\tInit Duration: ([\d.]+) ms'}
+_REPORT_REGEX = {key: re.compile(rgx) for key, rgx in _REPORT_FIELDS.items()}
+_TIME_WINDOW_REGEX = re.compile(r'^(\d+)([smhd])$')
+_TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Filter pattern used to retrieve only the REPORT lines from CloudWatch
+REPORT_FILTER_PATTERN = '"REPORT RequestId"'
+# Extra memory and time over the maximum values used by the invocations
+_MEMORY_HEADROOM = 1.2
+_TIMEOUT_HEADROOM = 1.5
+_MEMORY_INCREMENT = 64
+# Minimum number of invocations to apply the recommended configuration
+MIN_TUNE_INVOCATIONS = 20
+
+
+def parse_report_line(message: str) -> Optional[Dict]:
+    """Returns a dictionary with the values of the REPORT line passed
+    or None if the message is not a REPORT line."""
+    if not message.startswith('REPORT RequestId'):
+        return None
+    report = {}
+    for key, rgx in _REPORT_REGEX.items():
+        match = rgx.search(message)
+        if match:
+            report[key] = float(match.group(1))
+    return report
+
+
+def get_start_time(time_window: str) -> int:
+    """Returns the timestamp (in milliseconds) of the beginning of
+    the time window passed (i.e. '30m', '12h', '7d')."""
+    match = _TIME_WINDOW_REGEX.match(time_window)
+    if not match:
+        raise ValidatorError(parameter='since',
+                             parameter_value=time_window,
+                             error_msg="Please, use a number followed by 's', 'm', 'h' or 'd' (i.e. '12h').")
+    seconds = int(match.group(1)) * _TIME_UNITS[match.group(2)]
+    return int((time.time() - seconds) * 1000)
+
+
+def percentile(sorted_values: List, percent: float) -> float:
+    """Returns the nearest-rank percentile of a sorted list of values."""
+    if not sorted_values:
+        return 0
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class InvocationStats():
+    """Accumulates the REPORT lines of a function and
+    computes its performance statistics. If a memory size is
+    passed, only the invocations with that memory are added."""
+
+    def __init__(self, function_name: str, memory_size: Optional[int] = None):
+        self.function_name = function_name
+        self.memory_size = memory_size
+        self.durations = []
+        self.max_memory_used = []
+        self.memory_sizes = set()
+        self.cold_starts = 0
+        self.billed_gb_seconds = 0.0
+
+    @property
+    def invocations(self) -> int:
+        """Number of invocations processed."""
+        return len(self.durations)
+
+    def add_report(self, report: Dict) -> None:
+        """Adds the values of a parsed REPORT line."""
+        memory_size = report.get('memory_size', 0)
+        if self.memory_size is not None and int(memory_size) != self.memory_size:
+            return
+        self.durations.append(report.get('duration', 0))
+        self.max_memory_used.append(report.get('max_memory_used', 0))
+        self.memory_sizes.add(int(memory_size))
+        if 'init_duration' in report:
+            self.cold_starts += 1
+        self.billed_gb_seconds += (report.get('billed_duration', 0) / 1000) * (memory_size / 1024)
+
+    def add_messages(self, messages: Iterable[str]) -> None:
+        """Parses and adds the REPORT lines found in the messages passed."""
+        for message in messages:
+            report = parse_report_line(message)
+            if report is not None:
+                self.add_report(report)
+
+    def get_summary(self) -> Dict:
+        """Returns a dictionary with the statistics computed."""
+        durations = sorted(self.durations)
+        memory_used = sorted(self.max_memory_used)
+        return {'FunctionName': self.function_name,
+                'Invocations': self.invocations,
+                'ColdStarts': self.cold_starts,
+                'ColdStartRate': round(self.cold_starts / self.invocations, 4) if self.invocations else 0,
+                'Duration': {'p50': percentile(durations, 50),
+                             'p90': percentile(durations, 90),
+                             'p99': percentile(durations, 99),
+                             'max': durations[-1] if durations else 0},
+                'MaxMemoryUsed': {'p50': percentile(memory_used, 50),
+                                  'p99': percentile(memory_used, 99),
+                                  'max': memory_used[-1] if memory_used else 0},
+                'MemorySize': sorted(self.memory_sizes),
+                'BilledGBSeconds': round(self.billed_gb_seconds, 4)}
+
+
+def _round_up(value: float, increment: int) -> int:
+    return int(math.ceil(value / increment) * increment)
+
+
+def recommend_memory(summary: Dict, current_memory: int) -> int:
+    """Returns the memory (in MB) recommended for the invocations summarized.
+    If any invocation used all the available memory the current value is doubled,
+    otherwise the maximum memory used plus a headroom is recommended."""
+    max_memory_used = summary['MaxMemoryUsed']['max']
+    if max_memory_used >= current_memory:
+        memory = current_memory * 2
+    else:
+        memory = _round_up(max_memory_used * _MEMORY_HEADROOM, _MEMORY_INCREMENT)
+    return min(max(memory, MIN_LAMBDA_MEMORY), MAX_LAMBDA_MEMORY)
+
+
+def recommend_timeout(summary: Dict, current_timeout: int, timeout_threshold: int) -> int:
+    """Returns the timeout (in seconds) recommended for the invocations summarized.
+    If any invocation reached the timeout the current value is doubled, otherwise
+    the maximum duration plus a headroom and the supervisor's threshold is recommended."""
+    max_duration = summary['Duration']['max'] / 1000
+    if max_duration >= current_timeout:
+        timeout = current_timeout * 2
+    else:
+        timeout = math.ceil(max_duration * _TIMEOUT_HEADROOM) + timeout_threshold
+    return min(max(timeout, timeout_threshold + 1), MAX_LAMBDA_TIMEOUT)
+
+
+def has_enough_invocations(summary: Dict) -> bool:
+    """Checks if there are enough invocations to apply the recommendations."""
+    return summary['Invocations'] >= MIN_TUNE_INVOCATIONS
+
+
+def recommend_configuration(summary: Dict, function_info: Dict, timeout_threshold: int) -> Dict:
+    """Returns the memory and timeout recommended for a function
+    based on the summary of its invocation statistics."""
+    current_memory = function_info.get('MemorySize')
+    current_timeout = function_info.get('Timeout')
+    recommendation = {'FunctionName': summary['FunctionName'],
+                      'Invocations': summary['Invocations'],
+                      'CurrentMemory': current_memory,
+                      'RecommendedMemory': current_memory,
+                      'CurrentTimeout': current_timeout,
+                      'RecommendedTimeout': current_timeout,
+                      'Applied': False,
+                      'Notice': ''}
+    if summary['Invocations'] > 0:
+        recommendation['RecommendedMemory'] = recommend_memory(summary, current_memory)
+        recommendation['RecommendedTimeout'] = recommend_timeout(summary, current_timeout, timeout_threshold)
+    if not has_enough_invocations(summary):
+        recommendation['Notice'] = (f"Only {summary['Invocations']} invocations with {current_memory} MB found, "
+                                    f"at least {MIN_TUNE_INVOCATIONS} are needed to apply the recommendation.")
+    return recommendation
+
+
+def is_configuration_changed(recommendation: Dict) -> bool:
+    """Checks if the recommended configuration differs from the current one."""
+    return (recommendation['RecommendedMemory'] != recommendation['CurrentMemory'] or
+            recommendation['RecommendedTimeout'] != recommendation['CurrentTimeout'])
@@ -13,7 +13,8 @@
 # limitations under the License.
 
 import json
-from typing import Dict
+import time
+from typing import Dict, List
 from enum import Enum
 from tabulate import tabulate
 import scar.logger as logger
@@ -90,6 +91,18 @@ def parse_lambda_function_creation_response(response, output_type, access_key):
         _print_generic_response(response, output_type, aws_output, text_message, json_output=json_message)
 
 
+def parse_lambda_function_update_response(function_name, updated_values, output_type):
+    aws_output = 'LambdaOutput'
+    if updated_values:
+        text_message = f"Function '{function_name}' successfully updated ({', '.join(updated_values)})."
+    else:
+        text_message = f"Function '{function_name}' is up to date."
+    json_message = {aws_output: {'FunctionName': function_name,
+                                 'UpdatedValues': updated_values}}
+    _print_generic_response('', output_type, aws_output, text_message,
+                            json_output=json_message, verbose_output=json_message)
+
+
 def parse_log_group_creation_response(response, log_group_name, output_type):
     if response:
         text_message = f"Log group '{log_group_name}' successfully created."
@@ -155,6 +168,102 @@ def _get_table(functions_info):
     return tabulate(table, headers)
 
 
+def parse_stats_response(functions_stats: List, output_type: int) -> None:
+    aws_output = 'Stats'
+    text_message = 'INVOCATION STATS:\n'
+    text_message += _get_stats_table(functions_stats)
+    json_message = {aws_output: functions_stats}
+    _print_generic_response('', output_type, aws_output, text_message, json_output=json_message, verbose_output=json_message)
+
+
+def _get_stats_table(functions_stats: List) -> str:
+    headers = ['NAME', 'INVOCATIONS', 'COLD_START_%', 'DURATION_P50', 'DURATION_P90',
+               'DURATION_P99', 'MAX_MEM_USED_P99', 'MEMORY', 'BILLED_GB_S']
+    table = []
+    for stats in functions_stats:
+        table.append([stats['FunctionName'],
+                      stats['Invocations'],
+                      round(stats['ColdStartRate'] * 100, 2),
+                      stats['Duration']['p50'],
+                      stats['Duration']['p90'],
+                      stats['Duration']['p99'],
+                      stats['MaxMemoryUsed']['p99'],
+                      ','.join(str(memory) for memory in stats['MemorySize']) or '-',
+                      stats['BilledGBSeconds']])
+    return tabulate(table, headers)
+
+
+def parse_tune_response(recommendations: List, output_type: int) -> None:
+    aws_output = 'Recommendations'
+    text_message = 'MEMORY AND TIMEOUT RECOMMENDATIONS:\n'
+    text_message += _get_tune_table(recommendations)
+    for recommendation in recommendations:
+        if recommendation['Notice']:
+            text_message += f"\n{recommendation['FunctionName']}: {recommendation['Notice']}"
+    json_message = {aws_output: recommendations}
+    _print_generic_response('', output_type, aws_output, text_message, json_output=json_message, verbose_output=json_message)
+
+
+def _get_tune_table(recommendations: List) -> str:
+    headers = ['NAME', 'INVOCATIONS', 'MEMORY', 'RECOMMENDED_MEMORY',
+               'TIMEOUT', 'RECOMMENDED_TIMEOUT', 'APPLIED']
+    table = []
+    for recommendation in recommendations:
+        table.append([recommendation['FunctionName'],
+                      recommendation['Invocations'],
+                      recommendation['CurrentMemory'],
+                      recommendation['RecommendedMemory'],
+                      recommendation['CurrentTimeout'],
+                      recommendation['RecommendedTimeout'],
+                      recommendation['Applied']])
+    return tabulate(table, headers)
+
+
+def parse_cache_sync_response(versions: List, mirror_dir: str, output_type: int) -> None:
+    aws_output = 'SupervisorMirror'
+    text_message = (f"Supervisor releases {', '.join(versions)} synchronized in '{mirror_dir}'.\n"
+                    f"Set 'supervisor_mirror' to '{mirror_dir}' in the 'scar' section "
+                    "of the configuration file to deploy without accessing GitHub.")
+    json_message = {aws_output: {'MirrorDir': mirror_dir, 'Versions': versions}}
+    _print_generic_response('', output_type, aws_output, text_message,
+                            json_output=json_message, verbose_output=json_message)
+
+
+def parse_cache_ls_response(entries: List, total_size: int, max_size: int, output_type: int) -> None:
+    aws_output = 'CacheEntries'
+    text_message = _get_cache_table(entries)
+    text_message += f"\n\nTotal size: {_format_size(total_size)}"
+    text_message += f" (maximum {_format_size(max_size)})" if max_size else " (no maximum)"
+    json_message = {aws_output: entries, 'TotalSize': total_size, 'MaxSize': max_size}
+    _print_generic_response('', output_type, aws_output, text_message,
+                            json_output=json_message, verbose_output=json_message)
+
+
+def parse_cache_prune_response(removed_entries: List, total_size: int, output_type: int) -> None:
+    aws_output = 'RemovedEntries'
+    text_message = (f"Removed {len(removed_entries)} cache entries. "
+                    f"Cache size: {_format_size(total_size)}.")
+    if removed_entries:
+        text_message = f"{_get_cache_table(removed_entries)}\n\n{text_message}"
+    json_message = {aws_output: removed_entries, 'TotalSize': total_size}
+    _print_generic_response('', output_type, aws_output, text_message,
+                            json_output=json_message, verbose_output=json_message)
+
+
+def _get_cache_table(entries: List) -> str:
+    headers = ['TYPE', 'NAME', 'SIZE', 'LAST USE']
+    table = [[entry['Type'],
+              entry['Name'],
+              _format_size(entry['Size']),
+              time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['LastUse']))]
+             for entry in entries]
+    return tabulate(table, headers)
+
+
+def _format_size(size: int) -> str:
+    return '{0:.2f}MB'.format(size / 1048576)
+
+
 def _parse_error_invocation_response(response, function_name):
     if response:
         if "Task timed out" in response['Payload']:
@@ -13,12 +13,20 @@
 # limitations under the License.
 
 import os
-from typing import Tuple, Dict, List
+import threading
+from typing import Tuple, Dict, List, Optional
 from scar.providers.aws import GenericClient
 import scar.exceptions as excp
 import scar.logger as logger
 from scar.utils import FileUtils
 
+# Metadata key of the uploaded objects with the SHA-256 of their content
+_HASH_METADATA_KEY = 'sha256'
+# The functions created concurrently can share buckets, so the creation
+# and the notification changes of each bucket are done one by one
+_BUCKET_LOCKS = {}
+_BUCKET_LOCKS_LOCK = threading.Lock()
+
 
 def get_bucket_and_folders(storage_path: str) -> Tuple:
     output_bucket = storage_path
@@ -31,6 +39,19 @@ def get_bucket_and_folders(storage_path: str) -> Tuple:
     return (output_bucket, output_folders)
 
 
+def _get_bucket_lock(bucket_name: str) -> threading.Lock:
+    with _BUCKET_LOCKS_LOCK:
+        return _BUCKET_LOCKS.setdefault(bucket_name, threading.Lock())
+
+
+def _get_notification_prefix(notification_conf: Dict) -> str:
+    for rule in notification_conf.get('Filter', {}).get('Key', {}).get('FilterRules', []):
+        # S3 returns the rule names capitalized
+        if rule.get('Name', '').lower() == 'prefix':
+            return rule.get('Value', '')
+    return ''
+
+
 class S3(GenericClient):
 
     def __init__(self, resources_info):
@@ -39,8 +60,9 @@ class S3(GenericClient):
 
     @excp.exception(logger)
     def create_bucket(self, bucket_name) -> None:
-        if not self.client.find_bucket(bucket_name):
-            self.client.create_bucket(bucket_name)
+        with _get_bucket_lock(bucket_name):
+            if not self.client.find_bucket(bucket_name):
+                self.client.create_bucket(bucket_name)
 
     @excp.exception(logger)
     def add_bucket_folder(self, bucket: str, folders: str) -> None:
@@ -55,24 +77,31 @@ class S3(GenericClient):
         return bucket, folders
 
     def set_input_bucket_notification(self, bucket_name: str, folders: str) -> None:
-        # First check that the function doesn't have other configurations
-        bucket_conf = self.client.get_notification_configuration(bucket_name)
-        trigger_conf = self.get_trigger_configuration(folders)
-        lambda_conf = [trigger_conf]
-        if "LambdaFunctionConfigurations" in bucket_conf:
-            lambda_conf = bucket_conf["LambdaFunctionConfigurations"]
-            lambda_conf.append(trigger_conf)
-        notification = {"LambdaFunctionConfigurations": lambda_conf}
-        self.client.put_notification_configuration(bucket_name, notification)
-
-    def delete_bucket_notification(self, bucket_name):
-        bucket_conf = self.client.get_notification_configuration(bucket_name)
-        if bucket_conf and "LambdaFunctionConfigurations" in bucket_conf:
-            lambda_conf = bucket_conf["LambdaFunctionConfigurations"]
-            filter_conf = [x for x in lambda_conf if x['LambdaFunctionArn'] != self.resources_info.get('lambda').get('arn')]
-            notification = {"LambdaFunctionConfigurations": filter_conf}
+        with _get_bucket_lock(bucket_name):
+            # First check that the function doesn't have other configurations
+            bucket_conf = self.client.get_notification_configuration(bucket_name)
+            trigger_conf = self.get_trigger_configuration(folders)
+            lambda_conf = [trigger_conf]
+            if "LambdaFunctionConfigurations" in bucket_conf:
+                lambda_conf = bucket_conf["LambdaFunctionConfigurations"]
+                lambda_conf.append(trigger_conf)
+            notification = {"LambdaFunctionConfigurations": lambda_conf}
             self.client.put_notification_configuration(bucket_name, notification)
-            logger.info("Bucket notifications successfully deleted.")
+
+    def delete_bucket_notification(self, bucket_name, folders: Optional[str] = None):
+        """Deletes the notifications of the function in the bucket
+        (only the one of the folders, if defined)."""
+        with _get_bucket_lock(bucket_name):
+            bucket_conf = self.client.get_notification_configuration(bucket_name)
+            if bucket_conf and "LambdaFunctionConfigurations" in bucket_conf:
+                lambda_conf = bucket_conf["LambdaFunctionConfigurations"]
+                function_arn = self.resources_info.get('lambda').get('arn')
+                prefix = _get_notification_prefix(self.get_trigger_configuration(folders)) if folders is not None else None
+                filter_conf = [x for x in lambda_conf if x['LambdaFunctionArn'] != function_arn or
+                               (prefix is not None and _get_notification_prefix(x) != prefix)]
+                notification = {"LambdaFunctionConfigurations": filter_conf}
+                self.client.put_notification_configuration(bucket_name, notification)
+                logger.info("Bucket notifications successfully deleted.")
 
     def get_trigger_configuration(self, folders: str) -> Dict:
         conf = {"LambdaFunctionArn": self.resources_info.get('lambda').get('arn'),
@@ -94,8 +123,11 @@ class S3(GenericClient):
         return file_key
 
     @excp.exception(logger)
-    def upload_file(self, bucket: str, folder_name: str=None, file_path: str=None, file_key: str=None) -> None:
+    def upload_file(self, bucket: str, folder_name: str=None, file_path: str=None, file_key: str=None,
+                    metadata: Dict=None) -> None:
         kwargs = {'Bucket': bucket}
+        if metadata:
+            kwargs['Metadata'] = metadata
         kwargs['Key'] = self.get_file_key(folder_name, file_path, file_key)
         if file_path:
             try:
@@ -109,6 +141,19 @@ class S3(GenericClient):
             logger.info(f"Uploading file '{file_path}' to bucket '{kwargs['Bucket']}' with key '{kwargs['Key']}'.")
         self.client.upload_file(**kwargs)
 
+    @excp.exception(logger)
+    def upload_file_if_changed(self, bucket: str, file_path: str, file_key: str) -> bool:
+        """Uploads the file storing its hash in the object metadata.
+        The upload is skipped if the stored object has the same hash.
+        Returns True if the file was uploaded."""
+        file_hash = FileUtils.get_path_hash(file_path)
+        if self.client.get_object_metadata(bucket, file_key).get(_HASH_METADATA_KEY) == file_hash:
+            logger.info(f"File '{file_key}' in bucket '{bucket}' is up to date. Skipping upload.")
+            return False
+        self.upload_file(bucket, file_path=file_path, file_key=file_key,
+                         metadata={_HASH_METADATA_KEY: file_hash})
+        return True
+
     @excp.exception(logger)
     def get_bucket_file_list(self, storage: Dict=None):
         files = []
@@ -12,19 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import os
+import shutil
+import threading
 from zipfile import ZipFile
+from scar.archive import open_nested_zip
 from scar.utils import FileUtils, SysUtils
+import scar.logger as logger
 
-
-def _extract_udocker_zip(supervisor_zip_path) -> None:
-    file_path = ""
-    with ZipFile(supervisor_zip_path) as thezip:
-        for file in thezip.namelist():
-            if file.endswith("udocker.zip"):
-                file_path = FileUtils.join_paths(FileUtils.get_tmp_dir(), file)
-                thezip.extract(file, FileUtils.get_tmp_dir())
-                break
-    return file_path
+# Repositories of the loaded images (by image file hash) and
+# the layers shared between them are cached in this folder
+_UDOCKER_CACHE_DIR = '/var/tmp/cache/scar/udocker'
+_UDOCKER_CACHE_METADATA_NAME = 'image.json'
+# udocker is configured with a process environment variable,
+# so the images of the functions created concurrently are loaded one by one
+_LOAD_LOCK = threading.Lock()
 
 
 class Udocker():
@@ -41,9 +44,14 @@ class Udocker():
         self._install_udocker(supervisor_zip_path)
 
     def _install_udocker(self, supervisor_zip_path: str) -> None:
-        udocker_zip_path = _extract_udocker_zip(supervisor_zip_path)
-        with ZipFile(udocker_zip_path) as thezip:
-            thezip.extractall(self._tmp_payload_folder_path)
+        # Extract the udocker zip stored in the supervisor zip
+        # without writing it to the system temporal folder
+        with ZipFile(supervisor_zip_path) as thezip:
+            for file in thezip.namelist():
+                if file.endswith("udocker.zip"):
+                    with open_nested_zip(thezip, file) as udocker_zip:
+                        udocker_zip.extractall(self._tmp_payload_folder_path)
+                    break
 
     def _save_tmp_udocker_env(self):
         # Avoid override global variables
@@ -63,12 +71,74 @@ class Udocker():
         self.resources_info['lambda']['environment']['Variables']['UDOCKER_LAYERS'] = '/var/task/udocker/layers/'
 
 
-    def prepare_udocker_image(self):
-        self._save_tmp_udocker_env()
-        cmd_out = SysUtils.execute_command_with_msg(self._udocker_exec + ["load", "-i",
-                                                                          self.resources_info.get('lambda').get('container').get('image_file')],
-                                                    cli_msg="Loading image file")
+    def _load_image(self) -> str:
+        """Loads the image file in the udocker folder and returns the image name."""
+        with _LOAD_LOCK:
+            self._save_tmp_udocker_env()
+            cmd_out = SysUtils.execute_command_with_msg(self._udocker_exec + ["load", "-i",
+                                                                              self.resources_info.get('lambda').get('container').get('image_file')],
+                                                        cli_msg="Loading image file")
+            self._restore_udocker_env()
         # Get the image name from the command output
-        self.resources_info['lambda']['container']['image'] = cmd_out.split('\n')[1]
+        return cmd_out.split('\n')[1]
+
+    def _is_cache_enabled(self) -> bool:
+        return self.resources_info.get('lambda').get('deployment', {}).get('package_cache', True)
+
+    def _cache_image(self, cache_path: str, image: str) -> None:
+        """Stores the repositories of the loaded image and
+        adds its layers (only the new ones) to the shared layers."""
+        # Remove the files of an interrupted caching
+        if os.path.isdir(cache_path):
+            FileUtils.delete_folder(cache_path)
+        shutil.copytree(FileUtils.join_paths(self._udocker_dir, "repos"),
+                        FileUtils.join_paths(cache_path, "repos"), symlinks=True)
+        layers_path = FileUtils.join_paths(self._udocker_dir, "layers")
+        shared_layers_path = FileUtils.join_paths(_UDOCKER_CACHE_DIR, "layers")
+        FileUtils.create_folder(shared_layers_path)
+        layers = sorted(os.listdir(layers_path)) if os.path.isdir(layers_path) else []
+        # The unused layers are removed with this lock held (see scar.cache)
+        with FileUtils.lock_file(f'{shared_layers_path}.lock'):
+            for layer in layers:
+                if not os.path.exists(FileUtils.join_paths(shared_layers_path, layer)):
+                    FileUtils.link_or_copy_file(FileUtils.join_paths(layers_path, layer),
+                                                FileUtils.join_paths(shared_layers_path, layer))
+            # The metadata is written last, so only the complete images are reused
+            metadata = json.dumps({'image': image, 'layers': layers})
+            FileUtils.save_file_atomically(FileUtils.join_paths(cache_path, _UDOCKER_CACHE_METADATA_NAME),
+                                           lambda tmp_path: FileUtils.create_file_with_content(tmp_path, metadata))
+
+    def _restore_cached_image(self, cache_path: str) -> str:
+        """Links the cached repositories and layers of the
+        image in the udocker folder and returns the image name."""
+        metadata = json.loads(FileUtils.read_file(FileUtils.join_paths(cache_path, _UDOCKER_CACHE_METADATA_NAME)))
+        shutil.copytree(FileUtils.join_paths(cache_path, "repos"),
+                        FileUtils.join_paths(self._udocker_dir, "repos"), symlinks=True, dirs_exist_ok=True)
+        layers_path = FileUtils.join_paths(self._udocker_dir, "layers")
+        FileUtils.create_folder(layers_path)
+        shared_layers_path = FileUtils.join_paths(_UDOCKER_CACHE_DIR, "layers")
+        with FileUtils.lock_file(f'{shared_layers_path}.lock'):
+            for layer in metadata.get('layers', []):
+                FileUtils.link_or_copy_file(FileUtils.join_paths(shared_layers_path, layer),
+                                            FileUtils.join_paths(layers_path, layer))
+        return metadata.get('image')
+
+    def prepare_udocker_image(self):
+        if self._is_cache_enabled():
+            image_file = self.resources_info.get('lambda').get('container').get('image_file')
+            images_path = FileUtils.join_paths(_UDOCKER_CACHE_DIR, "images")
+            cache_path = FileUtils.join_paths(images_path, FileUtils.get_path_hash(image_file))
+            FileUtils.create_folder(images_path)
+            # The functions with the same image file wait for the first one and reuse it
+            with FileUtils.lock_file(f'{cache_path}.lock'):
+                if FileUtils.is_file(FileUtils.join_paths(cache_path, _UDOCKER_CACHE_METADATA_NAME)):
+                    logger.info("Using cached udocker image.")
+                    FileUtils.touch(cache_path)
+                    image = self._restore_cached_image(cache_path)
+                else:
+                    image = self._load_image()
+                    self._cache_image(cache_path, image)
+        else:
+            image = self._load_image()
+        self.resources_info['lambda']['container']['image'] = image
         self._set_udocker_local_registry()
-        self._restore_udocker_env()
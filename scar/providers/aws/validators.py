@@ -23,6 +23,9 @@ KB = 1024
 MB = KB * KB
 MAX_POST_BODY_SIZE = MB * 6
 MAX_POST_BODY_SIZE_ASYNC = KB * 95
+MIN_LAMBDA_MEMORY = 128
+MAX_LAMBDA_MEMORY = 3008
+MAX_LAMBDA_TIMEOUT = 900
 
 
 class AWSValidator():
@@ -69,16 +72,16 @@ class AWSValidator():
 
     @staticmethod
     def validate_time(lambda_time):
-        if (lambda_time <= 0) or (lambda_time > 900):
-            error_msg = 'Please, set a value between 0 and 900.'
+        if (lambda_time <= 0) or (lambda_time > MAX_LAMBDA_TIMEOUT):
+            error_msg = f'Please, set a value between 0 and {MAX_LAMBDA_TIMEOUT}.'
             raise ValidatorError(parameter='lambda_time',
                                  parameter_value=lambda_time,
                                  error_msg=error_msg)
 
     @staticmethod
     def validate_memory(lambda_memory):
-        if (lambda_memory < 128) or (lambda_memory > 3008):
-            error_msg = 'Please, set a value between 128 and 3008.'
+        if (lambda_memory < MIN_LAMBDA_MEMORY) or (lambda_memory > MAX_LAMBDA_MEMORY):
+            error_msg = f'Please, set a value between {MIN_LAMBDA_MEMORY} and {MAX_LAMBDA_MEMORY}.'
             raise ValidatorError(parameter='lambda_memory',
                                  parameter_value=lambda_memory,
                                  error_msg=error_msg)
@@ -93,13 +96,13 @@ class AWSValidator():
                                  error_msg=error_msg)
 
     @staticmethod
-    def validate_function_code_size(scar_folder, max_payload_size):
-        if FileUtils.get_tree_size(scar_folder) > max_payload_size:
+    def validate_function_code_size(code_size, max_payload_size):
+        if code_size > max_payload_size:
             raise FunctionCodeSizeError(code_size='50MB')
 
     @staticmethod
-    def validate_s3_code_size(scar_folder, max_s3_payload_size):
-        if FileUtils.get_tree_size(scar_folder) > max_s3_payload_size:
+    def validate_s3_code_size(code_size, max_s3_payload_size):
+        if code_size > max_s3_payload_size:
             raise S3CodeSizeError(code_size='250MB')
 
     @staticmethod
@@ -0,0 +1,122 @@
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Module with the classes to run tasks with dependencies concurrently."""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from io import StringIO
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class _ThreadOutput():
+    """Stream that stores the output written by each task thread
+    in its own buffer and writes the rest in the original stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text: str) -> int:
+        return self.buffers.get(threading.get_ident(), self.stream).write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+class Task():
+    """Function to run once all its dependencies have finished."""
+
+    def __init__(self, name: str, func: Callable, dependencies: Iterable[str]):
+        self.name = name
+        self.func = func
+        self.dependencies = list(dependencies)
+        self.output = StringIO()
+        self.done = False
+
+
+class TaskScheduler():
+    """Runs the tasks added as soon as their dependencies finish, using
+    a bounded pool of threads. The output of each task is shown in the
+    order the tasks were added, so it is the same as running them serially.
+    If a task fails, no more tasks are started and the error is raised
+    once the running ones finish."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self.tasks: Dict[str, Task] = {}
+
+    def add_task(self, name: str, func: Callable, dependencies: Optional[Iterable[str]] = None) -> None:
+        """Adds a task. The dependencies must be added before."""
+        if name in self.tasks:
+            raise ValueError(f"Task '{name}' already added.")
+        for dependency in dependencies or []:
+            if dependency not in self.tasks:
+                raise ValueError(f"Dependency '{dependency}' of task '{name}' not found.")
+        self.tasks[name] = Task(name, func, dependencies or [])
+
+    def _get_ready_tasks(self, started: List[str]) -> List[Task]:
+        return [task for task in self.tasks.values()
+                if task.name not in started and
+                all(self.tasks[dependency].done for dependency in task.dependencies)]
+
+    def _run_task(self, output: _ThreadOutput, task: Task):
+        output.buffers[threading.get_ident()] = task.output
+        try:
+            return task.func()
+        finally:
+            del output.buffers[threading.get_ident()]
+
+    def _flush_outputs(self, output: _ThreadOutput, tasks: List[Task], stop_at_pending: bool = True) -> List[Task]:
+        """Writes the output of the finished tasks in order
+        and returns the tasks with output not written yet."""
+        for index, task in enumerate(tasks):
+            if task.done:
+                output.stream.write(task.output.getvalue())
+            elif stop_at_pending:
+                return tasks[index:]
+        return []
+
+    def run(self) -> None:
+        """Runs all the tasks added."""
+        output = _ThreadOutput(sys.stdout)
+        sys.stdout = output
+        pending_outputs = list(self.tasks.values())
+        started = []
+        running = {}
+        error = None
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while True:
+                    if not error:
+                        for task in self._get_ready_tasks(started):
+                            started.append(task.name)
+                            running[executor.submit(self._run_task, output, task)] = task
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        task = running.pop(future)
+                        try:
+                            future.result()
+                        except BaseException as exc:
+                            error = error or exc
+                        # Show the output of the failed task too
+                        task.done = True
+                    pending_outputs = self._flush_outputs(output, pending_outputs)
+        finally:
+            sys.stdout = output.stream
+            self._flush_outputs(output, pending_outputs, stop_at_pending=False)
+        if error:
+            raise error
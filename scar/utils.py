@@ -14,6 +14,7 @@
 """Module with methods shared by all the classes."""
 
 import base64
+import hashlib
 import json
 import os
 import re
@@ -21,18 +22,30 @@ import shutil
 import subprocess
 import tarfile
 import tempfile
+import threading
+import time
 import uuid
 import sys
+from contextlib import contextmanager
 from copy import deepcopy
-from zipfile import ZipFile
+from functools import partial
+from zipfile import ZipFile, is_zipfile
 from io import BytesIO
-from typing import Optional, Dict, List, Generator, Union, Any, Tuple
+from typing import Optional, Dict, List, Generator, Union, Any, Tuple, Callable
 from distutils import dir_util
 from packaging import version
+import requests
 import yaml
 import scar.logger as logger
+try:
+    import fcntl
+except ImportError:
+    # Not available in Windows
+    fcntl = None
 import scar.http.request as request
-from scar.exceptions import GitHubTagNotFoundError, YamlFileNotFoundError
+import scar.archive as archive
+from scar.exceptions import FileDownloadError, GitHubTagNotFoundError, SupervisorFileVerificationError, \
+                            SupervisorMirrorFileNotFoundError, YamlFileNotFoundError
 
 COMMANDS = ['scar-config']
 
@@ -159,11 +172,24 @@ class FileUtils:
 
     """Common methods for file and directory management."""
 
+    # Locks of the lock files used by the threads of this process (flock is per open file)
+    _THREAD_LOCKS = {}
+    _THREAD_LOCKS_LOCK = threading.Lock()
+
     @staticmethod
     def copy_file(source: str, dest: str) -> None:
         """Copy file to specified destination."""
         shutil.copy(source, dest)
 
+    @staticmethod
+    def link_or_copy_file(source: str, dest: str) -> None:
+        """Creates a hard link of the file (or copies it if the
+        destination is in other file system)."""
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copy2(source, dest)
+
     @staticmethod
     def copy_dir(source: str, dest: str) -> None:
         """Copy directory to specified destination."""
@@ -223,6 +249,34 @@ class FileUtils:
                 files.append(os.path.join(dirname, filename))
         return files
 
+    @staticmethod
+    def update_hash_with_path(hash_obj: Any, path: str) -> None:
+        """Updates the hash object with the content of the file passed or,
+        if it is a directory, with the relative path, mode and content
+        of all its entries (symlinks are hashed by their target)."""
+        if os.path.isdir(path):
+            for dirname, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(dirnames + filenames):
+                    entry_path = os.path.join(dirname, name)
+                    hash_obj.update(os.path.relpath(entry_path, path).encode())
+                    if os.path.islink(entry_path):
+                        hash_obj.update(os.readlink(entry_path).encode())
+                    elif os.path.isfile(entry_path):
+                        hash_obj.update(str(os.stat(entry_path).st_mode).encode())
+                        FileUtils.update_hash_with_path(hash_obj, entry_path)
+        else:
+            with open(path, 'rb') as hashed_file:
+                for chunk in iter(lambda: hashed_file.read(1048576), b''):
+                    hash_obj.update(chunk)
+
+    @staticmethod
+    def get_path_hash(path: str) -> str:
+        """Returns the SHA-256 hex digest of the file or directory passed."""
+        hash_obj = hashlib.sha256()
+        FileUtils.update_hash_with_path(hash_obj, path)
+        return hash_obj.hexdigest()
+
     @staticmethod
     def get_file_size(file_path: str) -> int:
         """Returns the file size in bytes"""
@@ -251,6 +305,54 @@ class FileUtils:
         if os.path.isfile(path):
             os.remove(path)
 
+    @staticmethod
+    def touch(path: str) -> None:
+        """Updates the modification time of the file or folder
+        (used as last use time of the cache entries)."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    @contextmanager
+    def lock_file(lock_path: str, blocking: bool = True) -> Generator[bool, None, None]:
+        """Exclusive lock shared by all the threads and processes that use the same
+        lock file. If not 'blocking', yields False when the lock is already held."""
+        with FileUtils._THREAD_LOCKS_LOCK:
+            thread_lock = FileUtils._THREAD_LOCKS.setdefault(os.path.abspath(lock_path), threading.Lock())
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            with open(lock_path, 'a') as lock:
+                acquired = True
+                if fcntl:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        acquired = False
+                try:
+                    yield acquired
+                finally:
+                    if fcntl and acquired:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+    @staticmethod
+    def save_file_atomically(file_path: str, write_file: Callable[[str], None]) -> None:
+        """Writes the file in a temporary path of its folder and moves it
+        to its final path, so the readers never find an incomplete file."""
+        tmp_file = tempfile.NamedTemporaryFile(dir=os.path.dirname(file_path),
+                                               prefix=f'.{os.path.basename(file_path)}.', delete=False)
+        tmp_file.close()
+        try:
+            write_file(tmp_file.name)
+            os.replace(tmp_file.name, file_path)
+        finally:
+            FileUtils.delete_file(tmp_file.name)
+
     @staticmethod
     def delete_folder(path: str) -> None:
         """Delete a folder with all its contents."""
@@ -279,12 +381,12 @@ class FileUtils:
                                           cli_msg=msg)
 
     @staticmethod
-    def zip_folder(zip_path: str, folder_to_zip_path: str, msg: str='') -> None:
-        """Must use the zip binary to preserve the file properties and the symlinks."""
-        zip_exe = '/usr/bin/zip'
-        SysUtils.execute_command_with_msg([zip_exe, '-r9y', zip_path, '.'],
-                                          cmd_wd=folder_to_zip_path,
-                                          cli_msg=msg)
+    def zip_folder(zip_path: str, folder_to_zip_path: str, msg: str='',
+                   compression_level: int=archive.DEFAULT_COMPRESSION_LEVEL) -> None:
+        """Zips the contents of the folder preserving the file properties and the symlinks."""
+        if msg:
+            logger.info(msg)
+        archive.zip_folder(zip_path, folder_to_zip_path, compression_level)
 
     @staticmethod
     def is_file(file_path: str):
@@ -395,99 +497,355 @@ class StrUtils:
 class GitHubUtils:
 
     """Common methods for GitHub API Queries.
-    https://developer.github.com/v3/repos/releases/"""
+    https://developer.github.com/v3/repos/releases/
+
+    The release metadata is cached in memory and in disk. The disk
+    cache entries are revalidated with conditional requests (ETag)
+    when they are older than the TTL."""
+
+    _RELEASE_CACHE_DIR = '/var/tmp/cache/scar/github'
+    _RELEASE_CACHE_TTL = 3600
+    _releases = {}
+    _releases_lock = threading.Lock()
+
+    @staticmethod
+    def _get_release_url(user: str, project: str, tag_name: str) -> str:
+        if tag_name == 'latest':
+            return f'https://api.github.com/repos/{user}/{project}/releases/latest'
+        return f'https://api.github.com/repos/{user}/{project}/releases/tags/{tag_name}'
+
+    @classmethod
+    def _get_cache_path(cls, url: str) -> str:
+        return FileUtils.join_paths(cls._RELEASE_CACHE_DIR,
+                                    f'{hashlib.sha256(url.encode()).hexdigest()}.json')
+
+    @classmethod
+    def _load_cache_entry(cls, url: str) -> Dict:
+        cache_path = cls._get_cache_path(url)
+        if FileUtils.is_file(cache_path):
+            try:
+                return json.loads(FileUtils.read_file(cache_path))
+            except ValueError:
+                # Corrupted entry, request the release again
+                pass
+        return {}
+
+    @classmethod
+    def _save_cache_entry(cls, url: str, entry: Dict) -> None:
+        FileUtils.create_folder(cls._RELEASE_CACHE_DIR)
+        FileUtils.create_file_with_content(cls._get_cache_path(url), json.dumps(entry))
+
+    @classmethod
+    def _request_release(cls, url: str, entry: Dict) -> Dict:
+        """Requests the release metadata (conditionally if it was cached)
+        and returns the updated cache entry."""
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry.get('etag')
+        try:
+            response = request.get(url, headers=headers)
+        except requests.exceptions.RequestException:
+            if entry:
+                logger.debug(f"Using stale cached release metadata of '{url}'.")
+                return entry
+            raise
+        if response.status_code == 304:
+            logger.debug(f"Cached release metadata of '{url}' not modified.")
+        elif response.status_code == 200:
+            entry = {'release': response.json(), 'etag': response.headers.get('ETag', '')}
+        elif response.status_code == 404:
+            entry = {'release': None, 'etag': ''}
+        else:
+            # i.e. rate limit exceeded, use the stale metadata if available
+            return entry if entry else {'release': None}
+        entry['time'] = time.time()
+        cls._save_cache_entry(url, entry)
+        return entry
+
+    @classmethod
+    def get_release(cls, user: str, project: str, tag_name: str='latest') -> Optional[Dict]:
+        """Returns the metadata of the release or None if it doesn't exist."""
+        url = cls._get_release_url(user, project, tag_name)
+        with cls._releases_lock:
+            if url not in cls._releases:
+                entry = cls._load_cache_entry(url)
+                if not entry or time.time() - entry.get('time', 0) > cls._RELEASE_CACHE_TTL:
+                    entry = cls._request_release(url, entry)
+                cls._releases[url] = entry.get('release')
+            return cls._releases[url]
 
     @staticmethod
     def get_latest_release(user: str, project: str) -> str:
         """Get the tag of the latest release in a repository."""
-        url = f'https://api.github.com/repos/{user}/{project}/releases/latest'
-        response = request.get_file(url)
-        if response:
-            response = json.loads(response)
-            return response.get('tag_name', '')
+        release = GitHubUtils.get_release(user, project)
+        if release:
+            return release.get('tag_name', '')
         else:
             return None
 
     @staticmethod
     def exists_release_in_repo(user: str, project: str, tag_name: str) -> bool:
         """Check if a tagged release exists in a repository."""
-        url = f'https://api.github.com/repos/{user}/{project}/releases/tags/{tag_name}'
-        response = request.get_file(url)
-        if not response:
-            return False
-        response = json.loads(response)
-        if 'message' in response and response['message'] == 'Not Found':
-            return False
-        return True
+        return bool(GitHubUtils.get_release(user, project, tag_name))
+
+    @staticmethod
+    def _get_existing_release(user: str, project: str, tag_name: str) -> Dict:
+        release = GitHubUtils.get_release(user, project, tag_name)
+        if tag_name != 'latest' and not release:
+            raise GitHubTagNotFoundError(tag=tag_name)
+        return release or {}
+
+    @staticmethod
+    def get_asset(user: str, project: str, asset_name: str,
+                  tag_name: str='latest') -> Optional[Dict]:
+        """Get the asset info (url, size...) from the specified github tagged project."""
+        release = GitHubUtils._get_existing_release(user, project, tag_name)
+        for asset in release.get('assets', []):
+            if asset['name'] == asset_name:
+                return asset
+        return None
 
     @staticmethod
     def get_asset_url(user: str, project: str, asset_name: str,
                       tag_name: str='latest') -> Optional[str]:
         """Get the download asset url from the specified github tagged project."""
-        if tag_name == 'latest':
-            url = f'https://api.github.com/repos/{user}/{project}/releases/latest'
-        else:
-            if GitHubUtils.exists_release_in_repo(user, project, tag_name):
-                url = f'https://api.github.com/repos/{user}/{project}/releases/tags/{tag_name}'
-            else:
-                raise GitHubTagNotFoundError(tag=tag_name)
-        response = json.loads(request.get_file(url))
-        if isinstance(response, dict) and 'assets' in response:
-            for asset in response['assets']:
-                if asset['name'] == asset_name:
-                    return asset['browser_download_url']
-        return None
+        asset = GitHubUtils.get_asset(user, project, asset_name, tag_name)
+        return asset['browser_download_url'] if asset else None
 
     @staticmethod
     def get_source_code_url(user: str, project: str, tag_name: str='latest') -> str:
         """Get the source code's url from the specified github tagged project."""
-        source_url = ""
-        repo_url = ""
-        if tag_name == 'latest':
-            repo_url = f'https://api.github.com/repos/{user}/{project}/releases/latest'
-        else:
-            if GitHubUtils.exists_release_in_repo(user, project, tag_name):
-                repo_url = f'https://api.github.com/repos/{user}/{project}/releases/tags/{tag_name}'
-            else:
-                raise GitHubTagNotFoundError(tag=tag_name)
-        if repo_url:
-            response = json.loads(request.get_file(repo_url))
-            if isinstance(response, dict):
-                source_url = response.get('zipball_url')
-        return source_url
+        return GitHubUtils._get_existing_release(user, project, tag_name).get('zipball_url', '')
 
 
 class SupervisorUtils:
-
     """Common methods for FaaS Supervisor management.
-    https://github.com/grycap/faas-supervisor/"""
+    https://github.com/grycap/faas-supervisor/
+
+    If a mirror (local folder or HTTP URL) is set, the versions, the source
+    code and the binary assets are obtained from it instead of GitHub.
+    The mirror uses the same layout as the cache folder plus a
+    'releases.json' file, and it is filled with 'scar cache sync'."""
 
     _SUPERVISOR_GITHUB_REPO = 'faas-supervisor'
     _SUPERVISOR_GITHUB_USER = 'grycap'
     _SUPERVISOR_GITHUB_ASSET_NAME = 'supervisor'
     _SUPERVISOR_CACHE_DIR = '/var/tmp/cache/scar'
     _SUPERVISOR_SOURCE_NAME = 'faas-supervisor.zip'
+    _SUPERVISOR_DOWNLOAD_URL = 'https://github.com/{user}/{repo}/releases/download/{version}/{asset}'
+    _MIRROR_ENV_VAR = 'SCAR_SUPERVISOR_MIRROR'
+    _MIRROR_RELEASES_FILE = 'releases.json'
+    _CHECKSUM_EXTENSION = '.sha256'
+    _mirror = ''
+    _mirror_releases = None
+
+    @classmethod
+    def set_mirror(cls, mirror: Optional[str]) -> None:
+        """Sets the supervisor mirror. The environment variable
+        'SCAR_SUPERVISOR_MIRROR' overrides the value passed."""
+        cls._mirror = os.getenv(cls._MIRROR_ENV_VAR, mirror or '')
+        cls._mirror_releases = None
+        if cls._mirror:
+            logger.debug(f"Using supervisor mirror: '{cls._mirror}'.")
+
+    @classmethod
+    def _is_http_mirror(cls) -> bool:
+        return cls._mirror.startswith(('http://', 'https://'))
+
+    @classmethod
+    def _get_mirror_url(cls, file_name: str) -> str:
+        return f"{cls._mirror.rstrip('/')}/{file_name}"
+
+    @classmethod
+    def _get_mirror_releases(cls) -> Dict:
+        if cls._mirror_releases is None:
+            if cls._is_http_mirror():
+                content = request.get_file(cls._get_mirror_url(cls._MIRROR_RELEASES_FILE))
+                releases = json.loads(content) if content else {}
+            else:
+                releases = cls._read_releases_file(cls._mirror)
+            if not releases:
+                raise SupervisorMirrorFileNotFoundError(file_name=cls._MIRROR_RELEASES_FILE,
+                                                        mirror=cls._mirror)
+            cls._mirror_releases = releases
+        return cls._mirror_releases
+
+    @classmethod
+    def _read_releases_file(cls, folder: str) -> Dict:
+        releases_path = FileUtils.join_paths(folder, cls._MIRROR_RELEASES_FILE)
+        if FileUtils.is_file(releases_path):
+            return json.loads(FileUtils.read_file(releases_path))
+        return {}
+
+    @classmethod
+    def _get_mirror_writer(cls, supervisor_version: str, file_name: str) -> Tuple[Callable, Optional[str]]:
+        """Returns the function that copies or downloads the file of the supervisor
+        version from the mirror and the checksum stored in the mirror (if any)."""
+        mirror_file = f'{supervisor_version}/{file_name}'
+        if cls._is_http_mirror():
+            checksum = request.get_file(cls._get_mirror_url(f'{mirror_file}{cls._CHECKSUM_EXTENSION}'))
+            writer = partial(cls._download_mirror_file, mirror_file)
+            checksum = checksum.decode() if checksum else None
+        else:
+            mirror_path = FileUtils.join_paths(cls._mirror, supervisor_version, file_name)
+            if not FileUtils.is_file(mirror_path):
+                raise SupervisorMirrorFileNotFoundError(file_name=mirror_file, mirror=cls._mirror)
+            writer = partial(FileUtils.copy_file, mirror_path)
+            checksum = cls._read_checksum(mirror_path)
+        return writer, checksum.split()[0] if checksum else None
+
+    @classmethod
+    def _download_mirror_file(cls, mirror_file: str, file_path: str) -> str:
+        try:
+            return cls._download_file(cls._get_mirror_url(mirror_file), file_path)
+        except FileDownloadError as err:
+            if err.kwargs.get('status_code') == 404:
+                raise SupervisorMirrorFileNotFoundError(file_name=mirror_file, mirror=cls._mirror)
+            raise
+
+    @staticmethod
+    def _download_file(url: str, file_path: str) -> str:
+        """Streams the url content to the file and returns its SHA-256."""
+        logger.info(f"Downloading '{url}'.")
+        hash_obj = hashlib.sha256()
+        try:
+            with open(file_path, "wb") as thefile:
+                request.download_file(url, thefile, hash_obj)
+        except requests.exceptions.RequestException as err:
+            status_code = err.response.status_code if err.response is not None else None
+            raise FileDownloadError(url=url, error_msg=err, status_code=status_code)
+        return hash_obj.hexdigest()
+
+    @classmethod
+    def _read_checksum(cls, file_path: str) -> Optional[str]:
+        checksum_path = f'{file_path}{cls._CHECKSUM_EXTENSION}'
+        if FileUtils.is_file(checksum_path):
+            return FileUtils.read_file(checksum_path)
+        return None
+
+    @classmethod
+    def _write_checksum(cls, file_path: str, file_hash: str) -> None:
+        """Writes the checksum file in 'sha256sum' format, with the size
+        and the modification time of the file in a comment line."""
+        file_stat = os.stat(file_path)
+        content = (f'{file_hash}  {os.path.basename(file_path)}\n'
+                   f'# size={file_stat.st_size} mtime_ns={file_stat.st_mtime_ns}\n')
+        FileUtils.save_file_atomically(f'{file_path}{cls._CHECKSUM_EXTENSION}',
+                                       lambda tmp_path: FileUtils.create_file_with_content(tmp_path, content))
+
+    @staticmethod
+    def _get_checksum_stat(checksum: str) -> Dict:
+        for line in checksum.splitlines():
+            if line.startswith('#'):
+                return dict(field.split('=', 1) for field in line[1:].split() if '=' in field)
+        return {}
+
+    @classmethod
+    def is_valid_cache_file(cls, file_path: str) -> bool:
+        """Checks that the file exists and that its content
+        matches the checksum stored when it was downloaded.
+        The file is only hashed again if its size or
+        modification time differ from the stored ones."""
+        checksum = cls._read_checksum(file_path)
+        if not checksum or not FileUtils.is_file(file_path):
+            return False
+        file_stat = os.stat(file_path)
+        stored_stat = cls._get_checksum_stat(checksum)
+        if stored_stat.get('size') == str(file_stat.st_size) and \
+           stored_stat.get('mtime_ns') == str(file_stat.st_mtime_ns):
+            return True
+        file_hash = checksum.split()[0]
+        if file_hash != FileUtils.get_path_hash(file_path):
+            return False
+        # The content didn't change (e.g. the file was touched), store the new values
+        cls._write_checksum(file_path, file_hash)
+        return True
+
+    @staticmethod
+    def _verify_file(file_path: str, file_name: str, size: Optional[int], sha256: Optional[str],
+                     file_hash: Optional[str] = None) -> str:
+        """Checks the size and checksum of the downloaded file and returns its SHA-256."""
+        file_size = FileUtils.get_file_size(file_path)
+        if file_size == 0 or (size is not None and file_size != size):
+            raise SupervisorFileVerificationError(file_name=file_name,
+                                                  error_msg=f'size {file_size} bytes, expected {size}')
+        if file_name.endswith('.zip') and not is_zipfile(file_path):
+            raise SupervisorFileVerificationError(file_name=file_name, error_msg='invalid zip file')
+        file_hash = file_hash or FileUtils.get_path_hash(file_path)
+        if sha256 and file_hash != sha256:
+            raise SupervisorFileVerificationError(file_name=file_name,
+                                                  error_msg=f'SHA-256 {file_hash}, expected {sha256}')
+        return file_hash
+
+    @classmethod
+    def save_cache_file(cls, file_path: str, write_file: Callable[[str], Optional[str]],
+                         size: Optional[int] = None, sha256: Optional[str] = None) -> str:
+        """Writes the file in a temporary path, verifies it and moves it atomically
+        to its final path along with its checksum file. The threads and processes
+        saving the same file wait for the first one and reuse the file."""
+        folder, file_name = os.path.split(file_path)
+        FileUtils.create_folder(folder)
+        with FileUtils.lock_file(f'{file_path}.lock'):
+            if cls.is_valid_cache_file(file_path):
+                FileUtils.touch(folder)
+                return file_path
+            tmp_file = tempfile.NamedTemporaryFile(dir=folder, prefix=f'.{file_name}.', delete=False)
+            tmp_file.close()
+            try:
+                # The writers that stream the content return its hash
+                file_hash = write_file(tmp_file.name)
+                file_hash = cls._verify_file(tmp_file.name, file_name, size, sha256, file_hash)
+                os.replace(tmp_file.name, file_path)
+            finally:
+                FileUtils.delete_file(tmp_file.name)
+            cls._write_checksum(file_path, file_hash)
+        return file_path
+
+    @staticmethod
+    def _get_asset_sha256(asset: Dict) -> Optional[str]:
+        # The digest is only available in the assets uploaded since mid 2025
+        digest = asset.get('digest') or ''
+        return digest[len('sha256:'):] if digest.startswith('sha256:') else None
+
+    @classmethod
+    def _save_supervisor_file(cls, supervisor_version: str, file_name: str, file_path: str) -> str:
+        if cls._mirror:
+            writer, sha256 = cls._get_mirror_writer(supervisor_version, file_name)
+            return cls.save_cache_file(file_path, writer, sha256=sha256)
+        if file_name == cls._SUPERVISOR_SOURCE_NAME:
+            url = GitHubUtils.get_source_code_url(cls._SUPERVISOR_GITHUB_USER,
+                                                  cls._SUPERVISOR_GITHUB_REPO,
+                                                  supervisor_version)
+            return cls.save_cache_file(file_path, partial(cls._download_file, url))
+        asset = GitHubUtils.get_asset(cls._SUPERVISOR_GITHUB_USER,
+                                      cls._SUPERVISOR_GITHUB_REPO,
+                                      file_name,
+                                      supervisor_version) or {}
+        return cls.save_cache_file(file_path,
+                                    partial(cls._download_file, asset.get('browser_download_url')),
+                                    asset.get('size'), cls._get_asset_sha256(asset))
 
     @classmethod
     def download_supervisor(cls, supervisor_version: str) -> str:
-        """Downloads the FaaS Supervisor .zip package to the specified path."""
+        """Downloads the FaaS Supervisor .zip package to the cache."""
         path = FileUtils.join_paths(cls._SUPERVISOR_CACHE_DIR, supervisor_version)
         supervisor_zip_path = FileUtils.join_paths(path, cls._SUPERVISOR_SOURCE_NAME)
-        supervisor_zip_url = GitHubUtils.get_source_code_url(
-            cls._SUPERVISOR_GITHUB_USER,
-            cls._SUPERVISOR_GITHUB_REPO,
-            supervisor_version)
-        with open(supervisor_zip_path, "wb") as thezip:
-            thezip.write(request.get_file(supervisor_zip_url))
-        return supervisor_zip_path
+        return cls._save_supervisor_file(supervisor_version, cls._SUPERVISOR_SOURCE_NAME,
+                                         supervisor_zip_path)
+
+    @classmethod
+    def _exists_release(cls, supervisor_version: str) -> bool:
+        if cls._mirror:
+            return supervisor_version in cls._get_mirror_releases().get('versions', [])
+        return GitHubUtils.exists_release_in_repo(cls._SUPERVISOR_GITHUB_USER,
+                                                  cls._SUPERVISOR_GITHUB_REPO,
+                                                  supervisor_version)
 
     @classmethod
     def check_supervisor_version(cls, supervisor_version: str) -> str:
         """Checks if the specified version exists in FaaS Supervisor's GitHub
-        repository. Returns the version if exists and 'latest' if not."""
-        if GitHubUtils.exists_release_in_repo(cls._SUPERVISOR_GITHUB_USER,
-                                              cls._SUPERVISOR_GITHUB_REPO,
-                                              supervisor_version):
+        repository (or mirror). Returns the version if exists and 'latest' if not."""
+        if cls._exists_release(supervisor_version):
             logger.info(f'Using supervisor release: \'{supervisor_version}\'.')
             return supervisor_version
         latest_version = SupervisorUtils.get_latest_release()
@@ -499,6 +857,15 @@ class SupervisorUtils:
     @classmethod
     def get_supervisor_binary_url(cls, supervisor_version: str) -> str:
         """Returns the supervisor's binary download url."""
+        if cls._is_http_mirror():
+            return cls._get_mirror_url(f'{supervisor_version}/{cls._SUPERVISOR_GITHUB_ASSET_NAME}')
+        if cls._mirror:
+            # The instances can't access the local mirror,
+            # use the GitHub download url without querying the API
+            return cls._SUPERVISOR_DOWNLOAD_URL.format(user=cls._SUPERVISOR_GITHUB_USER,
+                                                       repo=cls._SUPERVISOR_GITHUB_REPO,
+                                                       version=supervisor_version,
+                                                       asset=cls._SUPERVISOR_GITHUB_ASSET_NAME)
         return GitHubUtils.get_asset_url(cls._SUPERVISOR_GITHUB_USER,
                                          cls._SUPERVISOR_GITHUB_REPO,
                                          cls._SUPERVISOR_GITHUB_ASSET_NAME,
@@ -507,33 +874,63 @@ class SupervisorUtils:
     @classmethod
     def get_latest_release(cls) -> str:
         """Returns the latest FaaS Supervisor version."""
+        if cls._mirror:
+            return cls._get_mirror_releases().get('latest')
         return GitHubUtils.get_latest_release(cls._SUPERVISOR_GITHUB_USER,
                                               cls._SUPERVISOR_GITHUB_REPO)
 
     @classmethod
     def download_supervisor_asset(cls, version: str, asset_name: str, supervisor_zip_path: str) -> str:
         """Downloads the FaaS Supervisor asset to the specified path."""
-        supervisor_zip_url = GitHubUtils.get_asset_url(cls._SUPERVISOR_GITHUB_USER,
-                                                       cls._SUPERVISOR_GITHUB_REPO,
-                                                       asset_name,
-                                                       version)
-        with open(supervisor_zip_path, "wb") as thezip:
-            thezip.write(request.get_file(supervisor_zip_url))
-        return supervisor_zip_path
+        return cls._save_supervisor_file(version, asset_name, supervisor_zip_path)
+
+    @classmethod
+    def get_mirror_dir(cls) -> str:
+        """Returns the local mirror folder or the cache folder if it's not set."""
+        if cls._mirror and not cls._is_http_mirror():
+            return cls._mirror
+        return cls._SUPERVISOR_CACHE_DIR
+
+    @classmethod
+    def sync_mirror(cls, mirror_dir: str, supervisor_versions: Optional[List[str]] = None) -> List[str]:
+        """Downloads the source code and the binary assets of the supervisor
+        versions from GitHub to the mirror folder. Returns the versions synchronized."""
+        releases = cls._read_releases_file(mirror_dir)
+        releases.setdefault('versions', [])
+        synced_versions = []
+        for supervisor_version in supervisor_versions or ['latest']:
+            release = GitHubUtils.get_release(cls._SUPERVISOR_GITHUB_USER,
+                                              cls._SUPERVISOR_GITHUB_REPO,
+                                              supervisor_version)
+            if not release:
+                raise GitHubTagNotFoundError(tag=supervisor_version)
+            tag_name = release.get('tag_name')
+            version_path = FileUtils.join_paths(mirror_dir, tag_name)
+            # The release files don't change, the ones already downloaded are skipped
+            cls.save_cache_file(FileUtils.join_paths(version_path, cls._SUPERVISOR_SOURCE_NAME),
+                                 partial(cls._download_file, release.get('zipball_url')))
+            for asset in release.get('assets', []):
+                cls.save_cache_file(FileUtils.join_paths(version_path, asset['name']),
+                                     partial(cls._download_file, asset['browser_download_url']),
+                                     asset.get('size'), cls._get_asset_sha256(asset))
+            if tag_name not in releases['versions']:
+                releases['versions'].append(tag_name)
+            if supervisor_version == 'latest':
+                releases['latest'] = tag_name
+            synced_versions.append(tag_name)
+        if not releases.get('latest'):
+            releases['latest'] = max(releases['versions'], key=version.parse)
+        FileUtils.create_file_with_content(FileUtils.join_paths(mirror_dir, cls._MIRROR_RELEASES_FILE),
+                                           json.dumps(releases, indent=2))
+        return synced_versions
 
     @classmethod
     def is_supervisor_asset_cached(cls, asset_name: str, supervisor_version: str) -> Tuple[bool, str]:
-        """Check if specified supervisor asset is cached."""
-        supervisor_path = FileUtils.join_paths(cls._SUPERVISOR_CACHE_DIR, supervisor_version)
-        supervisor_zip_path = FileUtils.join_paths(supervisor_path, asset_name)
-        try:
-            # The file must exist and be more that 1MB
-            if os.path.isfile(supervisor_zip_path) and os.path.getsize(supervisor_zip_path) > 1048576:
-                return True, supervisor_zip_path
-            elif not os.path.exists(supervisor_path):
-                os.makedirs(supervisor_path)
-        except Exception as ex:
-            logger.warning('Error checking asset file in cache: %s' % ex)
+        """Check if specified supervisor asset is cached and not corrupted."""
+        supervisor_zip_path = FileUtils.join_paths(cls._SUPERVISOR_CACHE_DIR, supervisor_version, asset_name)
+        if cls.is_valid_cache_file(supervisor_zip_path):
+            FileUtils.touch(os.path.dirname(supervisor_zip_path))
+            return True, supervisor_zip_path
         return False, supervisor_zip_path
 
     @classmethod
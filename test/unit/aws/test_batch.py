@@ -129,6 +129,42 @@ class TestBatch(unittest.TestCase):
                                                        'version': '1'}}}
         self.assertEqual(batch.client.client.create_compute_environment.call_args_list[0][1], res)
 
+    @patch('boto3.Session')
+    @patch('scar.providers.aws.batchfunction.FileUtils.load_tmp_config_file')
+    def test_update_job_definition(self, load_tmp_config_file, boto_session):
+        session = MagicMock(['client'])
+        client = MagicMock(['register_job_definition', 'describe_job_definitions'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        load_tmp_config_file.return_value = {}
+
+        def _get_batch():
+            return Batch({'lambda': {'name': 'fname',
+                                     'supervisor': {'version': '1.4.2'},
+                                     'container': {'image': 'some/image:tag',
+                                                   'environment': {'Variables': {'KEY': 'value'}}}},
+                          'batch': {'memory': 1024,
+                                    'vcpus': 1,
+                                    'environment': {'Variables': {}},
+                                    'multi_node_parallel': {'enabled': False}}})
+        batch = _get_batch()
+        batch._set_required_environment_variables()
+        deployed_job_def = dict(batch._get_job_definition_args(), revision=2, status='ACTIVE')
+        client.describe_job_definitions.return_value = {'jobDefinitions': [deployed_job_def]}
+
+        # Same function definition
+        self.assertFalse(_get_batch().update_job_definition())
+        self.assertEqual(client.register_job_definition.call_count, 0)
+        self.assertEqual(client.describe_job_definitions.call_args_list[0][1],
+                         {'jobDefinitionName': 'fname', 'status': 'ACTIVE'})
+
+        # The container variables changed
+        batch = _get_batch()
+        batch.resources_info['lambda']['container']['environment']['Variables']['KEY'] = 'new'
+        self.assertTrue(batch.update_job_definition())
+        environment = client.register_job_definition.call_args_list[0][1]['containerProperties']['environment']
+        self.assertIn({'name': 'KEY', 'value': 'new'}, environment)
+
     @patch('boto3.Session')
     def test_delete_compute_environment(self, boto_session):
         session = MagicMock(['client'])
@@ -15,6 +15,8 @@
 # limitations under the License.
 import unittest
 import sys
+import os
+import tempfile
 from mock import MagicMock
 from mock import patch
 
@@ -61,5 +63,162 @@ class TestCloudWatchLogs(unittest.TestCase):
                               'cloudwatch': {'log_stream_name': 'stream',
                                              'request_id': 'reqid'}})
         cwl.client.client.filter_log_events.return_value = {'events': [{'message': 'mess', 'timestamp': 'times'}]}
-        cwl.client.client.describe_jobs.return_value = {'jobs': [{'status': 'SUCCEEDED'}]}
-        self.assertEqual(cwl.get_aws_logs(), "Batch job status: SUCCEEDED\nmess")
+        cwl.client.client.describe_jobs.return_value = {'jobs': [{'jobId': 'reqid',
+                                                                  'status': 'SUCCEEDED',
+                                                                  'container': {'logStreamName': 'jstream'}}]}
+        self.assertEqual(cwl.get_aws_logs(), "Batch job 'reqid' status: SUCCEEDED\nmess")
+
+    @patch('boto3.Session')
+    def test_get_aws_logs_multinode_job(self, boto_session):
+        session = MagicMock(['client'])
+        client = MagicMock(['filter_log_events', 'describe_jobs'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        cwl = CloudWatchLogs({'lambda': {'name': 'fname'},
+                              'cloudwatch': {'request_id': 'reqid'}})
+        cwl.client.client.filter_log_events.side_effect = lambda **kwargs: {
+            'events': [{'message': f"{kwargs['logStreamNames'][0]} mess", 'timestamp': 1}]} \
+            if kwargs['logGroupName'] == '/aws/batch/job' else {'events': []}
+        cwl.client.client.describe_jobs.side_effect = [
+            {'jobs': [{'jobId': 'reqid', 'status': 'FAILED', 'nodeProperties': {'numNodes': 2}}]},
+            {'jobs': [{'jobId': 'reqid#0', 'status': 'SUCCEEDED', 'container': {'logStreamName': 'node0'}},
+                      {'jobId': 'reqid#1', 'status': 'FAILED', 'statusReason': 'Essential container exited',
+                       'container': {'logStreamName': 'node1'}}]}]
+        self.assertEqual(cwl.get_aws_logs(), ("Batch job 'reqid' status: FAILED\n"
+                                              "Batch job 'reqid#0' status: SUCCEEDED\nnode0 mess\n"
+                                              "Batch job 'reqid#1' status: FAILED (Essential container exited)\n"
+                                              "node1 mess"))
+        self.assertEqual(cwl.client.client.describe_jobs.call_args_list[1][1], {'jobs': ['reqid#0', 'reqid#1']})
+
+    @patch('time.sleep')
+    @patch('boto3.Session')
+    def test_follow_batch_logs(self, boto_session, sleep):
+        session = MagicMock(['client'])
+        client = MagicMock(['filter_log_events', 'describe_jobs'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        cwl = CloudWatchLogs({'lambda': {'name': 'fname'},
+                              'cloudwatch': {'request_id': 'reqid'}})
+        job = {'jobId': 'reqid', 'container': {'logStreamName': 'jstream'}}
+        cwl.client.client.describe_jobs.side_effect = [{'jobs': [dict(job, status='RUNNING')]},
+                                                       {'jobs': [dict(job, status='SUCCEEDED')]}]
+        cwl.client.client.filter_log_events.side_effect = [
+            {'events': [{'eventId': '1', 'timestamp': 1, 'message': 'mess1'}]},
+            {'events': [{'eventId': '1', 'timestamp': 1, 'message': 'mess1'},
+                        {'eventId': '2', 'timestamp': 2, 'message': 'mess2'}]}]
+        self.assertEqual(list(cwl.follow_batch_logs()), ["Batch job 'reqid' status: RUNNING",
+                                                         "mess1",
+                                                         "Batch job 'reqid' status: SUCCEEDED",
+                                                         "mess2"])
+        self.assertEqual(cwl.client.client.filter_log_events.call_args_list[1][1]['startTime'], 1)
+        self.assertEqual(sleep.call_count, 1)
+
+    @patch('boto3.Session')
+    def test_get_aws_logs_cached(self, boto_session):
+        session = MagicMock(['client'])
+        client = MagicMock(['filter_log_events'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        tmp_dir = tempfile.TemporaryDirectory()
+        cloudwatch = {'log_cache': {'enabled': True,
+                                    'max_size': 1024,
+                                    'path': os.path.join(tmp_dir.name, 'logs.db')},
+                      'request_id': 'reqid2'}
+        cwl = CloudWatchLogs({'lambda': {'name': 'fname'}, 'cloudwatch': cloudwatch})
+        events = [{'eventId': '1', 'logStreamName': 's1', 'timestamp': 1, 'message': 'START RequestId: reqid1 Version: $LATEST\n'},
+                  {'eventId': '2', 'logStreamName': 's2', 'timestamp': 2, 'message': 'START RequestId: reqid2 Version: $LATEST\n'},
+                  {'eventId': '3', 'logStreamName': 's1', 'timestamp': 3, 'message': 'Downloading key input/f1.jpg\n'},
+                  {'eventId': '4', 'logStreamName': 's2', 'timestamp': 4, 'message': 'Downloading key input/f2.jpg\n'},
+                  {'eventId': '5', 'logStreamName': 's1', 'timestamp': 5, 'message': 'REPORT RequestId: reqid1\tDuration: 1 ms\n'},
+                  {'eventId': '6', 'logStreamName': 's2', 'timestamp': 6, 'message': 'REPORT RequestId: reqid2\tDuration: 2 ms\n'}]
+        cwl.client.client.filter_log_events.return_value = {'events': events}
+        self.assertEqual(cwl._get_lambda_logs(), ("START RequestId: reqid2 Version: $LATEST\n"
+                                                  "Downloading key input/f2.jpg\n"
+                                                  "REPORT RequestId: reqid2\tDuration: 2 ms\n"))
+        # The second lookup is answered by the cache
+        cwl.cloudwatch['request_id'] = 'reqid1'
+        self.assertEqual(cwl._get_lambda_logs(), ("START RequestId: reqid1 Version: $LATEST\n"
+                                                  "Downloading key input/f1.jpg\n"
+                                                  "REPORT RequestId: reqid1\tDuration: 1 ms\n"))
+        self.assertEqual(cwl.client.client.filter_log_events.call_count, 1)
+        del cwl.cloudwatch['request_id']
+        # The lookups by object key always retrieve the new events
+        cwl.cloudwatch['object_key'] = 'input/f2.jpg'
+        self.assertTrue(cwl._get_lambda_logs().startswith("START RequestId: reqid2"))
+        self.assertEqual(cwl.client.client.filter_log_events.call_count, 2)
+        self.assertEqual(cwl.client.client.filter_log_events.call_args_list[1][1]['startTime'], 0)
+        # Evict the oldest events when the size limit is exceeded
+        cwl.cloudwatch['log_cache']['max_size'] = 100
+        cwl.cloudwatch['object_key'] = 'input/f3.jpg'
+        cwl.client.client.filter_log_events.return_value = {'events': []}
+        self.assertEqual(cwl._get_lambda_logs(), "")
+        with cwl._get_log_cache() as log_cache:
+            self.assertEqual(log_cache.connection.execute('SELECT COUNT(*) FROM events').fetchone()[0], 2)
+        tmp_dir.cleanup()
+
+    @patch('boto3.Session')
+    def test_get_aws_logs_cached_evicted(self, boto_session):
+        session = MagicMock(['client'])
+        client = MagicMock(['filter_log_events'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        tmp_dir = tempfile.TemporaryDirectory()
+        cloudwatch = {'log_cache': {'enabled': True,
+                                    'max_size': 100,
+                                    'path': os.path.join(tmp_dir.name, 'logs.db')},
+                      'request_id': 'reqid1'}
+        cwl = CloudWatchLogs({'lambda': {'name': 'fname'}, 'cloudwatch': cloudwatch})
+        events = [{'eventId': '1', 'logStreamName': 's1', 'timestamp': 1, 'message': 'START RequestId: reqid1 Version: $LATEST\n'},
+                  {'eventId': '2', 'logStreamName': 's1', 'timestamp': 2, 'message': 'Downloading key input/f1.jpg\n'},
+                  {'eventId': '3', 'logStreamName': 's1', 'timestamp': 3, 'message': 'REPORT RequestId: reqid1\tDuration: 1 ms\n'},
+                  {'eventId': '4', 'logStreamName': 's1', 'timestamp': 4, 'message': 'START RequestId: reqid2 Version: $LATEST\n'},
+                  {'eventId': '5', 'logStreamName': 's1', 'timestamp': 5, 'message': 'REPORT RequestId: reqid2\tDuration: 2 ms\n'}]
+        cwl.client.client.filter_log_events.return_value = {'events': events}
+        # The events of the request are evicted right after the first retrieval,
+        # so they are looked up again without storing them
+        self.assertEqual(cwl._get_lambda_logs(), ("START RequestId: reqid1 Version: $LATEST\n"
+                                                  "Downloading key input/f1.jpg\n"
+                                                  "REPORT RequestId: reqid1\tDuration: 1 ms\n"))
+        self.assertEqual(cwl.client.client.filter_log_events.call_count, 2)
+        self.assertNotIn('startTime', cwl.client.client.filter_log_events.call_args_list[1][1])
+        with cwl._get_log_cache() as log_cache:
+            self.assertEqual(log_cache.connection.execute('SELECT COUNT(*) FROM events').fetchone()[0], 2)
+            self.assertEqual(log_cache.connection.execute('SELECT last_timestamp FROM syncs').fetchone()[0], 4)
+        tmp_dir.cleanup()
+
+    @patch('boto3.Session')
+    def test_extract_request_logs(self, boto_session):
+        session = MagicMock(['client'])
+        client = MagicMock(['filter_log_events'])
+        session.client.return_value = client
+        boto_session.return_value = session
+        tmp_dir = tempfile.TemporaryDirectory()
+        cwl = CloudWatchLogs({'lambda': {'name': 'fname'}, 'cloudwatch': {}})
+        events = [{'logStreamName': 's1', 'message': 'START RequestId: reqid1 Version: $LATEST\n'},
+                  {'logStreamName': 's2', 'message': 'START RequestId: reqid2 Version: $LATEST\n'},
+                  {'logStreamName': 's1', 'message': 'msg1\n'},
+                  {'logStreamName': 's2', 'message': 'msg2\n'},
+                  {'logStreamName': 's1', 'message': 'REPORT RequestId: reqid1\tDuration: 1 ms\n'},
+                  {'logStreamName': 's1', 'message': 'START RequestId: reqid3 Version: $LATEST\n'},
+                  {'logStreamName': 's1', 'message': 'msg3\n'},
+                  {'logStreamName': 's2', 'message': 'REPORT RequestId: reqid2\tDuration: 2 ms\n'},
+                  {'logStreamName': 's1', 'message': 'REPORT RequestId: reqid3\tDuration: 3 ms\n'}]
+        cwl.client.client.filter_log_events.return_value = {'events': events}
+        found = cwl.extract_request_logs(['reqid1', 'reqid3', 'reqid4'], tmp_dir.name)
+        self.assertEqual(found, {'reqid1', 'reqid3'})
+        self.assertEqual(cwl.client.client.filter_log_events.call_count, 1)
+        self.assertEqual(sorted(os.listdir(tmp_dir.name)), ['reqid1.log', 'reqid3.log'])
+        with open(os.path.join(tmp_dir.name, 'reqid3.log')) as log_file:
+            self.assertEqual(log_file.read(), ("START RequestId: reqid3 Version: $LATEST\n"
+                                               "msg3\n"
+                                               "REPORT RequestId: reqid3\tDuration: 3 ms\n"))
+
+        # The files are overwritten when the logs are extracted again
+        # and the spans of the retries of a request are kept
+        cwl.client.client.filter_log_events.return_value = {'events': events + events[:5]}
+        cwl.extract_request_logs(['reqid1'], tmp_dir.name)
+        with open(os.path.join(tmp_dir.name, 'reqid1.log')) as log_file:
+            self.assertEqual(log_file.read(), ("START RequestId: reqid1 Version: $LATEST\n"
+                                               "msg1\n"
+                                               "REPORT RequestId: reqid1\tDuration: 1 ms\n") * 2)
+        tmp_dir.cleanup()
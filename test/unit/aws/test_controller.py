@@ -19,7 +19,7 @@ import os
 import base64
 import json
 from io import StringIO
-from mock import MagicMock
+from mock import MagicMock, call
 from mock import patch
 
 sys.path.append("..")
@@ -67,9 +67,11 @@ class TestController(unittest.TestCase):
     def test_init(self, check_supervisor_version, load_tmp_config_file, lambda_cli,
                   cloud_watch_cli, api_gateway_cli, s3_cli, iam_cli):
         lcli = MagicMock(['find_function', 'create_function', 'get_access_key', 'wait_function_active',
-                          'add_invocation_permission_from_api_gateway', 'link_function_and_bucket'])
+                          'add_invocation_permission_from_api_gateway', 'link_function_and_bucket',
+                          'get_supervisor_files_id', 'warm_cache'])
         lcli.find_function.return_value = False
         lcli.create_function.return_value = {'FunctionName': 'fname', 'FunctionArn': 'arn', 'Timeout': 10, 'MemorySize': 512}
+        lcli.get_supervisor_files_id.return_value = '1.4.2/layer'
         lcli.wait_function_active.return_value = True
         lambda_cli.return_value = lcli
         cwcli = MagicMock(['create_log_group', 'get_log_group_name'])
@@ -108,6 +110,161 @@ class TestController(unittest.TestCase):
         self.assertEqual(agcli.create_api_gateway.call_count, 1)
         self.assertEqual(iamcli.get_user_name_or_id.call_count, 1)
         self.assertEqual(s3cli.create_bucket_and_folders.call_args_list[0][0][0], 'some')
+        self.assertEqual(lcli.warm_cache.call_count, 1)
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.SupervisorUtils.sync_mirror')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    def test_cache_sync(self, load_tmp_config_file, sync_mirror, iam_cli):
+        load_tmp_config_file.return_value = {"functions": {"aws": []},
+                                             "scar": {"cache_action": "sync",
+                                                      "supervisor_version": ["1.5.0"],
+                                                      "mirror_dir": "/tmp/mirror"}}
+        sync_mirror.return_value = ['1.5.0']
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        AWS("cache")
+        sys.stdout = old_stdout
+        self.assertEqual(sync_mirror.call_args_list[0][0], ('/tmp/mirror', ['1.5.0']))
+        # No AWS credentials needed
+        self.assertFalse(iam_cli.called)
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.CacheManager')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    def test_cache_ls(self, load_tmp_config_file, cache_manager, iam_cli):
+        load_tmp_config_file.return_value = {"functions": {"aws": []},
+                                             "scar": {"cache_action": "ls", "json": True,
+                                                      "cache": {"max_size": "1GB"}}}
+        cache_manager.return_value.get_entries.return_value = []
+        cache_manager.return_value.get_size.return_value = 0
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        AWS("cache")
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        self.assertEqual(json.loads(res), {'CacheEntries': [], 'TotalSize': 0, 'MaxSize': 1073741824})
+        # No AWS credentials needed
+        self.assertFalse(iam_cli.called)
+
+    @patch('scar.providers.aws.controller.CacheManager')
+    @patch('scar.providers.aws.controller.Lambda')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    @patch('scar.providers.aws.controller.SupervisorUtils.check_supervisor_version')
+    def test_cache_warm(self, check_supervisor_version, load_tmp_config_file, lambda_cli, cache_manager):
+        files_ids = {'f1': '1.5.0/supervisor.zip', 'f2': '1.5.0/supervisor.zip', 'f3': '1.5.0/supervisor-arm64.zip'}
+        lclis = {}
+
+        def _get_lambda_cli(resources_info):
+            name = resources_info.get('lambda').get('name')
+            lclis[name] = MagicMock(['get_supervisor_files_id', 'warm_cache'])
+            lclis[name].get_supervisor_files_id.return_value = files_ids[name]
+            return lclis[name]
+        lambda_cli.side_effect = _get_lambda_cli
+        load_tmp_config_file.return_value = {"functions": {"aws": [{"lambda": {"name": name,
+                                                                               "supervisor": {"version": "latest"}},
+                                                                    "iam": {"account_id": "id", "role": "role"}}
+                                                                   for name in files_ids]},
+                                             "scar": {"cache_action": "warm"}}
+        check_supervisor_version.return_value = '1.5.0'
+        cache_manager.return_value.prune.return_value = []
+        AWS("cache")
+        # The functions that share the supervisor files only download them once
+        self.assertEqual(lclis['f1'].warm_cache.call_count, 1)
+        self.assertEqual(lclis['f2'].warm_cache.call_count, 0)
+        self.assertEqual(lclis['f3'].warm_cache.call_count, 1)
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.S3')
+    @patch('scar.providers.aws.controller.Lambda')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    @patch('scar.providers.aws.controller.SupervisorUtils.check_supervisor_version')
+    def test_update(self, check_supervisor_version, load_tmp_config_file, lambda_cli, s3_cli, iam_cli):
+        lcli = MagicMock(['find_function', 'get_function_configuration', 'get_fdl_config', 'update_function',
+                          'wait_function_active', 'link_function_and_bucket'])
+        lcli.find_function.return_value = True
+        deployed_config = {'FunctionArn': 'arn', 'Environment': {'Variables': {}}}
+        lcli.get_function_configuration.return_value = deployed_config
+        lcli.get_fdl_config.return_value = {'name': 'fname',
+                                            'input': [{'storage_provider': 's3', 'path': 'old'},
+                                                      {'storage_provider': 's3', 'path': 'kept'}]}
+        lcli.update_function.return_value = ['Code', 'MemorySize']
+        lcli.wait_function_active.return_value = True
+        lambda_cli.return_value = lcli
+        s3cli = MagicMock(['create_bucket_and_folders', 'set_input_bucket_notification',
+                           'delete_bucket_notification'])
+        s3cli.create_bucket_and_folders.return_value = "new", "folder"
+        s3_cli.return_value = s3cli
+        iamcli = MagicMock(['get_user_name_or_id'])
+        iamcli.get_user_name_or_id.return_value = "username"
+        iam_cli.return_value = iamcli
+        load_tmp_config_file.return_value = {"functions": {"aws": [{"lambda": {"name": "fname",
+                                                                               "input": [{"storage_provider": "s3",
+                                                                                          "path": "kept"},
+                                                                                         {"storage_provider": "s3",
+                                                                                          "path": "new/folder"}],
+                                                                               "supervisor": {"version": "latest"}},
+                                                                    "iam": {"account_id": "id",
+                                                                            "role": "role"}}]}}
+        check_supervisor_version.return_value = '1.4.2'
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        AWS("update")
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        expected_res = "Wait function to be 'Active'\n"
+        expected_res += "Function 'Active'\n"
+        expected_res += "Function 'fname' successfully updated (Code, MemorySize).\n"
+        self.assertEqual(res, expected_res)
+        self.assertEqual(lcli.update_function.call_args_list, [call(deployed_config)])
+        # Only the notification of the removed bucket is deleted
+        self.assertEqual(s3cli.delete_bucket_notification.call_args_list, [call('old', '')])
+        # Only the new bucket is created and linked
+        self.assertEqual(s3cli.create_bucket_and_folders.call_args_list, [call('new/folder')])
+        self.assertEqual(lcli.link_function_and_bucket.call_args_list, [call('new')])
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.Batch')
+    @patch('scar.providers.aws.controller.S3')
+    @patch('scar.providers.aws.controller.Lambda')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    @patch('scar.providers.aws.controller.SupervisorUtils.check_supervisor_version')
+    def test_update_batch(self, check_supervisor_version, load_tmp_config_file, lambda_cli, s3_cli, batch_cli,
+                          iam_cli):
+        lcli = MagicMock(['find_function', 'get_function_configuration', 'get_fdl_config', 'update_function'])
+        lcli.find_function.return_value = True
+        lcli.get_function_configuration.return_value = {'FunctionArn': 'arn',
+                                                        'Environment': {'Variables': {'API_GATEWAY_ID': 'apiid'}}}
+        lcli.update_function.return_value = ['Code']
+        lambda_cli.return_value = lcli
+        batch_cli.return_value.update_job_definition.return_value = True
+        iam_cli.return_value.get_user_name_or_id.return_value = "username"
+        load_tmp_config_file.return_value = {"functions": {"aws": [{"lambda": {"name": "fname",
+                                                                               "execution_mode": "batch",
+                                                                               "supervisor": {"version": "latest"}},
+                                                                    "api_gateway": {"name": "api"},
+                                                                    "iam": {"account_id": "id",
+                                                                            "role": "role"}}]}}
+        check_supervisor_version.return_value = '1.4.2'
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        # The execution mode can't be updated
+        lcli.get_fdl_config.return_value = {'name': 'fname', 'execution_mode': 'lambda'}
+        with self.assertRaises(SystemExit):
+            AWS("update")
+        self.assertEqual(lcli.update_function.call_count, 0)
+        self.assertIn("The values 'execution_mode' of the function 'fname' can't be updated.", sys.stdout.getvalue())
+
+        # The job definition uses the new function definition
+        sys.stdout = StringIO()
+        lcli.get_fdl_config.return_value = {'name': 'fname', 'execution_mode': 'batch'}
+        AWS("update")
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        self.assertEqual(batch_cli.return_value.update_job_definition.call_count, 1)
+        self.assertEqual(res, "Function 'fname' successfully updated (Code, JobDefinition).\n")
 
     @patch('scar.providers.aws.controller.IAM')
     @patch('scar.providers.aws.controller.Lambda')
@@ -338,3 +495,99 @@ NAME      MEMORY    TIME  IMAGE_ID    API_URL
 ------  --------  ------  ----------  ---------------------------------------------------------  --------------------
 fname       1024     300  image       https://aid.execute-api.region.amazonaws.com/stage/launch  latest\n"""
         self.assertEqual(res, expected_res)
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.CloudWatchLogs')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    def test_stats(self, load_tmp_config_file, cloud_watch_cli, iam_cli):
+        load_tmp_config_file.return_value = {"functions": {"aws": [{"lambda": {"name": "fname",
+                                                                               "supervisor": {"version": "latest"}},
+                                                                    "iam": {"account_id": "id",
+                                                                            "role": "role"}}]},
+                                             "scar": {"json": True, "since": "2h"}}
+        iamcli = MagicMock(['get_user_name_or_id'])
+        iamcli.get_user_name_or_id.return_value = "username"
+        iam_cli.return_value = iamcli
+        cwcli = MagicMock(['get_report_messages'])
+        cwcli.get_report_messages.return_value = [
+            ("REPORT RequestId: r1\tDuration: 1000.00 ms\tBilled Duration: 1000 ms\tMemory Size: 1024 MB\t"
+             "Max Memory Used: 100 MB\tInit Duration: 200.50 ms\t\n"),
+            ("REPORT RequestId: r2\tDuration: 500.00 ms\tBilled Duration: 500 ms\tMemory Size: 1024 MB\t"
+             "Max Memory Used: 120 MB\t\n"),
+            "START RequestId: r3 Version: $LATEST\n"]
+        cloud_watch_cli.return_value = cwcli
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        AWS("stats")
+        res = json.loads(sys.stdout.getvalue())
+        sys.stdout = old_stdout
+        self.assertEqual(res, {'Stats': [{'FunctionName': 'fname',
+                                          'Invocations': 2,
+                                          'ColdStarts': 1,
+                                          'ColdStartRate': 0.5,
+                                          'Duration': {'p50': 500.0, 'p90': 1000.0, 'p99': 1000.0, 'max': 1000.0},
+                                          'MaxMemoryUsed': {'p50': 100.0, 'p99': 120.0, 'max': 120.0},
+                                          'MemorySize': [1024],
+                                          'BilledGBSeconds': 1.5}]})
+
+    @patch('scar.providers.aws.controller.IAM')
+    @patch('scar.providers.aws.controller.Lambda')
+    @patch('scar.providers.aws.controller.CloudWatchLogs')
+    @patch('scar.providers.aws.controller.FileUtils.load_tmp_config_file')
+    def test_tune(self, load_tmp_config_file, cloud_watch_cli, lambda_cli, iam_cli):
+        load_tmp_config_file.return_value = {"functions": {"aws": [{"lambda": {"name": "fname",
+                                                                               "container": {"timeout_threshold": 10},
+                                                                               "supervisor": {"version": "latest"}},
+                                                                    "iam": {"account_id": "id",
+                                                                            "role": "role"}}]},
+                                             "scar": {"json": True, "apply": True}}
+        iamcli = MagicMock(['get_user_name_or_id'])
+        iamcli.get_user_name_or_id.return_value = "username"
+        iam_cli.return_value = iamcli
+        lambdacli = MagicMock(['get_function_configuration', 'update_function_configuration'])
+        lambdacli.get_function_configuration.return_value = {"MemorySize": 1024, "Timeout": 300}
+        lambda_cli.return_value = lambdacli
+        cwcli = MagicMock(['get_report_messages'])
+        reports = [
+            ("REPORT RequestId: r1\tDuration: 4000.00 ms\tBilled Duration: 4000 ms\tMemory Size: 1024 MB\t"
+             "Max Memory Used: 100 MB\t\n"),
+            ("REPORT RequestId: r2\tDuration: 500.00 ms\tBilled Duration: 500 ms\tMemory Size: 1024 MB\t"
+             "Max Memory Used: 220 MB\t\n"),
+            # Invocation with other memory size
+            ("REPORT RequestId: r3\tDuration: 90000.00 ms\tBilled Duration: 90000 ms\tMemory Size: 128 MB\t"
+             "Max Memory Used: 128 MB\t\n")]
+        cwcli.get_report_messages.return_value = reports
+        cloud_watch_cli.return_value = cwcli
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        AWS("tune")
+        res = json.loads(sys.stdout.getvalue())
+        # Not enough invocations to apply the recommendation
+        self.assertEqual(res, {'Recommendations': [{'FunctionName': 'fname',
+                                                    'Invocations': 2,
+                                                    'CurrentMemory': 1024,
+                                                    'RecommendedMemory': 320,
+                                                    'CurrentTimeout': 300,
+                                                    'RecommendedTimeout': 16,
+                                                    'Applied': False,
+                                                    'Notice': ('Only 2 invocations with 1024 MB found, at least 20 '
+                                                               'are needed to apply the recommendation.')}]})
+        self.assertEqual(lambdacli.update_function_configuration.call_count, 0)
+
+        sys.stdout = StringIO()
+        cwcli.get_report_messages.return_value = reports + reports[1:2] * 18
+        AWS("tune")
+        res = json.loads(sys.stdout.getvalue())
+        sys.stdout = old_stdout
+        self.assertEqual(res, {'Recommendations': [{'FunctionName': 'fname',
+                                                    'Invocations': 20,
+                                                    'CurrentMemory': 1024,
+                                                    'RecommendedMemory': 320,
+                                                    'CurrentTimeout': 300,
+                                                    'RecommendedTimeout': 16,
+                                                    'Applied': True,
+                                                    'Notice': ''}]})
+        self.assertEqual(lambdacli.update_function_configuration.call_args_list[0][1],
+                         {'MemorySize': 320, 'Timeout': 16})
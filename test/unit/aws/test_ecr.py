@@ -80,3 +80,12 @@ class TestECR(unittest.TestCase):
         ecr = ECR({})
         ecr.delete_repository('repo_name')
         self.assertEqual(ecr.client.client.delete_repository.call_args_list[0], call(repositoryName='repo_name', force=True))
+
+    @patch('boto3.Session')
+    def test_exists_image_tag(self, boto_session):
+        boto_session.return_value = self._init_mocks(['describe_images'])
+        ecr = ECR({})
+        ecr.client.client.describe_images.return_value = {'imageDetails': [{'imageTags': ['tag']}]}
+        self.assertTrue(ecr.exists_image_tag('repo_name', 'tag'))
+        self.assertEqual(ecr.client.client.describe_images.call_args_list[0],
+                         call(repositoryName='repo_name', imageIds=[{'imageTag': 'tag'}]))
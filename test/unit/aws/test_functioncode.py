@@ -0,0 +1,209 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from zipfile import ZipFile
+from mock import patch
+
+sys.path.append("..")
+sys.path.append(".")
+sys.path.append("../..")
+
+from scar.providers.aws.functioncode import FunctionPackager
+
+
+class TestFunctionPackager(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    @staticmethod
+    def _get_resources_info(name, init_script):
+        return {'lambda': {'name': name,
+                           'init_script': init_script,
+                           'environment': {'Variables': {}},
+                           'deployment': {'max_payload_size': 52428800},
+                           'container': {'image': 'some/image:tag',
+                                         'image_file': 'some.tgz',
+                                         'environment': {'Variables': {}}}}}
+
+    @patch('scar.providers.aws.udocker.Udocker.prepare_udocker_image')
+    @patch('scar.providers.aws.functioncode.FileUtils.load_tmp_config_file')
+    def test_create_zip_cached(self, load_tmp_config_file, prepare_udocker_image):
+        load_tmp_config_file.return_value = {}
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        init_script = os.path.join(tmp_dir.name, 'script.sh')
+        with open(init_script, 'w') as script:
+            script.write('echo hello')
+
+        def _load_image():
+            packager.resources_info['lambda']['container']['image'] = 'loaded/image'
+            packager.resources_info['lambda']['environment']['Variables']['UDOCKER_REPOS'] = '/var/task/udocker/repos/'
+        prepare_udocker_image.side_effect = _load_image
+
+        with patch('scar.providers.aws.functioncode._PACKAGE_CACHE_DIR', os.path.join(tmp_dir.name, 'cache')):
+            packager = FunctionPackager(self._get_resources_info('fname1', init_script), supervisor_zip_path)
+            packager.create_zip(os.path.join(tmp_dir.name, 'fname1.zip'))
+            resources_info = self._get_resources_info('fname2', init_script)
+            packager2 = FunctionPackager(resources_info, supervisor_zip_path)
+            packager2.create_zip(os.path.join(tmp_dir.name, 'fname2.zip'))
+
+        # The base package is only built once
+        self.assertEqual(prepare_udocker_image.call_count, 1)
+        self.assertEqual(resources_info['lambda']['container']['image'], 'loaded/image')
+        self.assertEqual(resources_info['lambda']['environment']['Variables'],
+                         {'UDOCKER_REPOS': '/var/task/udocker/repos/'})
+        with ZipFile(os.path.join(tmp_dir.name, 'fname2.zip')) as thezip:
+            self.assertEqual(sorted(thezip.namelist()), ['function_config.yaml', 'script.sh',
+                                                         'udocker/', 'udocker/udocker.py'])
+            self.assertIn(b'name: fname2', thezip.read('function_config.yaml'))
+        tmp_dir.cleanup()
+
+    @patch('scar.providers.aws.udocker.Udocker.prepare_udocker_image')
+    @patch('scar.providers.aws.functioncode.FileUtils.load_tmp_config_file')
+    def test_create_zip_cached_concurrently(self, load_tmp_config_file, prepare_udocker_image):
+        load_tmp_config_file.return_value = {}
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        prepare_udocker_image.side_effect = lambda: time.sleep(0.2)
+
+        def _create_zip(name):
+            FunctionPackager(self._get_resources_info(name, None),
+                             supervisor_zip_path).create_zip(os.path.join(tmp_dir.name, f'{name}.zip'))
+        cache_dir = os.path.join(tmp_dir.name, 'cache')
+        with patch('scar.providers.aws.functioncode._PACKAGE_CACHE_DIR', cache_dir):
+            threads = [threading.Thread(target=_create_zip, args=(f'fname{index}',)) for index in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # The functions that share the package wait for the first one
+        self.assertEqual(prepare_udocker_image.call_count, 1)
+        package_hash = [name for name in os.listdir(cache_dir) if not name.endswith('.lock')][0]
+        self.assertEqual(sorted(os.listdir(os.path.join(cache_dir, package_hash))), ['metadata.json', 'package.zip'])
+        for index in range(3):
+            with ZipFile(os.path.join(tmp_dir.name, f'fname{index}.zip')) as thezip:
+                self.assertIsNone(thezip.testzip())
+        tmp_dir.cleanup()
+
+    @patch('scar.providers.aws.functioncode.FileUtils.load_tmp_config_file')
+    def test_create_zip_extra_payload(self, load_tmp_config_file):
+        load_tmp_config_file.return_value = {}
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        init_script = os.path.join(tmp_dir.name, 'script.sh')
+        with open(init_script, 'w') as script:
+            script.write('echo hello')
+        payload = os.path.join(tmp_dir.name, 'payload')
+        os.makedirs(os.path.join(payload, 'model'))
+        with open(os.path.join(payload, 'model', 'weights.bin'), 'wb') as weights:
+            weights.write(b'0' * 1000)
+        resources_info = self._get_resources_info('fname', init_script)
+        resources_info['lambda']['container']['image_file'] = None
+        resources_info['lambda']['extra_payload'] = payload
+        resources_info['lambda']['deployment']['package_cache'] = False
+
+        packager = FunctionPackager(resources_info, supervisor_zip_path)
+        packager.create_zip(os.path.join(tmp_dir.name, 'fname.zip'))
+
+        # The extra payload is zipped from its path without copying it
+        self.assertEqual(os.listdir(packager.tmp_payload_folder.name), [])
+        with ZipFile(os.path.join(tmp_dir.name, 'fname.zip')) as thezip:
+            self.assertEqual(sorted(thezip.namelist()), ['function_config.yaml', 'model/', 'model/weights.bin',
+                                                         'script.sh'])
+            self.assertEqual(packager.code_size, sum(zinfo.file_size for zinfo in thezip.infolist()))
+        tmp_dir.cleanup()
+
+    @patch('scar.providers.aws.udocker.Udocker.prepare_udocker_image')
+    def test_create_zip_estimated_size(self, prepare_udocker_image):
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        init_script = os.path.join(tmp_dir.name, 'script.sh')
+        with open(init_script, 'w') as script:
+            script.write('echo hello')
+        payload = os.path.join(tmp_dir.name, 'payload')
+        os.makedirs(payload)
+        with open(os.path.join(payload, 'weights.bin'), 'wb') as weights:
+            weights.write(b'0' * 2000)
+        resources_info = self._get_resources_info('fname', init_script)
+        resources_info['lambda']['extra_payload'] = payload
+        resources_info['lambda']['deployment']['max_payload_size'] = 1000
+
+        packager = FunctionPackager(resources_info, supervisor_zip_path)
+        contributors = packager.estimate_size()
+        self.assertEqual([contributor[0] for contributor in contributors],
+                         ['udocker', 'extra payload', 'init script'])
+        self.assertEqual(contributors[1][1], 2000)
+        self.assertLess(contributors[1][2], 100)
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        with self.assertRaises(SystemExit):
+            packager.create_zip(os.path.join(tmp_dir.name, 'fname.zip'))
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        # The package is not built
+        self.assertEqual(prepare_udocker_image.call_count, 0)
+        self.assertIn("extra payload", res)
+        self.assertIn("Payload size greater than 50MB.", res)
+        tmp_dir.cleanup()
+
+    @patch('scar.providers.aws.functioncode.FileUtils.load_tmp_config_file')
+    def test_create_zip_payload_layers(self, load_tmp_config_file):
+        load_tmp_config_file.return_value = {}
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        init_script = os.path.join(tmp_dir.name, 'script.sh')
+        with open(init_script, 'w') as script:
+            script.write('echo hello')
+        payload = os.path.join(tmp_dir.name, 'payload')
+        os.makedirs(os.path.join(payload, 'model'))
+        with open(os.path.join(payload, 'model', 'weights.bin'), 'wb') as weights:
+            weights.write(b'0' * 1000)
+
+        content_layers = []
+        with patch('scar.providers.aws.functioncode._PACKAGE_CACHE_DIR', os.path.join(tmp_dir.name, 'cache')):
+            for name in ('fname1', 'fname2'):
+                resources_info = self._get_resources_info(name, init_script)
+                resources_info['lambda']['container']['image_file'] = None
+                resources_info['lambda']['extra_payload'] = payload
+                resources_info['lambda']['deployment']['payload_layers'] = True
+                resources_info['lambda']['deployment']['payload_layer_min_size'] = 500
+                packager = FunctionPackager(resources_info, supervisor_zip_path)
+                packager.create_zip(os.path.join(tmp_dir.name, f'{name}.zip'))
+                content_layers.append(packager.content_layers)
+                with ZipFile(packager.content_layers[0][1]) as layer_zip:
+                    self.assertEqual(layer_zip.namelist(), ['model/', 'model/weights.bin'])
+
+        # The layer is named by its content and reused from the cached package
+        self.assertEqual(len(content_layers[0]), 1)
+        self.assertTrue(content_layers[0][0][0].startswith('scar-payload-'))
+        self.assertEqual(content_layers[0][0][0], content_layers[1][0][0])
+        with ZipFile(os.path.join(tmp_dir.name, 'fname2.zip')) as thezip:
+            self.assertEqual(sorted(thezip.namelist()), ['function_config.yaml', 'script.sh'])
+        tmp_dir.cleanup()
@@ -16,7 +16,9 @@
 import unittest
 import sys
 import os
+import shutil
 import tempfile
+from copy import deepcopy
 from mock import MagicMock
 from mock import patch
 
@@ -26,6 +28,8 @@ sys.path.append("../..")
 
 from scar.utils import StrUtils
 from scar.providers.aws.lambdafunction import Lambda
+from scar.providers.aws.lambdalayers import LambdaLayers
+from scar.providers.aws.containerimage import ContainerImage
 
 
 class TestLambda(unittest.TestCase):
@@ -78,20 +82,27 @@ class TestLambda(unittest.TestCase):
     def test_create_function(self, load_tmp_config_file, prepare_udocker_image,
                              download_supervisor, boto_session):
         session, lam, _ = self._init_mocks(['list_layers', 'publish_layer_version', 'get_bucket_location', 'put_object',
-                                            'create_function', 'list_layer_versions'])
+                                            'create_function', 'list_layer_versions', 'head_object',
+                                            'get_layer_version'])
         boto_session.return_value = session
 
         load_tmp_config_file.return_value = {}
 
         tests_path = os.path.dirname(os.path.abspath(__file__))
-        download_supervisor.return_value = os.path.join(tests_path, "../../files/supervisor.zip")
+        # The layer zip is cached along with the supervisor zip
+        tmp_dir = tempfile.TemporaryDirectory()
+        supervisor_zip_path = os.path.join(tmp_dir.name, "supervisor.zip")
+        shutil.copy(os.path.join(tests_path, "../../files/supervisor.zip"), supervisor_zip_path)
+        download_supervisor.return_value = supervisor_zip_path
 
         lam.client.client.list_layers.return_value = {'Layers': [{'LayerName': 'layername'}]}
         lam.client.client.publish_layer_version.return_value = {'LayerVersionArn': '1'}
         lam.client.client.create_function.return_value = {'FunctionArn': 'farn'}
         lam.client.client.list_layer_versions.return_value = {'LayerVersions': []}
 
-        lam.create_function()
+        layer_arns_path = os.path.join(tmp_dir.name, "layers", "supervisor-layer-arns.json")
+        with patch('scar.providers.aws.lambdalayers._LAYER_ARNS_CACHE_PATH', layer_arns_path):
+            lam.create_function()
 
         fdl = {"storage_providers": {},
                "name": "fname",
@@ -124,7 +135,23 @@ class TestLambda(unittest.TestCase):
 
         self.assertEqual(lam.client.client.publish_layer_version.call_args_list[0][1]['LayerName'], "layername")
         self.assertEqual(lam.client.client.publish_layer_version.call_args_list[0][1]['Description'], "1.4.2")
-        self.assertEqual(len(lam.client.client.publish_layer_version.call_args_list[0][1]['Content']['ZipFile']), 99662)
+        self.assertEqual(len(lam.client.client.publish_layer_version.call_args_list[0][1]['Content']['ZipFile']), 98059)
+        self.assertTrue(os.path.isfile(os.path.join(tmp_dir.name, "faas-supervisor-layer.zip")))
+        # Other regions and architectures use the cached layer zip
+        arm_resources_info = deepcopy(lam.resources_info)
+        arm_resources_info['lambda']['architectures'] = ['arm64']
+        with patch('scar.providers.aws.lambdalayers.ZipBuilder') as zip_builder:
+            LambdaLayers(arm_resources_info, lam.client, supervisor_zip_path).get_layer_zip_path()
+            self.assertFalse(zip_builder.called)
+        # The next functions validate the ARN of the local map instead of listing the layer versions
+        lam.client.client.get_layer_version.return_value = {'Description': '1.4.2'}
+        with patch('scar.providers.aws.lambdalayers._LAYER_ARNS_CACHE_PATH', layer_arns_path):
+            layers = LambdaLayers(lam.resources_info, lam.client, supervisor_zip_path)
+            self.assertEqual(layers.get_supervisor_layer_arn(), '1')
+        self.assertEqual(lam.client.client.get_layer_version.call_args_list[0][1],
+                         {'LayerName': 'layername', 'VersionNumber': 1})
+        self.assertEqual(lam.client.client.list_layer_versions.call_count, 1)
+        tmp_dir.cleanup()
 
     @patch('boto3.Session')
     @patch('scar.providers.aws.launchtemplates.SupervisorUtils.download_supervisor_asset')
@@ -133,7 +160,7 @@ class TestLambda(unittest.TestCase):
     @patch('docker.from_env')
     def test_create_function_image(self, from_env, unzip_folder, load_tmp_config_file,
                                    download_supervisor_asset, boto_session):
-        session, lam, client = self._init_mocks(['create_function', 'create_repository',
+        session, lam, client = self._init_mocks(['create_function', 'create_repository', 'describe_images',
                                                  'describe_registry', 'get_authorization_token'])
         boto_session.return_value = session
 
@@ -143,10 +170,14 @@ class TestLambda(unittest.TestCase):
         download_supervisor_asset.return_value = os.path.join(tests_path, "../../files/supervisor.zip")
 
         docker = MagicMock(['login', 'images'])
-        docker.images = MagicMock(['build', 'push'])
+        docker.images = MagicMock(['build', 'push', 'get_registry_data'])
+        docker.images.get_registry_data.return_value.id = 'sha256:base'
+        image = MagicMock(['tag'])
+        docker.images.build.return_value = (image, [])
         from_env.return_value = docker
 
         client.create_repository.return_value = {"repository": {"repositoryUri": "repouri"}}
+        client.describe_images.return_value = {'imageDetails': []}
         client.describe_registry.return_value = {'registryId': 'regid'}
         client.get_authorization_token.return_value = {'authorizationData': [{'authorizationToken': 'QVdTOnRva2Vu'}]}
 
@@ -156,7 +187,10 @@ class TestLambda(unittest.TestCase):
                                                'SecurityGroupIds': ['sg']}
         lam.resources_info['lambda']['file_system'] = [{'Arn': 'efsaparn', '': '/mnt'}]
 
+        resources_info = deepcopy(lam.resources_info)
         lam.create_function()
+        image_uri = docker.images.build.call_args_list[0][1]['tag']
+        self.assertTrue(image_uri.startswith('repouri:scar-'))
         fdl = {"storage_providers": {},
                "name": "fname",
                "runtime": "image",
@@ -168,15 +202,15 @@ class TestLambda(unittest.TestCase):
                "handler": "some.handler",
                "description": "desc",
                "deployment": {"bucket": "someb", "max_s3_payload_size": 262144000},
-               "environment": {"Variables": {"IMAGE_ID": "repouri:latest"}},
-               "container": {"image": "repouri:latest", "image_file": "some.tgz", "environment": {"Variables": {}}},
+               "environment": {"Variables": {"IMAGE_ID": image_uri}},
+               "container": {"image": image_uri, "image_file": "some.tgz", "environment": {"Variables": {}}},
                "supervisor": {"version": "1.5.0", "layer_name": "layername"},
                "vpc": {"SubnetIds": ["subnet"], "SecurityGroupIds": ["sg"]},
                "file_system": [{'Arn': 'efsaparn', '': '/mnt'}],
                "ecr": {"delete_image": True}}
         res = {'FunctionName': 'fname',
                'Role': 'iamrole',
-               'Environment': {'Variables': {'IMAGE_ID': 'repouri:latest',
+               'Environment': {'Variables': {'IMAGE_ID': image_uri,
                                              'FDL': StrUtils.dict_to_base64_string(fdl)}},
                'Description': 'desc',
                'Timeout': 300,
@@ -187,10 +221,50 @@ class TestLambda(unittest.TestCase):
                'VpcConfig': {'SubnetIds': ['subnet'],
                              'SecurityGroupIds': ['sg']},
                'FileSystemConfigs': [{'Arn': 'efsaparn', '': '/mnt'}],
-               'Code': {'ImageUri': 'repouri:latest'}}
+               'Code': {'ImageUri': image_uri}}
         self.assertEqual(lam.client.client.create_function.call_args_list[0][1], res)
-        self.assertEqual(docker.images.push.call_args_list[0][0][0], "repouri")
-        self.assertEqual(docker.images.build.call_args_list[0][1]['tag'], "repouri")
+        self.assertEqual(client.describe_images.call_args_list[0][1],
+                         {'repositoryName': 'fname', 'imageIds': [{'imageTag': image_uri.split(':')[1]}]})
+        self.assertEqual(image.tag.call_args_list[0][0], ('repouri', 'latest'))
+        self.assertEqual([push[1]['tag'] for push in docker.images.push.call_args_list],
+                         [image_uri.split(':')[1], 'latest'])
+
+        # Same context: the image already pushed is reused
+        client.describe_images.return_value = {'imageDetails': [{'imageTags': [image_uri.split(':')[1]]}]}
+        self.assertEqual(ContainerImage.create_ecr_image(resources_info, '1.5.0'), image_uri)
+        self.assertEqual(docker.images.build.call_count, 1)
+        self.assertEqual(docker.images.push.call_count, 2)
+
+    @patch('boto3.Session')
+    @patch('time.sleep')
+    @patch('scar.providers.aws.lambdafunction.ContainerImage.create_ecr_image')
+    @patch('scar.providers.aws.functioncode.FileUtils.load_tmp_config_file')
+    def test_update_function_image(self, load_tmp_config_file, create_ecr_image, sleep, boto_session):
+        load_tmp_config_file.return_value = {}
+        session, lam, client = self._init_mocks(['get_function', 'get_function_configuration', 'describe_images',
+                                                 'update_function_code', 'update_function_configuration'])
+        boto_session.return_value = session
+        image_uri = 'id.dkr.ecr.us-east-1.amazonaws.com/fname:scar-hash'
+        create_ecr_image.return_value = image_uri
+        lam.resources_info['lambda']['runtime'] = 'image'
+        client.get_function.return_value = {'Code': {'ImageUri': image_uri,
+                                                     'ResolvedImageUri': 'id.dkr.ecr.us-east-1.amazonaws.com/fname@sha256:1'}}
+        client.describe_images.return_value = {'imageDetails': [{'imageDigest': 'sha256:1'}]}
+
+        # The deployed image is up to date
+        self.assertNotIn('Code', lam.update_function({'FunctionArn': 'arn'}))
+        self.assertEqual(client.update_function_code.call_count, 0)
+        self.assertEqual(client.describe_images.call_args_list[0][1],
+                         {'repositoryName': 'fname', 'imageIds': [{'imageTag': 'scar-hash'}]})
+
+        # The tag was moved to a new image and the update fails
+        client.describe_images.return_value = {'imageDetails': [{'imageDigest': 'sha256:2'}]}
+        client.get_function_configuration.return_value = {'LastUpdateStatus': 'Failed'}
+        with self.assertRaises(SystemExit):
+            lam.update_function({'FunctionArn': 'arn'})
+        self.assertEqual(client.update_function_code.call_args_list[0][1],
+                         {'FunctionName': 'fname', 'ImageUri': image_uri})
+        self.assertEqual(client.update_function_configuration.call_count, 1)
 
     @patch('boto3.Session')
     def test_delete_function(self, boto_session):
@@ -286,15 +360,13 @@ class TestLambda(unittest.TestCase):
         self.assertEqual(post.call_args_list[0][1]['params'], {'key': 'value'})
 
     @patch('boto3.Session')
-    @patch('requests.get')
+    @patch('scar.providers.aws.lambdafunction.download_file')
     @patch('scar.providers.aws.lambdafunction.ZipFile')
-    def test_get_fdl_config(self, zipfile, get, boto_session):
+    def test_get_fdl_config(self, zipfile, download_file, boto_session):
         session, lam, _ = self._init_mocks(['get_function'])
         boto_session.return_value = session
 
-        response = MagicMock(['content'])
-        response.content = b"aa"
-        get.return_value = response
+        download_file.side_effect = lambda url, dep_pack: dep_pack.write(b"aa")
         lam.client.client.get_function.return_value = {'SupervisorVersion': '1.4.2',
                                                        'Code': {'Location': 'http://loc.es'}}
 
@@ -311,7 +383,7 @@ class TestLambda(unittest.TestCase):
         zfile.__enter__.return_value = thezip
 
         self.assertEqual(lam.get_fdl_config('arn'), ['item', 'item2'])
-        self.assertEqual(get.call_args_list[0][0][0], "http://loc.es")
+        self.assertEqual(download_file.call_args_list[0][0][0], "http://loc.es")
 
     @patch('boto3.Session')
     def test_get_all_functions(self, boto_session):
@@ -327,6 +399,24 @@ class TestLambda(unittest.TestCase):
         self.assertEqual(res[0]['lambda']['memory'], 1024)
         self.assertEqual(res[0]['lambda']['supervisor']['version'], '-')
 
+    @patch('boto3.Session')
+    def test_get_all_functions_supervisor_version(self, boto_session):
+        session, lam, _ = self._init_mocks(['get_function_configuration', 'get_layer_version'])
+        boto_session.return_value = session
+
+        layer_arn = 'arn:aws:lambda:us-east-1:000000000000:layer:faas-supervisor:7'
+        lam.client.client.get_function_configuration.return_value = {'FunctionName': 'fname',
+                                                                     'FunctionArn': 'arn1',
+                                                                     'Timeout': 600,
+                                                                     'MemorySize': 1024,
+                                                                     'Layers': [{'Arn': layer_arn}]}
+        lam.client.client.get_layer_version.return_value = {'Description': '1.5.0'}
+
+        res = lam.get_all_functions(['arn1', 'arn2', 'arn3'])
+        self.assertEqual([func['lambda']['supervisor']['version'] for func in res], ['1.5.0'] * 3)
+        # The functions share the layer version
+        self.assertEqual(lam.client.client.get_layer_version.call_count, 1)
+
     @patch('boto3.Session')
     @patch('time.sleep')
     def test_wait_function_active(self, sleep, boto_session):
@@ -17,7 +17,11 @@ import unittest
 import sys
 import tempfile
 import os
+import hashlib
 import os.path
+import threading
+import time
+from copy import deepcopy
 from mock import MagicMock
 from mock import patch, call
 from botocore.exceptions import ClientError
@@ -67,6 +71,25 @@ class TestS3(unittest.TestCase):
         self.assertEqual(s3.client.client.put_object.call_args_list[0],
                          call(Bucket='bname', Key=os.path.basename(tmpfile.name), Body=b'Hello world!'))
 
+    @patch('boto3.Session')
+    def test_upload_file_if_changed(self, boto_session):
+        session = self._init_mocks(['put_object', 'head_object'])
+        boto_session.return_value = session
+        tmp_file = tempfile.NamedTemporaryFile(delete=False)
+        tmp_file.write(b'package')
+        tmp_file.close()
+        file_hash = hashlib.sha256(b'package').hexdigest()
+        s3 = S3({'lambda': {'name': 'fname'}})
+        session.client.return_value.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'head_object')
+        self.assertTrue(s3.upload_file_if_changed('bucket', tmp_file.name, 'lambda/fname.zip'))
+        self.assertEqual(session.client.return_value.put_object.call_args_list[0][1]['Metadata'],
+                         {'sha256': file_hash})
+        session.client.return_value.head_object.side_effect = None
+        session.client.return_value.head_object.return_value = {'Metadata': {'sha256': file_hash}}
+        self.assertFalse(s3.upload_file_if_changed('bucket', tmp_file.name, 'lambda/fname.zip'))
+        self.assertEqual(session.client.return_value.put_object.call_count, 1)
+        os.unlink(tmp_file.name)
+
     @patch('boto3.Session')
     def test_get_bucket_file_list(self, boto_session):
         boto_session.return_value = self._init_mocks(['get_bucket_location', 'list_objects_v2'])
@@ -100,6 +123,65 @@ class TestS3(unittest.TestCase):
         expected_res = call(Bucket='bucket', NotificationConfiguration={'LambdaFunctionConfigurations': []})
         self.assertEqual(s3.client.client.put_bucket_notification_configuration.call_args_list[0], expected_res)
 
+    @patch('boto3.Session')
+    def test_delete_bucket_notification_folders(self, boto_session):
+        boto_session.return_value = self._init_mocks(['put_bucket_notification_configuration',
+                                                      'get_bucket_notification_configuration'])
+        s3 = S3({'lambda': {'arn': 'arn'}})
+        kept_conf = {'LambdaFunctionArn': 'arn', 'Events': ['s3:ObjectCreated:*'],
+                     'Filter': {'Key': {'FilterRules': [{'Name': 'Prefix', 'Value': 'kept/'}]}}}
+        other_conf = {'LambdaFunctionArn': 'other', 'Events': ['s3:ObjectCreated:*'],
+                      'Filter': {'Key': {'FilterRules': [{'Name': 'Prefix', 'Value': 'removed/'}]}}}
+        removed_conf = {'LambdaFunctionArn': 'arn', 'Events': ['s3:ObjectCreated:*'],
+                        'Filter': {'Key': {'FilterRules': [{'Name': 'Prefix', 'Value': 'removed/'}]}}}
+        s3.client.client.get_bucket_notification_configuration.return_value = {
+            'LambdaFunctionConfigurations': [kept_conf, other_conf, removed_conf]}
+        s3.client.client.put_bucket_notification_configuration.return_value = {}
+        s3.delete_bucket_notification('bucket', 'removed')
+        # Only the notification of the function in the folder is deleted
+        expected_res = call(Bucket='bucket', NotificationConfiguration={'LambdaFunctionConfigurations': [kept_conf,
+                                                                                                         other_conf]})
+        self.assertEqual(s3.client.client.put_bucket_notification_configuration.call_args_list[0], expected_res)
+
+    @patch('boto3.Session')
+    def test_shared_bucket(self, boto_session):
+        boto_session.return_value = self._init_mocks(['get_bucket_location', 'create_bucket',
+                                                      'put_bucket_notification_configuration',
+                                                      'get_bucket_notification_configuration'])
+        client = boto_session.return_value.client.return_value
+        buckets = {}
+
+        def _get_bucket_location(Bucket):
+            if Bucket not in buckets:
+                raise ClientError({'Error': {'Code': 'NoSuchBucket'}}, 'get_bucket_location')
+            return {}
+
+        def _create_bucket(ACL, Bucket):
+            time.sleep(0.1)
+            buckets[Bucket] = {}
+
+        def _put_notification(Bucket, NotificationConfiguration):
+            time.sleep(0.1)
+            buckets[Bucket] = deepcopy(NotificationConfiguration)
+        client.get_bucket_location.side_effect = _get_bucket_location
+        client.create_bucket.side_effect = _create_bucket
+        client.get_bucket_notification_configuration.side_effect = lambda Bucket: deepcopy(buckets[Bucket])
+        client.put_bucket_notification_configuration.side_effect = _put_notification
+
+        def _link_function(arn):
+            s3 = S3({'lambda': {'arn': arn}})
+            s3.create_bucket('bucket')
+            s3.set_input_bucket_notification('bucket', arn)
+        # Two functions with the same input bucket are created concurrently
+        threads = [threading.Thread(target=_link_function, args=(arn,)) for arn in ('arn1', 'arn2')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(client.create_bucket.call_count, 1)
+        self.assertEqual(sorted(conf['LambdaFunctionArn'] for conf in buckets['bucket']['LambdaFunctionConfigurations']),
+                         ['arn1', 'arn2'])
+
     @patch('boto3.Session')
     def test_create_bucket_and_folders(self, boto_session):
         boto_session.return_value = self._init_mocks(['get_bucket_location', 'create_bucket', 'put_object', 'get_object'])
@@ -0,0 +1,92 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import os
+import tempfile
+import threading
+from mock import patch
+
+sys.path.append("..")
+sys.path.append(".")
+sys.path.append("../..")
+
+from scar.providers.aws.udocker import Udocker
+from scar.utils import FileUtils
+
+
+class TestUdocker(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    @staticmethod
+    def _get_resources_info(image_file):
+        return {'lambda': {'name': 'fname',
+                           'environment': {'Variables': {}},
+                           'deployment': {},
+                           'container': {'image_file': image_file}}}
+
+    @patch('scar.providers.aws.udocker.SysUtils.execute_command_with_msg')
+    def test_prepare_udocker_image_cached(self, execute_command_with_msg):
+        tests_path = os.path.dirname(os.path.abspath(__file__))
+        supervisor_zip_path = os.path.join(tests_path, "../../files/supervisor.zip")
+        tmp_dir = tempfile.TemporaryDirectory()
+        image_file = os.path.join(tmp_dir.name, 'image.tar.gz')
+        with open(image_file, 'wb') as image:
+            image.write(b'image')
+
+        def _load(*args, **kwargs):
+            # Simulate the layout created by 'udocker load'
+            udocker_dir = os.environ['UDOCKER_DIR']
+            os.makedirs(os.path.join(udocker_dir, 'layers'))
+            os.makedirs(os.path.join(udocker_dir, 'repos', 'some', 'image', 'tag'))
+            with open(os.path.join(udocker_dir, 'layers', 'sha256:1.layer'), 'w') as layer:
+                layer.write('layer')
+            os.symlink('../../../../layers/sha256:1.layer',
+                       os.path.join(udocker_dir, 'repos', 'some', 'image', 'tag', 'sha256:1.layer'))
+            return 'Info: loading\nsome/image:tag'
+        execute_command_with_msg.side_effect = _load
+
+        # Files of an interrupted caching
+        os.makedirs(os.path.join(tmp_dir.name, 'cache', 'images', FileUtils.get_path_hash(image_file), 'repos'))
+
+        def _prepare_udocker_image(payload_folder):
+            resources_info = self._get_resources_info(image_file)
+            Udocker(resources_info, payload_folder.name, supervisor_zip_path).prepare_udocker_image()
+            self.assertEqual(resources_info['lambda']['container']['image'], 'some/image:tag')
+
+        payload_folders = [tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()]
+        with patch('scar.providers.aws.udocker._UDOCKER_CACHE_DIR', os.path.join(tmp_dir.name, 'cache')):
+            # The functions that share the image file are prepared concurrently
+            threads = [threading.Thread(target=_prepare_udocker_image, args=(payload_folder,))
+                       for payload_folder in payload_folders]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # The image is only loaded once
+        self.assertEqual(execute_command_with_msg.call_count, 1)
+        link_path = os.path.join(payload_folders[0].name, 'udocker', 'repos', 'some', 'image', 'tag', 'sha256:1.layer')
+        self.assertTrue(os.path.islink(link_path))
+        for payload_folder in payload_folders:
+            with open(link_path.replace(payload_folders[0].name, payload_folder.name)) as layer:
+                self.assertEqual(layer.read(), 'layer')
+        self.assertEqual(os.listdir(os.path.join(tmp_dir.name, 'cache', 'layers')), ['sha256:1.layer'])
+        for payload_folder in payload_folders:
+            payload_folder.cleanup()
+        tmp_dir.cleanup()
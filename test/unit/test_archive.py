@@ -0,0 +1,127 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import os
+import tempfile
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+from mock import patch
+
+sys.path.append("..")
+sys.path.append(".")
+
+from scar.archive import ZipBuilder, zip_folder
+
+
+class TestArchive(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    @patch('scar.archive._CHUNK_SIZE', 1024)
+    @patch('scar.archive._PARALLEL_THRESHOLD', 4096)
+    def test_zip_folder(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        src = os.path.join(tmp_dir.name, 'src')
+        os.makedirs(os.path.join(src, 'bin'))
+        big_content = b''.join(str(i).encode() for i in range(10000))
+        with open(os.path.join(src, 'big.txt'), 'wb') as big_file:
+            big_file.write(big_content)
+        with open(os.path.join(src, 'image.tar.gz'), 'wb') as image_file:
+            image_file.write(b'compressed')
+        with open(os.path.join(src, 'bin', 'run.sh'), 'w') as script:
+            script.write('echo hello')
+        os.chmod(os.path.join(src, 'bin', 'run.sh'), 0o755)
+        os.symlink('bin/run.sh', os.path.join(src, 'run'))
+        zip_path = os.path.join(tmp_dir.name, 'package.zip')
+
+        zip_folder(zip_path, src)
+
+        with ZipFile(zip_path) as thezip:
+            self.assertIsNone(thezip.testzip())
+            self.assertEqual(thezip.namelist(), ['big.txt', 'bin/', 'image.tar.gz', 'run', 'bin/run.sh'])
+            self.assertEqual(thezip.read('big.txt'), big_content)
+            self.assertEqual(thezip.getinfo('big.txt').compress_type, ZIP_DEFLATED)
+            self.assertEqual(thezip.getinfo('image.tar.gz').compress_type, ZIP_STORED)
+            self.assertEqual(thezip.getinfo('bin/run.sh').external_attr >> 16, 0o100755)
+            self.assertEqual(thezip.getinfo('run').external_attr >> 16, 0o120777)
+            self.assertEqual(thezip.read('run'), b'bin/run.sh')
+        tmp_dir.cleanup()
+
+    @patch('scar.archive._CHUNK_SIZE', 1024)
+    @patch('scar.archive._PARALLEL_THRESHOLD', 4096)
+    def test_zip_folder_reproducible(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        src = os.path.join(tmp_dir.name, 'src')
+        os.makedirs(os.path.join(src, 'folder'))
+        with open(os.path.join(src, 'folder', 'file.txt'), 'w') as text_file:
+            text_file.write('content')
+        # Member compressed in chunks
+        with open(os.path.join(src, 'folder', 'big.txt'), 'wb') as big_file:
+            big_file.write(b''.join(str(i).encode() for i in range(10000)))
+        with patch('scar.archive.os.cpu_count', return_value=1):
+            zip_folder(os.path.join(tmp_dir.name, 'first.zip'), src)
+        # Changing the modification times or the CPUs doesn't change the zip
+        os.utime(os.path.join(src, 'folder', 'file.txt'), (0, 0))
+        os.utime(os.path.join(src, 'folder'), (0, 0))
+        with patch('scar.archive.os.cpu_count', return_value=4):
+            zip_folder(os.path.join(tmp_dir.name, 'second.zip'), src)
+        with open(os.path.join(tmp_dir.name, 'first.zip'), 'rb') as first, \
+             open(os.path.join(tmp_dir.name, 'second.zip'), 'rb') as second:
+            self.assertEqual(first.read(), second.read())
+        tmp_dir.cleanup()
+
+    @patch('scar.archive._CHUNK_SIZE', 1024)
+    @patch('scar.archive._PARALLEL_THRESHOLD', 4096)
+    def test_zip_big_file_threads(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        big_path = os.path.join(tmp_dir.name, 'big.txt')
+        with open(big_path, 'wb') as big_file:
+            big_file.write(b''.join(str(i).encode() for i in range(10000)))
+        contents = []
+        for threads in (1, 4):
+            zip_path = os.path.join(tmp_dir.name, f'package-{threads}.zip')
+            with ZipBuilder(zip_path, threads=threads) as builder:
+                builder.add_path(big_path, 'big.txt')
+            with open(zip_path, 'rb') as zip_file:
+                contents.append(zip_file.read())
+        # The zip doesn't depend on the number of threads (CPUs)
+        self.assertEqual(contents[0], contents[1])
+        tmp_dir.cleanup()
+
+    def test_copy_member(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        src_path = os.path.join(tmp_dir.name, 'src.zip')
+        with ZipFile(src_path, 'w', compression=ZIP_DEFLATED) as src_zip:
+            src_zip.writestr('pkg/handler.py', 'print("hello")\n' * 100)
+            src_zip.writestr('pkg/data.bin', b'data')
+        dest_path = os.path.join(tmp_dir.name, 'dest.zip')
+        with ZipFile(dest_path, 'w') as dest_zip:
+            dest_zip.writestr('existing.txt', 'existing')
+
+        with ZipBuilder(dest_path, mode='a') as builder, ZipFile(src_path) as src_zip:
+            builder.copy_member(src_zip, src_zip.getinfo('pkg/handler.py'), 'fname.py')
+            builder.copy_zip(src_zip, prefix='python/')
+
+        with ZipFile(dest_path) as thezip, ZipFile(src_path) as src_zip:
+            self.assertIsNone(thezip.testzip())
+            self.assertEqual(thezip.namelist(), ['existing.txt', 'fname.py', 'python/pkg/handler.py',
+                                                 'python/pkg/data.bin'])
+            self.assertEqual(thezip.read('fname.py'), src_zip.read('pkg/handler.py'))
+            # The compressed data is copied without recompressing it
+            self.assertEqual(thezip.getinfo('fname.py').compress_size,
+                             src_zip.getinfo('pkg/handler.py').compress_size)
+        tmp_dir.cleanup()
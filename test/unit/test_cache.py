@@ -0,0 +1,118 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+sys.path.append("..")
+sys.path.append(".")
+
+from scar.cache import CacheManager, parse_size
+from scar.utils import FileUtils
+
+
+def _create_file(path, size, last_use=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as new_file:
+        new_file.write(b'0' * size)
+    if last_use:
+        os.utime(os.path.dirname(path), (last_use, last_use))
+
+
+class TestCacheManager(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.cache_dir = self.tmp_dir.name
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size(1024), 1024)
+        self.assertEqual(parse_size('500MB'), 500 * 1024 ** 2)
+        self.assertEqual(parse_size('2G'), 2 * 1024 ** 3)
+        self.assertEqual(parse_size('1.5kb'), 1536)
+        with self.assertRaises(ValueError):
+            parse_size('2 weeks')
+
+    def test_prune(self):
+        _create_file(os.path.join(self.cache_dir, '1.4.2', 'faas-supervisor.zip'), 100, 1000)
+        _create_file(os.path.join(self.cache_dir, '1.5.0', 'faas-supervisor.zip'), 100, 2000)
+        _create_file(os.path.join(self.cache_dir, 'packages', 'hash1', 'function.zip'), 100, 3000)
+        _create_file(os.path.join(self.cache_dir, 'packages', 'hash2', 'function.zip'), 100, 4000)
+        cache_manager = CacheManager(self.cache_dir)
+        self.assertEqual([entry.to_dict()['Name'] for entry in cache_manager.get_entries()],
+                         ['1.4.2', '1.5.0', 'hash1', 'hash2'])
+        self.assertEqual(cache_manager.get_size(), 400)
+        removed = cache_manager.prune(250)
+        self.assertEqual([entry.to_dict()['Name'] for entry in removed], ['1.4.2', '1.5.0'])
+        self.assertEqual(cache_manager.get_size(), 200)
+        self.assertEqual(cache_manager.prune(250), [])
+
+    def test_prune_mirror_versions(self):
+        _create_file(os.path.join(self.cache_dir, '1.4.2', 'faas-supervisor.zip'), 100, 1000)
+        _create_file(os.path.join(self.cache_dir, 'packages', 'hash1', 'function.zip'), 100, 2000)
+        with open(os.path.join(self.cache_dir, 'releases.json'), 'w') as releases:
+            json.dump({'versions': ['1.4.2'], 'latest': '1.4.2'}, releases)
+        removed = CacheManager(self.cache_dir).prune(0)
+        self.assertEqual([entry.to_dict()['Name'] for entry in removed], ['hash1'])
+        self.assertTrue(os.path.isdir(os.path.join(self.cache_dir, '1.4.2')))
+
+    def test_prune_udocker_images(self):
+        images_dir = os.path.join(self.cache_dir, 'udocker', 'images')
+        layers_dir = os.path.join(self.cache_dir, 'udocker', 'layers')
+        _create_file(os.path.join(layers_dir, 'layer1'), 100)
+        _create_file(os.path.join(layers_dir, 'layer2'), 100)
+        _create_file(os.path.join(layers_dir, 'layer3'), 100)
+        for image, layers, last_use in [('image1', ['layer1', 'layer2'], 1000),
+                                        ('image2', ['layer2', 'layer3'], 2000)]:
+            os.makedirs(os.path.join(images_dir, image))
+            with open(os.path.join(images_dir, image, 'image.json'), 'w') as metadata:
+                json.dump({'layers': layers}, metadata)
+            os.utime(os.path.join(images_dir, image), (last_use, last_use))
+        cache_manager = CacheManager(self.cache_dir)
+        # The size of the image includes the layers not shared with other images
+        sizes = {entry.to_dict()['Name']: entry.size for entry in cache_manager.get_entries()}
+        self.assertGreaterEqual(sizes['image1'], 100)
+        self.assertLess(sizes['image1'], 200)
+        removed = cache_manager.prune(cache_manager.get_size() - 1)
+        self.assertEqual([entry.to_dict()['Name'] for entry in removed], ['image1'])
+        self.assertEqual(sorted(os.listdir(layers_dir)), ['layer2', 'layer3'])
+
+    def test_prune_entries_in_use(self):
+        version_path = os.path.join(self.cache_dir, '1.4.2')
+        os.makedirs(version_path)
+        open(os.path.join(version_path, 'faas-supervisor.zip.lock'), 'w').close()
+        _create_file(os.path.join(version_path, 'faas-supervisor.zip'), 100, 1000)
+        package_path = os.path.join(self.cache_dir, 'packages', 'hash1')
+        _create_file(os.path.join(package_path, 'package.zip'), 100, 2000)
+        # Recently used entry
+        _create_file(os.path.join(self.cache_dir, 'packages', 'hash2', 'package.zip'), 100)
+        cache_manager = CacheManager(self.cache_dir)
+        with FileUtils.lock_file(f'{package_path}.lock'):
+            removed = cache_manager.prune(0)
+        self.assertEqual([entry.to_dict()['Name'] for entry in removed], ['1.4.2'])
+        # The lock files are kept and the folders with only lock files are not entries
+        self.assertEqual(os.listdir(version_path), ['faas-supervisor.zip.lock'])
+        self.assertEqual([entry.to_dict()['Name'] for entry in cache_manager.get_entries()], ['hash1', 'hash2'])
+        os.utime(os.path.join(self.cache_dir, 'packages', 'hash2'), (3000, 3000))
+        removed = cache_manager.prune(0)
+        self.assertEqual([entry.to_dict()['Name'] for entry in removed], ['hash1', 'hash2'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.cache_dir, 'packages'))), ['hash1.lock', 'hash2.lock'])
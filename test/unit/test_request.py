@@ -0,0 +1,60 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import hashlib
+from io import BytesIO
+import requests
+from mock import MagicMock, patch
+
+sys.path.append("..")
+sys.path.append(".")
+
+from scar.http.request import download_file, get_session
+
+
+def _get_response(content, headers):
+    response = MagicMock(['__enter__', '__exit__', 'raise_for_status', 'iter_content', 'headers'])
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [content[i:i + 4] for i in range(0, len(content), 4)]
+    response.headers = headers
+    return response
+
+
+class TestRequest(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    def test_get_session(self):
+        self.assertIs(get_session(), get_session())
+        self.assertEqual(get_session().get_adapter('https://github.com').max_retries.total, 3)
+
+    @patch('scar.http.request.get_session')
+    def test_download_file(self, get_session):
+        content = b'supervisor content'
+        get_session.return_value.get.return_value = _get_response(content, {'Content-Length': '18'})
+        output = BytesIO()
+        hash_obj = hashlib.sha256()
+        self.assertEqual(download_file('https://asset', output, hash_obj), 18)
+        self.assertEqual(output.getvalue(), content)
+        self.assertEqual(hash_obj.hexdigest(), hashlib.sha256(content).hexdigest())
+        self.assertTrue(get_session.return_value.get.call_args[1]['stream'])
+
+        # Truncated download
+        get_session.return_value.get.return_value = _get_response(content[:10], {'Content-Length': '18'})
+        with self.assertRaises(requests.exceptions.RequestException):
+            download_file('https://asset', BytesIO())
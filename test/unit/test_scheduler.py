@@ -0,0 +1,84 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import threading
+from io import StringIO
+
+sys.path.append("..")
+sys.path.append(".")
+
+from scar.scheduler import TaskScheduler
+
+
+class TestTaskScheduler(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    def test_run(self):
+        events = []
+        # The second task only finishes if the first one is running at the same time
+        first_started = threading.Event()
+
+        def _first():
+            first_started.set()
+            print("first")
+            events.append('first')
+
+        def _second():
+            self.assertTrue(first_started.wait(5))
+            print("second")
+            events.append('second')
+
+        def _third():
+            print("third")
+            events.append('third')
+
+        scheduler = TaskScheduler(2)
+        scheduler.add_task('second', _second)
+        scheduler.add_task('first', _first)
+        scheduler.add_task('third', _third, ['first', 'second'])
+
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        scheduler.run()
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        # The output is shown in the order the tasks were added
+        self.assertEqual(res, "second\nfirst\nthird\n")
+        self.assertEqual(events[2], 'third')
+
+    def test_run_error(self):
+        calls = []
+
+        def _fail():
+            print("failed")
+            sys.exit(1)
+
+        scheduler = TaskScheduler(1)
+        scheduler.add_task('fail', _fail)
+        scheduler.add_task('dependent', lambda: calls.append('dependent'), ['fail'])
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+        with self.assertRaises(SystemExit):
+            scheduler.run()
+        res = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+        self.assertEqual(res, "failed\n")
+        self.assertEqual(calls, [])
+        with self.assertRaises(ValueError):
+            scheduler.add_task('other', print, ['unknown'])
@@ -0,0 +1,211 @@
+#! /usr/bin/python
+
+# Copyright (C) GRyCAP - I3M - UPV
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+import sys
+import os
+import json
+import tempfile
+from io import BytesIO
+from zipfile import ZipFile
+from mock import MagicMock, patch
+
+sys.path.append("..")
+sys.path.append(".")
+
+from scar.utils import FileUtils, GitHubUtils, SupervisorUtils
+from scar.exceptions import GitHubTagNotFoundError, SupervisorFileVerificationError, \
+                            SupervisorMirrorFileNotFoundError
+
+
+def _get_zip_content():
+    content = BytesIO()
+    with ZipFile(content, 'w') as zip_file:
+        zip_file.writestr('faas-supervisor/setup.py', 'source')
+    return content.getvalue()
+
+
+def _get_download_mock(contents):
+    def _download_file(url, *sinks):
+        for sink in sinks:
+            sink.update(contents[url]) if hasattr(sink, 'update') else sink.write(contents[url])
+        return len(contents[url])
+    return _download_file
+
+
+def _get_response(status_code, body=None, etag=''):
+    response = MagicMock(['status_code', 'json', 'headers'])
+    response.status_code = status_code
+    response.json.return_value = body
+    response.headers = {'ETag': etag} if etag else {}
+    return response
+
+
+class TestGitHubUtils(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(GitHubUtils, '_RELEASE_CACHE_DIR', self.tmp_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+        GitHubUtils._releases.clear()
+
+    @patch('scar.utils.request.get')
+    def test_get_release_cached(self, get):
+        release = {'tag_name': '1.5.0',
+                   'zipball_url': 'https://zipball',
+                   'assets': [{'name': 'supervisor.zip', 'browser_download_url': 'https://asset'}]}
+        get.return_value = _get_response(200, release, '"etag1"')
+        self.assertEqual(GitHubUtils.get_latest_release('grycap', 'faas-supervisor'), '1.5.0')
+        self.assertEqual(GitHubUtils.get_source_code_url('grycap', 'faas-supervisor'), 'https://zipball')
+        self.assertEqual(GitHubUtils.get_asset_url('grycap', 'faas-supervisor', 'supervisor.zip'),
+                         'https://asset')
+        # Only one request for all the methods
+        self.assertEqual(get.call_count, 1)
+
+        # New process with the cache entry expired: conditional request
+        GitHubUtils._releases.clear()
+        get.return_value = _get_response(304)
+        with patch.object(GitHubUtils, '_RELEASE_CACHE_TTL', -1):
+            self.assertEqual(GitHubUtils.get_latest_release('grycap', 'faas-supervisor'), '1.5.0')
+        self.assertEqual(get.call_args[1]['headers']['If-None-Match'], '"etag1"')
+
+        # New process with the cache entry still valid: no request
+        GitHubUtils._releases.clear()
+        self.assertEqual(GitHubUtils.get_latest_release('grycap', 'faas-supervisor'), '1.5.0')
+        self.assertEqual(get.call_count, 2)
+
+    @patch('scar.utils.request.get')
+    def test_get_release_not_found(self, get):
+        get.return_value = _get_response(404, {'message': 'Not Found'})
+        self.assertFalse(GitHubUtils.exists_release_in_repo('grycap', 'faas-supervisor', '0.0.1'))
+        with self.assertRaises(GitHubTagNotFoundError):
+            GitHubUtils.get_asset_url('grycap', 'faas-supervisor', 'supervisor.zip', '0.0.1')
+        self.assertEqual(get.call_count, 1)
+
+
+class TestSupervisorUtils(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    def tearDown(self):
+        SupervisorUtils.set_mirror('')
+
+    @patch('scar.utils.request.download_file')
+    @patch('scar.utils.GitHubUtils.get_release')
+    def test_local_mirror(self, get_release, download_file):
+        tmp_dir = tempfile.TemporaryDirectory()
+        mirror_dir = os.path.join(tmp_dir.name, 'mirror')
+        cache_dir = os.path.join(tmp_dir.name, 'cache', '1.5.0')
+        os.makedirs(cache_dir)
+        get_release.return_value = {'tag_name': '1.5.0',
+                                    'zipball_url': 'https://zipball',
+                                    'assets': [{'name': 'supervisor',
+                                                'browser_download_url': 'https://asset',
+                                                'size': 6}]}
+        source = _get_zip_content()
+        download_file.side_effect = _get_download_mock({'https://zipball': source,
+                                                        'https://asset': b'binary'})
+        self.assertEqual(SupervisorUtils.sync_mirror(mirror_dir), ['1.5.0'])
+        with open(os.path.join(mirror_dir, 'releases.json')) as releases:
+            self.assertEqual(json.load(releases), {'versions': ['1.5.0'], 'latest': '1.5.0'})
+        # The files already downloaded are skipped
+        SupervisorUtils.sync_mirror(mirror_dir, ['1.5.0'])
+        self.assertEqual(download_file.call_count, 2)
+
+        # No GitHub calls using the mirror
+        get_release.reset_mock()
+        download_file.reset_mock()
+        SupervisorUtils.set_mirror(mirror_dir)
+        self.assertEqual(SupervisorUtils.check_supervisor_version('1.4.2'), '1.5.0')
+        with patch.object(SupervisorUtils, '_SUPERVISOR_CACHE_DIR', os.path.dirname(cache_dir)):
+            supervisor_zip_path = SupervisorUtils.download_supervisor('1.5.0')
+        self.assertEqual(supervisor_zip_path, os.path.join(cache_dir, 'faas-supervisor.zip'))
+        with open(supervisor_zip_path, 'rb') as supervisor_zip:
+            self.assertEqual(supervisor_zip.read(), source)
+        self.assertEqual(SupervisorUtils.get_supervisor_binary_url('1.5.0'),
+                         'https://github.com/grycap/faas-supervisor/releases/download/1.5.0/supervisor')
+        self.assertFalse(get_release.called)
+        self.assertFalse(download_file.called)
+        with self.assertRaises(SupervisorMirrorFileNotFoundError):
+            SupervisorUtils.download_supervisor_asset('1.5.0', 'supervisor-alpine.zip',
+                                                      os.path.join(cache_dir, 'supervisor-alpine.zip'))
+        tmp_dir.cleanup()
+
+    @patch('scar.utils.request.download_file')
+    @patch('scar.utils.GitHubUtils.get_asset')
+    def test_download_supervisor_asset(self, get_asset, download_file):
+        tmp_dir = tempfile.TemporaryDirectory()
+        get_asset.return_value = {'name': 'supervisor.zip',
+                                  'browser_download_url': 'https://asset',
+                                  'size': 1024}
+        download_file.side_effect = _get_download_mock({'https://asset': _get_zip_content()[:-10]})
+        with patch.object(SupervisorUtils, '_SUPERVISOR_CACHE_DIR', tmp_dir.name):
+            cached, asset_path = SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')
+            self.assertFalse(cached)
+            # Truncated download
+            with self.assertRaises(SupervisorFileVerificationError):
+                SupervisorUtils.download_supervisor_asset('1.5.0', 'supervisor.zip', asset_path)
+            self.assertEqual(sorted(os.listdir(os.path.dirname(asset_path))), ['supervisor.zip.lock'])
+
+            download_file.side_effect = _get_download_mock({'https://asset': _get_zip_content()})
+            get_asset.return_value['size'] = len(_get_zip_content())
+            SupervisorUtils.download_supervisor_asset('1.5.0', 'supervisor.zip', asset_path)
+            self.assertTrue(SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')[0])
+            # The file is only hashed again when its modification time changes
+            with patch('scar.utils.FileUtils.get_path_hash', wraps=FileUtils.get_path_hash) as get_path_hash:
+                self.assertTrue(SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')[0])
+                self.assertEqual(get_path_hash.call_count, 0)
+                os.utime(asset_path, ns=(0, 0))
+                self.assertTrue(SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')[0])
+                self.assertTrue(SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')[0])
+                self.assertEqual(get_path_hash.call_count, 1)
+            # Corrupted cache file
+            with open(asset_path, 'ab') as asset_file:
+                asset_file.write(b'0')
+            self.assertFalse(SupervisorUtils.is_supervisor_asset_cached('supervisor.zip', '1.5.0')[0])
+        tmp_dir.cleanup()
+
+
+class TestFileUtils(unittest.TestCase):
+
+    def __init__(self, *args):
+        unittest.TestCase.__init__(self, *args)
+
+    @patch('scar.utils.logger.info')
+    def test_zip_folder(self, info):
+        tmp_dir = tempfile.TemporaryDirectory()
+        src = os.path.join(tmp_dir.name, 'src')
+        os.makedirs(src)
+        zip_path = os.path.join(tmp_dir.name, 'package.zip')
+
+        def _zip_folder(*args):
+            # The message is shown before creating the zip
+            self.assertEqual(info.call_count, 1)
+        with patch('scar.utils.archive.zip_folder', side_effect=_zip_folder) as zip_folder:
+            FileUtils.zip_folder(zip_path, src, msg='Creating function package.')
+            self.assertEqual(info.call_args_list[0][0][0], 'Creating function package.')
+            self.assertEqual(zip_folder.call_count, 1)
+        # Without message nothing is logged
+        info.reset_mock()
+        FileUtils.zip_folder(zip_path, src)
+        self.assertEqual(info.call_count, 0)
+        self.assertTrue(os.path.isfile(zip_path))
+        tmp_dir.cleanup()